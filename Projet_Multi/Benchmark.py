@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 14 16:20:37 2026
+
+@author: Thomas
+
+Benchmark of the acquisition pipeline on the simulated FIB, no hardware needed.
+
+    python Benchmark.py --pixels 256 --repeats 5
+    python Benchmark.py --pixels 1024 --time-per-pixel 4 --realtime
+    python Benchmark.py --profile
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from Modules_FIB import Scanning
+from Modules_FIB import ImageProcessing as ImPr
+from Modules_FIB.Acquisition import AcquisitionSession
+from Modules_FIB.Simulation import SimulatedBackend
+from Modules_FIB.Instrumentation import instrumentation
+from Modules_FIB.Timing import scan_timing
+
+CHANNEL_LR = "Sim1/ao0"
+CHANNEL_UD = "Sim1/ao1"
+CHANNEL_READ = "Sim1/ai0"
+
+def timed(function, repeats):
+    """
+    Calls function repeats times and returns the durations in seconds and the last result.
+    """
+    durations = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+def report(name, durations):
+    durations = np.array(durations) * 1000
+    print(f"{name:<24} mean {durations.mean():8.1f} ms   min {durations.min():8.1f} ms   max {durations.max():8.1f} ms")
+
+def peak_memory(function):
+    """
+    Returns the peak of the memory allocated by function, in bytes, and its duration in seconds.
+
+    The duration is measured by a second call, without tracemalloc which slows down the allocations.
+    """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    function()
+    return peak, time.perf_counter() - start
+
+def read_paths(pixels, samples_per_step):
+    """
+    Compares the reading and reconstruction of one frame by the former list path and by a read buffer.
+
+    The former path received the samples as a Python list (nidaqmx Task.read), converted
+    it to an array and averaged it. The buffer path receives them in a preallocated array,
+    reused between frames, and averages a view on it (Scanning.reconstruct_image). The
+    card is replaced by random samples, the memory and time do not depend on them.
+
+    Returns:
+    - The (peak bytes, seconds) of the list path and of the buffer path.
+    """
+    samples = scan_timing.samples_to_read(pixels, samples_per_step)
+    settling_pixels = scan_timing.settling_pixels(samples_per_step)
+    acquired = np.random.default_rng(0).normal(size=samples)
+    buffer = np.empty(samples)
+
+    def list_path():
+        raw_data = acquired.tolist()
+        rows = np.array(raw_data).reshape(pixels, -1)[:, settling_pixels * samples_per_step:]
+        return rows.reshape(pixels, pixels, samples_per_step).mean(axis=2)
+
+    def buffer_path():
+        buffer[:] = acquired
+        return Scanning.reconstruct_image(buffer, samples_per_step, pixels, settling_pixels)
+
+    return peak_memory(list_path), peak_memory(buffer_path)
+
+def psnr(image, reference):
+    """
+    Returns the peak signal-to-noise ratio of image against reference, in dB.
+    """
+    error = np.mean((image - reference) ** 2)
+    peak = reference.max() - reference.min()
+    return 10 * np.log10(peak ** 2 / error) if error > 0 else np.inf
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the scanning pipeline on the simulated FIB")
+    parser.add_argument("--pixels", type=int, default=256, help="pixels per row and column")
+    parser.add_argument("--time-per-pixel", type=float, default=4, help="time per pixel in microseconds")
+    parser.add_argument("--sampling-frequency", type=float, default=250000, help="sampling frequency in Hz")
+    parser.add_argument("--repeats", type=int, default=5, help="acquisitions per engine")
+    parser.add_argument("--realtime", action="store_true", help="pace the simulated card at the sampling frequency")
+    parser.add_argument("--noise", type=float, default=0.02, help="noise of the detector in volts")
+    parser.add_argument("--sparse", type=float, nargs="*", default=[0.5, 0.25, 0.1],
+                        help="fractions of the pixels of the sparse scans")
+    parser.add_argument("--bisections", type=int, default=6,
+                        help="steps of the search of the sparse fraction at the raster PSNR")
+    parser.add_argument("--adaptive", type=float, nargs="*", default=[0.25, 0.1],
+                        help="fractions of the pixels given the full dwell in the adaptive scans")
+    parser.add_argument("--profile", action="store_true", help="print the duration of each phase of the pipeline")
+    args = parser.parse_args()
+    instrumentation.enabled = args.profile
+
+    backend = SimulatedBackend(noise=args.noise, realtime=args.realtime, seed=0)
+    scan = (args.time_per_pixel, args.sampling_frequency, args.pixels, CHANNEL_LR, CHANNEL_UD, CHANNEL_READ)
+
+    durations, image = timed(lambda: Scanning.Scanning_Rise(*scan, backend=backend), args.repeats)
+    report("Scanning_Rise", durations)
+    # The samples of a frame: Python list then array, against a view on a preallocated read buffer
+    samples_per_step = int(args.time_per_pixel / 1000000 * args.sampling_frequency)
+    (list_peak, list_time), (buffer_peak, buffer_time) = read_paths(args.pixels, samples_per_step)
+    print(f"{'read, list':<24} peak {list_peak / 2 ** 20:8.1f} MiB   {list_time * 1000:8.1f} ms")
+    print(f"{'read, buffer':<24} peak {buffer_peak / 2 ** 20:8.1f} MiB   {buffer_time * 1000:8.1f} ms")
+    durations, _ = timed(lambda: Scanning.Scanning_Triangle(*scan, backend=backend), args.repeats)
+    report("Scanning_Triangle", durations)
+    durations, _ = timed(lambda: Scanning.Scanning_Rise_Streamed(*scan, backend=backend), args.repeats)
+    report("Scanning_Rise_Streamed", durations)
+    durations, _ = timed(lambda: Scanning.Scanning_Chunked("Normal", *scan, backend=backend), args.repeats)
+    report("Scanning_Chunked", durations)
+    durations, _ = timed(lambda: Scanning.Scanning_Interlaced(*scan, backend=backend), args.repeats)
+    report("Scanning_Interlaced", durations)
+    durations, _ = timed(lambda: Scanning.Scanning_Hilbert(*scan, backend=backend), args.repeats)
+    report("Scanning_Hilbert", durations)
+
+    # Sparse scans: beam time saved against the raster, quality against the raster image. Two rasters
+    # differ by the noise only, a sparse scan at or above their PSNR displays as well as a raster.
+    raster_time = scan_timing.samples_to_read(args.pixels, samples_per_step) / args.sampling_frequency
+    _, repeat = timed(lambda: Scanning.Scanning_Rise(*scan, backend=backend), 1)
+    baseline = psnr(repeat, image)
+    print(f"{'raster':<24} beam {raster_time * 1000:8.1f} ms   PSNR {baseline:6.1f} dB (second raster)")
+
+    def sparse_time(fraction):
+        scanned = len(Scanning.sparse_order(args.pixels, None, fraction)) + scan_timing.settling_pixels(samples_per_step)
+        return (scanned * samples_per_step + scan_timing.delay_samples) / args.sampling_frequency
+
+    for fraction in args.sparse:
+        durations, sparse = timed(lambda: Scanning.Scanning_Sparse(*scan, fraction, backend=backend), args.repeats)
+        report(f"Scanning_Sparse {fraction:g}", durations)
+        beam_time = sparse_time(fraction)
+        print(f"{'':<24} beam {beam_time * 1000:8.1f} ms   {1 - beam_time / raster_time:.0%} saved   "
+              f"PSNR {psnr(sparse, image):6.1f} dB")
+
+    # Equal quality: the smallest fraction reaching the PSNR of the second raster, by bisection
+    low, high = 0.0, 1.0
+    for _ in range(args.bisections):
+        fraction = (low + high) / 2
+        if psnr(Scanning.Scanning_Sparse(*scan, fraction, backend=backend), image) >= baseline:
+            high = fraction
+        else:
+            low = fraction
+    if high < 1.0:
+        beam_time = sparse_time(high)
+        print(f"{'Sparse at raster PSNR':<24} fraction {high:.3f}   beam {beam_time * 1000:8.1f} ms   "
+              f"{1 - beam_time / raster_time:.0%} saved")
+    else:
+        print(f"{'Sparse at raster PSNR':<24} none below the full frame, no time saved at equal quality "
+              f"(within {0.5 ** args.bisections:.3f})")
+
+    # Adaptive scans: the PSNR on the edges of the raster image, where the dwell is spent. They are refused
+    # when the preview leaves no room for a scan shorter than a raster.
+    smooth = ImPr.box_blur(image, 1, 1) / ImPr.box_blur(np.ones(image.shape), 1, 1)
+    gradient = np.hypot(*np.gradient(smooth))
+    edges = gradient >= np.quantile(gradient, 0.9)
+    print(f"{'raster':<24} edges PSNR {psnr(repeat[edges], image[edges]):6.1f} dB (second raster)")
+    for fraction in args.adaptive:
+        try:
+            beam_time = Scanning.adaptive_samples(*scan[:3], fraction) / args.sampling_frequency
+        except ValueError:
+            print(f"{f'Scanning_Adaptive {fraction:g}':<24} skipped, not shorter than a raster at this dwell")
+            continue
+        durations, adaptive = timed(lambda: Scanning.Scanning_Adaptive(*scan, fraction, backend=backend), args.repeats)
+        report(f"Scanning_Adaptive {fraction:g}", durations)
+        print(f"{'':<24} beam {beam_time * 1000:8.1f} ms   {1 - beam_time / raster_time:.0%} saved   "
+              f"edges PSNR {psnr(adaptive[edges], image[edges]):6.1f} dB")
+
+    session = AcquisitionSession(backend)
+    durations, _ = timed(lambda: session.sweep(*scan), args.repeats)
+    report("AcquisitionSession", durations)
+    print("  last sweep:", session.timings_report())
+
+    durations, _ = timed(lambda: ImPr.normalize(image), args.repeats)
+    report("normalize", durations)
+    session.close()
+
+    if args.profile:
+        print()
+        print(instrumentation.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 13 14:05:18 2026
+
+@author: Thomas
+"""
+import threading
+import time
+import numpy as np
+from Modules_FIB import Scanning
+from Modules_FIB.Backends import get_backend
+from Modules_FIB.Instrumentation import instrumentation
+from Modules_FIB.Progress import progress
+
+class AcquisitionSession:
+    """
+    Long-lived acquisition keeping its tasks alive between sweeps.
+
+    Scanning_Rise and Scanning_Triangle set the initial voltage, create, configure and
+    close two tasks for every image. A session keeps the committed tasks, the written
+    waveform and the read buffer from one sweep to the next and only redoes what changed:
+    - other channels or voltage range: the tasks are recreated,
+    - other sampling frequency, dwell time or image size: only the timing is reconfigured,
+    - other waveform (mode): only the write buffer is rewritten.
+
+    The initial voltage is only set when the tasks are created. The flyback from the end
+    of a sweep to the start of the next one is absorbed by the settling of the first line,
+    held and discarded as the settling of every line, and the inputs are read with the
+    delay of the timing (see Timing.ScanTiming).
+
+    Attributes:
+        backend (DaqBackend): The backend of the acquisition.
+        timings (dict): Duration in seconds of each phase of the last sweep.
+        sweeps (int): The number of sweeps done.
+        reconfigurations (dict): How many times the tasks, timing and waveform were (re)done.
+    """
+
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend (DaqBackend): The backend of the acquisition, the default backend when None.
+        """
+        self.backend = get_backend(backend)
+        self.write_task = None
+        self.read_task = None
+        self.read_buffer = None
+        self._channels = None
+        self._timing = None
+        self._written = None
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.sweeps = 0
+        self.reconfigurations = {"tasks": 0, "timing": 0, "waveform": 0}
+
+    def sweep(self, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+              mode="Normal", on_lines=None, chunk_lines=None, timing=None, pixels_y=None, roi=None, transform=None):
+        """
+        Acquires one image, with the same parameters and result as Scanning_Rise (or
+        Scanning_Triangle when mode is "Triangle").
+
+        Parameters:
+        - time_per_pixel: Time spent per pixel, in microseconds.
+        - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+        - pixels_number: Number of pixels per row in the image.
+        - channel_lr: Channel name for the left-right scanning signal.
+        - channel_ud: Channel name for the up-down scanning signal.
+        - channel_read: Channel name for reading the input signal.
+        - mode: "Normal" or "Triangle".
+        - on_lines: Optional line callback, see Scanning.reduce_chunks. The frame is then read in chunks.
+        - chunk_lines: Number of lines per chunk, reading in chunks of 16 lines when on_lines is given.
+        - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+        - pixels_y: Number of rows in the image, pixels_number when None.
+        - roi: Voltage window (x_min, x_max, y_min, y_max) scanned, the whole field when None.
+        - transform: Transform.ScanTransform rotating, zooming and panning the scan, none when None.
+
+        Returns:
+        - A 2D NumPy array representing the acquired image.
+        """
+        with self._lock:
+            timings = {}
+            start = time.perf_counter()
+
+            # Settling at the start of each line and delay of the inputs, see Timing.ScanTiming
+            samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = Scanning.frame_timing(
+                time_per_pixel, sampling_frequency, pixels_number, timing, pixels_y)
+            pixels_y = pixels_number if pixels_y is None else pixels_y
+            min_tension = -10
+            max_tension = 10
+
+            data_to_write = Scanning.scan_waveform(mode, pixels_number, samples_per_step, min_tension, max_tension,
+                                                   settling_pixels, pixels_y, roi, transform)
+            start = self._phase(timings, "waveform", start)
+
+            # A failed sweep leaves the tasks in an unknown state, they are closed and the next sweep recreates them
+            attached = False
+            try:
+                channels = (channel_lr, channel_ud, channel_read, min_tension, max_tension)
+                if channels != self._channels:
+                    self.close()
+                    self.backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+                    start = self._phase(timings, "initial_voltage", start)
+                    self.write_task, self.read_task = self.backend.configure_tasks(channel_lr, channel_ud, channel_read,
+                                        min_tension, max_tension, sampling_frequency, data_to_write[0],
+                                        total_samples_to_read, data_to_write[1],
+                                        Scanning.pixel_frequency(sampling_frequency, samples_per_step))
+                    self._channels = channels
+                    self._timing = (sampling_frequency, samples_per_step, data_to_write.shape[1], total_samples_to_read)
+                    self.reconfigurations["tasks"] += 1
+                    start = self._phase(timings, "configure", start)
+
+                task_timing = (sampling_frequency, samples_per_step, data_to_write.shape[1], total_samples_to_read)
+                if task_timing != self._timing:
+                    self.backend.configure_timing(self.write_task, self.read_task, sampling_frequency,
+                                                  data_to_write.shape[1], total_samples_to_read,
+                                                  Scanning.pixel_frequency(sampling_frequency, samples_per_step))
+                    self._timing = task_timing
+                    self._written = None
+                    self.reconfigurations["timing"] += 1
+                    start = self._phase(timings, "configure", start)
+
+                # Changing the timing uncommits the tasks, they are committed again once
+                if "configure" in timings:
+                    self.backend.commit_tasks(self.write_task, self.read_task)
+                    start = self._phase(timings, "commit", start)
+                # In chunks only a few lines of samples are buffered
+                chunked = on_lines is not None or chunk_lines is not None
+                buffered_samples = total_samples_to_read
+                if chunked:
+                    chunk_lines = min(chunk_lines or 16, pixels_y)
+                    buffered_samples = max(chunk_lines * (pixels_number + settling_pixels) * samples_per_step,
+                                           delay_samples)
+                if self.read_buffer is None or len(self.read_buffer.data) < buffered_samples:
+                    self.read_buffer = self.backend.read_buffer(self.read_task, buffered_samples)
+
+                # The cached waveforms are shared, so an identical object was already written
+                if data_to_write is not self._written:
+                    self.backend.writer(self.write_task, data_to_write)
+                    self._written = data_to_write
+                    self.reconfigurations["waveform"] += 1
+                    start = self._phase(timings, "write", start)
+
+                # The forward/backward offset of the serpentine scans is estimated once per configuration
+                offset_key = Scanning.serpentine_key(pixels_number, samples_per_step, sampling_frequency,
+                                                     settling_pixels, delay_samples)
+                progress.attach(self.backend, self.read_task, total_samples_to_read, sampling_frequency)
+                attached = True
+                if chunked:
+                    # The reduction is done during the acquisition
+                    self.backend.start_tasks(self.write_task, self.read_task)
+                    image_array = Scanning.reduce_chunks(self.backend, self.read_task,
+                                                         np.empty((pixels_y, pixels_number)), samples_per_step,
+                                                         timeout, chunk_lines, on_lines, self.read_buffer,
+                                                         mode == "Triangle", offset_key, settling_pixels, delay_samples)
+                    self.backend.wait_and_stop(self.write_task, self.read_task, timeout)
+                    self._phase(timings, "acquire", start)
+                else:
+                    raw_data = self.backend.quickwrite_and_read(self.write_task, self.read_task, total_samples_to_read,
+                                                       timeout, self.read_buffer)
+                    start = self._phase(timings, "acquire", start)
+
+                    if mode == "Triangle":
+                        image_array = Scanning.reconstruct_serpentine(raw_data, samples_per_step, pixels_number,
+                                                                      offset_key, settling_pixels=settling_pixels,
+                                                                      delay_samples=delay_samples, pixels_y=pixels_y)
+                    else:
+                        image_array = Scanning.reconstruct_image(raw_data, samples_per_step, pixels_number,
+                                                                 settling_pixels, delay_samples, pixels_y)
+                    self._phase(timings, "reconstruct", start)
+
+            except Exception:
+                self.close()
+                raise
+            finally:
+                if attached:
+                    progress.detach()
+
+            self.timings = timings
+            self.sweeps += 1
+            return image_array
+
+    @staticmethod
+    def _phase(timings, name, start):
+        now = time.perf_counter()
+        timings[name] = timings.get(name, 0) + now - start
+        # The other phases are already recorded by the backend and reconstruct_image
+        if name in ("initial_voltage", "configure", "commit"):
+            instrumentation.record(name, now - start)
+        return now
+
+    def timings_report(self):
+        """
+        Returns the timings of the last sweep as a printable string, in milliseconds.
+        """
+        return ", ".join(f"{name} {duration * 1000:.1f} ms" for name, duration in self.timings.items())
+
+    def close(self):
+        """
+        Closes the tasks of the session. The next sweep recreates them.
+        """
+        if self.write_task is not None:
+            self.backend.close(self.write_task, self.read_task)
+        self.write_task = None
+        self.read_task = None
+        self.read_buffer = None
+        self._channels = None
+        self._timing = None
+        self._written = None
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 14 09:31:02 2026
+
+@author: Thomas
+"""
+
+from abc import ABC, abstractmethod
+
+
+class DaqBackend(ABC):
+    """
+    Interface of the acquisition layer used by Scanning and Acquisition.
+
+    The functions of Ni_Dependencies are the reference implementation (see NiBackend).
+    Task objects are opaque: they are created by the configure_* methods of a backend
+    and only given back to the same backend. The arguments and return values of every
+    method are the ones of the Ni_Dependencies function of the same name.
+    Every method is abstract, so a backend missing one of them cannot be created.
+
+    Attributes:
+        hardware (bool): Whether the backend drives a real instrument.
+    """
+    hardware = False
+
+    # Devices
+    @abstractmethod
+    def device_names(self):
+        """Returns the names of the available devices."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def ao_channels(self, port_dev):
+        """Returns the names of the analog output channels of a device."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def ai_channels(self, port_dev):
+        """Returns the names of the analog input channels of a device."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def reset_card(self, port_dev):
+        raise NotImplementedError
+
+    # Configuration
+    @abstractmethod
+    def initial_voltage_setting(self, min_tension, max_tension, channel_ud):
+        raise NotImplementedError
+
+    @abstractmethod
+    def configure_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                        vertical_staircase, write_frequency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def configure_timing(self, write_task, read_task, sampling_frequency, total_samples_to_write,
+                         total_samples_to_read, write_frequency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def configure_continuous_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                   sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                                   frames_buffered=4, write_frequency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def configure_line_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                             sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                             total_samples_to_read, lines_buffered=4):
+        raise NotImplementedError
+
+    @abstractmethod
+    def commit_tasks(self, write_task, read_task):
+        raise NotImplementedError
+
+    # Acquisition
+    @abstractmethod
+    def start_tasks(self, write_task, read_task):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_buffer(self, read_task, samples):
+        """Returns a preallocated buffer with a data array and a read(samples, timeout) method."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_samples(self, read_task, total_samples_to_read, timeout, buffer=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_frame(self, read_task, samples_per_frame, next_frame, timeout, buffer=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def samples_acquired(self, read_task):
+        """Returns the number of samples acquired since the task was started, may be called from another thread."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_writer(self, write_task):
+        """Returns an object with a write_many_sample(data, timeout) method feeding a running task."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def writer(self, write_task, data_to_write):
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_and_read(self, write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def quickwrite_and_read(self, write_task, read_task, total_samples_to_read, timeout, buffer=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait_and_stop(self, write_task, read_task, timeout):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self, write_task, read_task):
+        raise NotImplementedError
+
+
+class NiBackend(DaqBackend):
+    """
+    Backend driving a National Instruments card through Ni_Dependencies.
+
+    nidaqmx is only imported when the backend is created, so the scanning layer can be
+    imported (and used with another backend) on a computer without the NI drivers.
+    """
+    hardware = True
+
+    def __init__(self):
+        from Modules_FIB import Ni_Dependencies
+        self.NID = Ni_Dependencies
+
+    def device_names(self):
+        return [device.name for device in self.NID.Ni_Cards_System().devices]
+
+    def ao_channels(self, port_dev):
+        return [chan.name for chan in self.NID.Ni_Cards_Device(port_dev).ao_physical_chans]
+
+    def ai_channels(self, port_dev):
+        return [chan.name for chan in self.NID.Ni_Cards_Device(port_dev).ai_physical_chans]
+
+    def reset_card(self, port_dev):
+        self.NID.Reset_Card(port_dev)
+
+    def initial_voltage_setting(self, min_tension, max_tension, channel_ud):
+        self.NID.initial_voltage_setting(min_tension, max_tension, channel_ud)
+
+    def configure_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                        vertical_staircase, write_frequency=None):
+        return self.NID.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                                        vertical_staircase, write_frequency)
+
+    def configure_timing(self, write_task, read_task, sampling_frequency, total_samples_to_write,
+                         total_samples_to_read, write_frequency=None):
+        self.NID.configure_timing(write_task, read_task, sampling_frequency, total_samples_to_write,
+                                  total_samples_to_read, write_frequency)
+
+    def configure_continuous_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                   sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                                   frames_buffered=4, write_frequency=None):
+        return self.NID.configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                                   sampling_frequency, complete_horizontal_staircase,
+                                                   samples_per_frame, frames_buffered, write_frequency)
+
+    def configure_line_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                             sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                             total_samples_to_read, lines_buffered=4):
+        return self.NID.configure_line_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                             sampling_frequency, write_frequency, samples_per_line,
+                                             total_samples_to_write, total_samples_to_read, lines_buffered)
+
+    def commit_tasks(self, write_task, read_task):
+        self.NID.commit_tasks(write_task, read_task)
+
+    def start_tasks(self, write_task, read_task):
+        self.NID.start_tasks(write_task, read_task)
+
+    def read_buffer(self, read_task, samples):
+        return self.NID.ReadBuffer(read_task, samples)
+
+    def read_samples(self, read_task, total_samples_to_read, timeout, buffer=None):
+        return self.NID.read_samples(read_task, total_samples_to_read, timeout, buffer)
+
+    def read_frame(self, read_task, samples_per_frame, next_frame, timeout, buffer=None):
+        return self.NID.read_frame(read_task, samples_per_frame, next_frame, timeout, buffer)
+
+    def samples_acquired(self, read_task):
+        return self.NID.samples_acquired(read_task)
+
+    def stream_writer(self, write_task):
+        return self.NID.stream_writer(write_task)
+
+    def writer(self, write_task, data_to_write):
+        self.NID.writer(write_task, data_to_write)
+
+    def write_and_read(self, write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer=None):
+        return self.NID.write_and_read(write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer)
+
+    def quickwrite_and_read(self, write_task, read_task, total_samples_to_read, timeout, buffer=None):
+        return self.NID.quickwrite_and_read(write_task, read_task, total_samples_to_read, timeout, buffer)
+
+    def wait_and_stop(self, write_task, read_task, timeout):
+        self.NID.wait_and_stop(write_task, read_task, timeout)
+
+    def close(self, write_task, read_task):
+        self.NID.close(write_task, read_task)
+
+
+_default_backend = None
+
+def default_backend():
+    """
+    Returns the backend used when none is given, a NiBackend unless changed with set_default_backend.
+    """
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = NiBackend()
+    return _default_backend
+
+def set_default_backend(backend):
+    """
+    Changes the backend used when none is given, for example to a SimulatedBackend.
+    """
+    global _default_backend
+    _default_backend = backend
+
+def get_backend(backend=None):
+    """
+    Returns backend, or the default backend when it is None.
+    """
+    if backend is None:
+        return default_backend()
+    return backend
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:52:06 2026
+
+@author: Thomas
+"""
+import numpy as np
+from Modules_FIB.ImageProcessing import box_blur
+
+class DistortionCorrection:
+    """
+    Correction of the non-linearity of the deflection, a 2D polynomial of the voltages.
+
+    The polynomial gives, for the position wanted (in the voltages of an ideal linear
+    deflection), the voltages to write so the beam reaches it. It is fitted on a frame of
+    a reference grid (see Scanning.calibrate_distortion): the voltages at which the dots
+    of the grid were seen against the positions of the dots on a regular lattice.
+
+    The correction is applied to the waveforms when they are built and its coefficients
+    are part of their cache keys, so the corrected waveforms are built once and a
+    corrected scan costs the same as an uncorrected one.
+
+    Attributes:
+        degree (int): The degree of the polynomial.
+        coefficients (numpy.array): The (2, terms) coefficients of the x and y voltages, None when not calibrated.
+        residual (float): The rms error of the fit on the grid points, in volts.
+        points (int): The number of grid points of the fit.
+    """
+
+    def __init__(self, degree=3):
+        """
+        Args:
+            degree (int): The degree of the polynomial.
+        """
+        self.degree = degree
+        self.coefficients = None
+        self.residual = 0.0
+        self.points = 0
+
+    @property
+    def active(self):
+        return self.coefficients is not None
+
+    @staticmethod
+    def _terms(x, y, degree):
+        """
+        Yields the monomials x**i * y**j of degree up to degree, in the order of the coefficients.
+        """
+        power_x = np.ones_like(x, dtype=np.float64)
+        for i in range(degree + 1):
+            term = power_x.copy()
+            for _ in range(degree + 1 - i):
+                yield term
+                term = term * y
+            power_x = power_x * x
+
+    def key(self):
+        """
+        Returns the part of the waveform keys describing the correction, None when not calibrated.
+        """
+        if not self.active:
+            return None
+        return (self.degree, tuple(self.coefficients.ravel().tolist()))
+
+    def fit(self, targets, commands, degree=None):
+        """
+        Fits the polynomial mapping the targets to the commands, by least squares.
+
+        Parameters:
+        - targets: (2, n) positions of the grid points on the regular lattice, in volts.
+        - commands: (2, n) voltages at which the grid points were seen.
+        - degree: The degree of the polynomial, the current one when None.
+
+        Raises:
+        - ValueError if there are fewer points than coefficients.
+        """
+        degree = self.degree if degree is None else degree
+        count = (degree + 1) * (degree + 2) // 2
+        if targets.shape[1] < count:
+            raise ValueError(f"{targets.shape[1]} grid points found, at least {count} are needed for degree {degree}")
+        matrix = np.array(list(self._terms(targets[0], targets[1], degree))).T
+        solution = np.linalg.lstsq(matrix, commands.T, rcond=None)[0]
+        self.degree = degree
+        self.coefficients = solution.T
+        self.residual = float(np.sqrt(np.mean((matrix @ solution - commands.T) ** 2)))
+        self.points = targets.shape[1]
+
+    def apply(self, staircases):
+        """
+        Returns the voltages to write for the (2, n) positions staircases.
+
+        The monomials are accumulated one at a time, so the memory is a few arrays of the
+        size of the staircases whatever the degree.
+        """
+        corrected = np.zeros(staircases.shape, dtype=np.float64)
+        for coefficients, term in zip(self.coefficients.T, self._terms(staircases[0], staircases[1], self.degree)):
+            corrected += coefficients[:, None] * term
+        return corrected
+
+    def correct(self, staircases, min_tension, max_tension):
+        """
+        Returns the staircases corrected and clipped to the field, unchanged when not calibrated.
+
+        The outputs cannot go further than the field: near its corners, where the
+        correction would need more, the scan is clipped.
+        """
+        if not self.active:
+            return staircases
+        return np.clip(self.apply(staircases), min_tension, max_tension)
+
+    def clear(self):
+        """
+        Removes the correction.
+        """
+        self.coefficients = None
+        self.residual = 0.0
+        self.points = 0
+
+    def to_dict(self):
+        return {"degree": self.degree, "residual": self.residual, "points": self.points,
+                "coefficients": None if self.coefficients is None else self.coefficients.tolist()}
+
+    def update(self, config):
+        """
+        Sets the values found in a dict written by to_dict.
+        """
+        self.degree = int(config.get("degree", self.degree))
+        coefficients = config.get("coefficients")
+        self.coefficients = None if coefficients is None else np.array(coefficients, dtype=np.float64)
+        self.residual = float(config.get("residual", 0.0))
+        self.points = int(config.get("points", 0))
+
+def find_grid_points(image, window, radius=3, threshold=None):
+    """
+    Returns the voltages at which the bright dots of a reference grid were seen.
+
+    The dots are the local maxima of the slightly smoothed image within radius pixels,
+    above threshold. Their centres are the centroids of the signal around the maxima, to
+    a fraction of a pixel. The dots must be smaller than radius and further apart than
+    2 * radius pixels, the dots within radius of the border are left out.
+
+    Parameters:
+    - image: 2D NumPy array of the grid, acquired without correction.
+    - window: Voltage window (x_min, x_max, y_min, y_max) of the image.
+    - radius: Half size of the neighbourhood of the maxima, in pixels.
+    - threshold: Lowest signal of the dots, halfway from the median to the maximum when None.
+
+    Returns:
+    - The (2, n) horizontal and vertical voltages of the dots.
+    """
+    image = np.asarray(image, dtype=np.float64)
+    height, width = image.shape
+    size = 2 * radius + 1
+    smooth = box_blur(image, 1, 1)
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(smooth, radius, mode="edge"), (size, size))
+    if threshold is None:
+        threshold = (np.median(smooth) + smooth.max()) / 2
+    peaks = (smooth == windows.max(axis=(2, 3))) & (smooth > threshold)
+    # The dots cut by the border of the image would be off-centre
+    peaks[:radius] = peaks[-radius:] = False
+    peaks[:, :radius] = peaks[:, -radius:] = False
+    rows, cols = np.nonzero(peaks)
+
+    # A flat top gives several maxima, the first of each group is kept
+    close = np.triu((rows[:, None] - rows) ** 2 + (cols[:, None] - cols) ** 2 <= radius ** 2, 1)
+    keep = ~close.any(axis=0)
+    rows, cols = rows[keep], cols[keep]
+
+    # Centroid of the signal above the local minimum
+    patches = np.lib.stride_tricks.sliding_window_view(np.pad(image, radius, mode="edge"), (size, size))[rows, cols]
+    weights = patches - patches.min(axis=(1, 2), keepdims=True)
+    total = np.maximum(weights.sum(axis=(1, 2)), 1e-12)
+    offsets = np.arange(-radius, radius + 1)
+    centre_rows = rows + weights.sum(axis=2) @ offsets / total
+    centre_cols = cols + weights.sum(axis=1) @ offsets / total
+
+    x_min, x_max, y_min, y_max = window
+    return np.array((x_min + centre_cols * (x_max - x_min) / (width - 1),
+                     y_max - centre_rows * (y_max - y_min) / (height - 1)))
+
+def grid_targets(points, pitch=None):
+    """
+    Returns the positions of the grid points on a regular lattice.
+
+    The lattice is aligned on the axes of the scan and goes through the point nearest to
+    the centre of the points, where the deflection is the most linear. Its pitch is the
+    median distance between neighbouring points around that centre. The points are given
+    their node from the centre outwards, two pitches at a time: a polynomial from the
+    positions to the nodes, fitted on the points already placed, predicts the nodes of the
+    next ones, so the distortion may shift the points by several pitches at the edges.
+
+    Parameters:
+    - points: (2, n) voltages of the grid points (see find_grid_points).
+    - pitch: The pitch of the grid in volts, measured on the points when None.
+
+    Returns:
+    - The (2, n) positions of the nodes of the points.
+
+    Raises:
+    - ValueError if there are fewer than 2 points.
+    """
+    if points.shape[1] < 2:
+        raise ValueError(f"{points.shape[1]} grid point found, the grid is not visible")
+    centre = points.mean(axis=1, keepdims=True)
+    origin = points[:, [np.argmin(np.hypot(*(points - centre)))]]
+    offsets = points - origin
+    radii = np.hypot(*offsets)
+    if pitch is None:
+        distances = np.hypot(points[0][:, None] - points[0], points[1][:, None] - points[1])
+        np.fill_diagonal(distances, np.inf)
+        nearest = distances.min(axis=1)
+        pitch = np.median(nearest[radii <= 2.5 * np.median(nearest)])
+
+    nodes = np.rint(offsets / pitch)
+    reach = 2.5
+    model = DistortionCorrection(degree=1)
+    while (radii > reach * pitch).any():
+        placed = radii <= reach * pitch
+        # Affine until there are enough points for the cubic terms
+        model.fit(offsets[:, placed], nodes[:, placed], 1 if placed.sum() < 30 else 3)
+        nodes = np.rint(model.apply(offsets))
+        reach += 2
+    return origin + nodes * pitch
+
+# Correction used by the waveforms, not calibrated until Scanning.calibrate_distortion
+scan_distortion = DistortionCorrection()
@@ -41,10 +41,72 @@ def triangle_scanning (Image, Pixel_Size):
     Image : Corrected Data Array
 
     """
-    for i in range(Pixel_Size):
-        if i % 2 == 1:
-            Image[i]=Image[i][::-1]
+    Image[1:Pixel_Size:2] = Image[1:Pixel_Size:2, ::-1]
         
     return Image
 
-    
\ No newline at end of file
+def box_blur (Image, Radius, Passes=3):
+    """
+    Blurs an image with Passes box filters of width 2*Radius+1 along both
+    axes, close to a gaussian blur. The sums are differences of cumulative
+    sums, so the cost does not depend on Radius. The outside of the image
+    counts as zeros.
+
+    Parameters
+    ----------
+    Image : 2D Data Array
+    Radius : Half width of the box, in pixels
+    Passes : Number of box filters along each axis
+
+    Returns
+    -------
+    Image : Blurred Data Array (sums, not means)
+
+    """
+    Width = 2 * Radius + 1
+    for _ in range(Passes):
+        Sums = np.cumsum(np.pad(Image, ((0, 0), (Radius + 1, Radius))), axis=1)
+        Image = Sums[:, Width:] - Sums[:, :-Width]
+        Sums = np.cumsum(np.pad(Image, ((Radius + 1, Radius), (0, 0))), axis=0)
+        Image = Sums[Width:] - Sums[:-Width]
+
+    return Image
+
+def inpaint (Image, Known, Radius=None):
+    """
+    Fills the unknown pixels of an image by normalized convolution: the
+    blurred known values are divided by the blurred mask of the known
+    pixels. The pixels too far from any known pixel are filled again with a
+    doubled radius. The known pixels keep their values.
+
+    Parameters
+    ----------
+    Image : 2D Data Array, any value where unknown (NaN for example)
+    Known : Boolean Array of the known pixels
+    Radius : Radius of the first blur (see box_blur), from the density of
+        the known pixels when None
+
+    Returns
+    -------
+    Image : Filled Data Array
+
+    """
+    Known = np.asarray(Known, dtype=bool)
+    Result = np.where(Known, Image, 0.0)
+    Missing = ~Known
+    if not Known.any():
+        return Result
+    if Radius is None:
+        # Half the mean distance between the known pixels
+        Radius = int(np.ceil(0.5 / np.sqrt(Known.mean())))
+    Values = Result.copy()
+    Weights = Known.astype(float)
+    while Missing.any():
+        Numerator = box_blur(Values, Radius)
+        Denominator = box_blur(Weights, Radius)
+        Reached = Missing & (Denominator > 1e-9)
+        Result[Reached] = Numerator[Reached] / Denominator[Reached]
+        Missing &= ~Reached
+        Radius *= 2
+
+    return Result
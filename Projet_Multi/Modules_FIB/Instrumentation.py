@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 15 15:36:49 2026
+
+@author: Thomas
+"""
+from collections import deque
+import threading
+import time
+import numpy as np
+
+class _NullPhase:
+    """
+    Phase returned while the instrumentation is disabled, it does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """
+    Times the code of a with block and records it in the instrumentation.
+    """
+
+    def __init__(self, instrumentation, name, nbytes):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+
+class Instrumentation:
+    """
+    Per-phase durations, bytes moved and counters of the scan pipeline.
+
+    The last durations of each phase are kept in a rolling window, from which the
+    percentiles are computed. While disabled, phase() returns a shared object doing
+    nothing and record()/count() return immediately, so the instrumentation can stay
+    in the acquisition code.
+
+        with instrumentation.phase("read", nbytes):
+            ...
+        instrumentation.count("frames")
+
+    Attributes:
+        enabled (bool): Whether anything is recorded.
+        window (int): The number of durations kept per phase.
+    """
+
+    def __init__(self, enabled=False, window=256):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every duration, byte count and counter.
+        """
+        with self._lock:
+            self._durations = {}
+            self._totals = {}
+            self._bytes = {}
+            self._counters = {}
+            self._start_time = time.perf_counter()
+
+    def phase(self, name, nbytes=0):
+        """
+        Returns a context manager timing the phase name, nbytes being the bytes it moves.
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, nbytes)
+
+    def record(self, name, duration, nbytes=0):
+        """
+        Records a duration in seconds for the phase name.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            self._durations[name].append(duration)
+            self._totals[name][0] += 1
+            self._totals[name][1] += duration
+            if nbytes:
+                self._bytes[name] = self._bytes.get(name, 0) + nbytes
+
+    def count(self, name, increment=1):
+        """
+        Increments the counter name, for example "frames".
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + increment
+
+    def percentiles(self, name, quantiles=(50, 90, 99)):
+        """
+        Returns the percentiles of the recent durations of the phase, in seconds.
+        """
+        with self._lock:
+            durations = list(self._durations.get(name, ()))
+        if not durations:
+            return [0.0] * len(quantiles)
+        return list(np.percentile(durations, quantiles))
+
+    def summary(self):
+        """
+        Returns everything recorded as a dict:
+        {"phases": {name: {"count", "total", "p50", "p90", "p99", "max", "bytes"}},
+         "counters": {name: value}, "elapsed": seconds since the reset}.
+        """
+        with self._lock:
+            names = list(self._durations)
+            recent = {name: list(self._durations[name]) for name in names}
+            totals = {name: list(self._totals[name]) for name in names}
+            nbytes = dict(self._bytes)
+            counters = dict(self._counters)
+            elapsed = time.perf_counter() - self._start_time
+        phases = {}
+        for name in names:
+            p50, p90, p99 = np.percentile(recent[name], (50, 90, 99))
+            phases[name] = {"count": totals[name][0], "total": totals[name][1], "p50": p50, "p90": p90,
+                            "p99": p99, "max": max(recent[name]), "bytes": nbytes.get(name, 0)}
+        return {"phases": phases, "counters": counters, "elapsed": elapsed}
+
+    def report(self):
+        """
+        Returns the summary as a printable table, durations in milliseconds.
+        """
+        summary = self.summary()
+        lines = [f"{'phase':<16}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}{'MB':>10}"]
+        for name, phase in summary["phases"].items():
+            lines.append(f"{name:<16}{phase['count']:>8}{phase['p50'] * 1000:>10.2f}{phase['p90'] * 1000:>10.2f}"
+                         f"{phase['p99'] * 1000:>10.2f}{phase['max'] * 1000:>10.2f}{phase['bytes'] / 1e6:>10.1f}")
+        for name, value in summary["counters"].items():
+            lines.append(f"{name}: {value} ({value / max(summary['elapsed'], 1e-9):.1f}/s)")
+        return "\n".join(lines)
+
+    def report_line(self):
+        """
+        Returns the median duration of each phase on one line, for a status bar.
+        """
+        summary = self.summary()
+        phases = [f"{name} {phase['p50'] * 1000:.1f} ms" for name, phase in summary["phases"].items()]
+        counters = [f"{name} {value}" for name, value in summary["counters"].items()]
+        return " | ".join(phases + counters)
+
+# Instrumentation shared by the scan pipeline, disabled until enabled is set
+instrumentation = Instrumentation()
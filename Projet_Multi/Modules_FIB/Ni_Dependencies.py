@@ -5,9 +5,12 @@ Created on Sat Feb 10 23:29:55 2024
 @author: Thomas
 """
 
+import numpy as np
 import nidaqmx
-from nidaqmx.constants import AcquisitionType, TerminalConfiguration, Edge
+from nidaqmx.constants import AcquisitionType, TerminalConfiguration, Edge, RegenerationMode, ReadRelativeTo, OverwriteMode, TaskMode
 from nidaqmx.stream_writers import AnalogMultiChannelWriter
+from nidaqmx.stream_readers import AnalogSingleChannelReader
+from Modules_FIB.Instrumentation import instrumentation
 
 def Ni_Cards_System():
     """
@@ -86,7 +89,7 @@ def initial_voltage_setting(min_tension, max_tension, channel_ud):
 
 def configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
                     sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
-                    vertical_staircase):
+                    vertical_staircase, write_frequency=None):
     """
     Configures and returns tasks for writing and reading signals.
 
@@ -106,6 +109,9 @@ def configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tensi
         complete_horizontal_staircase (numpy.array): The complete scanning signal for left-right scanning.
         total_samples_to_read (int): The total number of samples to read during data acquisition.
         vertical_staircase (numpy.array): The unique vertical scanning signal for the entire image.
+        write_frequency (float): The rate of the scanning signals, in Hz. Defaults to sampling_frequency.
+            With one written sample per pixel this is the pixel rate, and the read task
+            oversamples it by sampling_frequency / write_frequency.
 
     Returns:
         tuple: A tuple containing two nidaqmx task objects configured for writing and reading signals.
@@ -122,10 +128,8 @@ def configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tensi
                                                   terminal_config=TerminalConfiguration.DIFF)
     
         # Timing configuration
-        write_task.timing.cfg_samp_clk_timing(rate=sampling_frequency, sample_mode=AcquisitionType.FINITE,
-                                              samps_per_chan=len(complete_horizontal_staircase))
-        read_task.timing.cfg_samp_clk_timing(rate=sampling_frequency, sample_mode=AcquisitionType.FINITE,
-                                             samps_per_chan=total_samples_to_read)
+        configure_timing(write_task, read_task, sampling_frequency, len(complete_horizontal_staircase),
+                         total_samples_to_read, write_frequency)
     
         # Trigger the read task at the start of the write task
         read_trigger_source = '/' + channel_lr.split('/')[0] + '/ao/StartTrigger'
@@ -134,12 +138,375 @@ def configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tensi
         print("Configuration success")
         
         
+    except ValueError:
+        write_task.close()
+        read_task.close()
+        raise
     except Exception as e:
         print("Error while task configuration:", e)
 
     return write_task, read_task
 
-def write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout):
+def configure_timing(write_task, read_task, sampling_frequency, total_samples_to_write, total_samples_to_read,
+                     write_frequency=None):
+    """
+    Configures the finite sample clocks of already configured tasks.
+
+    Called by configure_tasks, and on its own to change the timing of tasks kept alive
+    between acquisitions without recreating them.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+        sampling_frequency (float): The sampling frequency for data acquisition, in Hz.
+        total_samples_to_write (int): The number of samples written per channel.
+        total_samples_to_read (int): The total number of samples to read during data acquisition.
+        write_frequency (float): The rate of the scanning signals, in Hz. Defaults to sampling_frequency.
+
+    Returns:
+        None
+    """
+    if write_frequency is None:
+        write_frequency = sampling_frequency
+    write_task.timing.cfg_samp_clk_timing(rate=write_frequency, sample_mode=AcquisitionType.FINITE,
+                                          samps_per_chan=total_samples_to_write)
+    read_task.timing.cfg_samp_clk_timing(rate=sampling_frequency, sample_mode=AcquisitionType.FINITE,
+                                         samps_per_chan=total_samples_to_read)
+    check_clock_ratio(write_task, read_task)
+
+def commit_tasks(write_task, read_task):
+    """
+    Commits both tasks so that the resources stay reserved and programmed.
+
+    Starting and stopping a committed task only arms and disarms the hardware, which
+    is much faster than the implicit verify/reserve/commit of an uncommitted task.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+
+    Returns:
+        None
+
+    Raises:
+        nidaqmx.DaqError: If the resources cannot be reserved.
+    """
+    write_task.control(TaskMode.TASK_COMMIT)
+    read_task.control(TaskMode.TASK_COMMIT)
+
+def check_clock_ratio(write_task, read_task):
+    """
+    Locks the read sample clock to the write sample clock, at an integer ratio.
+
+    The read sample clock is divided from the timebase of the write sample clock, and
+    both are started by the same trigger, so the two clocks stay in phase as long as the
+    rates coerced by the driver keep an integer ratio. Otherwise the pixels would slowly
+    drift in the samples, so the configuration is refused.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+
+    Returns:
+        int: The oversampling ratio, input samples per output sample.
+
+    Raises:
+        ValueError: If the coerced read rate is not an integer multiple of the write rate.
+    """
+    read_task.timing.samp_clk_timebase_src = write_task.timing.samp_clk_timebase_src
+    read_task.timing.samp_clk_timebase_rate = write_task.timing.samp_clk_timebase_rate
+    ratio = read_task.timing.samp_clk_rate / write_task.timing.samp_clk_rate
+    if abs(ratio - round(ratio)) > 1e-6:
+        raise ValueError(f"The read rate {read_task.timing.samp_clk_rate} Hz is not a multiple of the write rate "
+                         f"{write_task.timing.samp_clk_rate} Hz (ratio {ratio}), choose a time per pixel that is a "
+                         f"whole number of samples")
+    return int(round(ratio))
+
+def configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                               sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                               frames_buffered=4, write_frequency=None):
+    """
+    Configures and returns tasks for continuous (video) scanning.
+
+    The write task regenerates the raster buffer endlessly in AcquisitionType.CONTINUOUS,
+    and the read task streams the input signal without ever being stopped. Both tasks share
+    the same start trigger, so the first sample of the read stream is the first sample of a
+    frame and every frame can be cut from the stream by its sample index (see read_frame).
+    The read buffer holds several frames and old samples are overwritten, so a slow consumer
+    only loses whole frames instead of stopping the acquisition.
+
+    Args:
+        channel_lr (str): The name of the analog output channel for left-right scanning.
+        channel_ud (str): The name of the analog output channel for up-down scanning.
+        channel_read (str): The name of the analog input channel for reading the signal.
+        min_tension (float): The minimum voltage that can be output by the analog output channels.
+        max_tension (float): The maximum voltage that can be output by the analog output channels.
+        sampling_frequency (float): The sampling frequency for data acquisition, in Hz.
+        complete_horizontal_staircase (numpy.array): The complete scanning signal for left-right scanning.
+        samples_per_frame (int): The number of samples read for one frame.
+        frames_buffered (int): The number of frames the read buffer can hold.
+        write_frequency (float): The rate of the scanning signals, in Hz. Defaults to sampling_frequency.
+
+    Returns:
+        tuple: A tuple containing two nidaqmx task objects configured for writing and reading signals.
+
+    """
+    try:
+        write_task = nidaqmx.Task()
+        read_task = nidaqmx.Task()
+
+        # Channels configuration
+        write_task.ao_channels.add_ao_voltage_chan(channel_lr, min_val=min_tension, max_val=max_tension)
+        write_task.ao_channels.add_ao_voltage_chan(channel_ud, min_val=min_tension, max_val=max_tension)
+        read_task.ai_channels.add_ai_voltage_chan(channel_read, min_val=min_tension, max_val=max_tension,
+                                                  terminal_config=TerminalConfiguration.DIFF)
+
+        # Timing configuration, the write buffer is regenerated for every frame
+        if write_frequency is None:
+            write_frequency = sampling_frequency
+        write_task.timing.cfg_samp_clk_timing(rate=write_frequency, sample_mode=AcquisitionType.CONTINUOUS,
+                                              samps_per_chan=len(complete_horizontal_staircase))
+        write_task.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+        read_task.timing.cfg_samp_clk_timing(rate=sampling_frequency, sample_mode=AcquisitionType.CONTINUOUS,
+                                             samps_per_chan=samples_per_frame * frames_buffered)
+        check_clock_ratio(write_task, read_task)
+
+        # Frames are located in the stream by their sample index
+        read_task.in_stream.over_write = OverwriteMode.OVERWRITE_UNREAD_SAMPLES
+        read_task.in_stream.relative_to = ReadRelativeTo.CURRENT_READ_POSITION
+
+        # Trigger the read task at the start of the write task
+        read_trigger_source = '/' + channel_lr.split('/')[0] + '/ao/StartTrigger'
+        read_task.triggers.start_trigger.cfg_dig_edge_start_trig(read_trigger_source, trigger_edge=Edge.RISING)
+
+    except Exception:
+        write_task.close()
+        read_task.close()
+        raise
+
+    return write_task, read_task
+
+def start_tasks(write_task, read_task):
+    """
+    Starts an acquisition that is read while running (continuous or streamed line by line).
+
+    The scanning signals (or their first lines) must already be written to the write task.
+    The read task is started first so that it is armed when the write task emits its start trigger.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+
+    Returns:
+        None
+
+    Raises:
+        nidaqmx.DaqError: If a task cannot be started.
+    """
+    with instrumentation.phase("start"):
+        read_task.start()
+        write_task.start()
+
+def samples_acquired(read_task):
+    """
+    Returns the number of samples acquired by the task since it was started.
+
+    The counter of the card is read, not the samples transferred to the computer, so
+    the progress of an acquisition can be followed from another thread while it is read.
+
+    Args:
+        read_task (nidaqmx.Task): The running read task.
+
+    Returns:
+        int: The number of samples acquired per channel.
+
+    """
+    return read_task.in_stream.total_samp_per_chan_acquired
+
+def read_frame(read_task, samples_per_frame, next_frame, timeout, buffer=None):
+    """
+    Reads one complete frame from a continuous acquisition.
+
+    Frame k occupies the samples [k * samples_per_frame, (k + 1) * samples_per_frame) of the
+    read stream. The newest complete frame is returned, but never one older than next_frame,
+    so frames are never repeated. If the consumer fell behind, the stale frames are skipped
+    by moving the read position instead of reading them.
+
+    Args:
+        read_task (nidaqmx.Task): The task configured with configure_continuous_tasks.
+        samples_per_frame (int): The number of samples in one frame.
+        next_frame (int): The index of the first frame that has not been read yet.
+        timeout (float): The maximum timeout for the frame acquisition, in seconds.
+        buffer (ReadBuffer): Optional preallocated buffer receiving the samples.
+
+    Returns:
+        tuple: The raw data of the frame and the index of that frame.
+
+    """
+    # Index of the newest frame completely acquired
+    acquired = read_task.in_stream.total_samp_per_chan_acquired
+    frame_index = max(next_frame, acquired // samples_per_frame - 1)
+
+    # Move the read position to the first sample of the frame
+    read_task.in_stream.offset = frame_index * samples_per_frame - read_task.in_stream.curr_read_pos
+    try:
+        raw_data = read_samples(read_task, samples_per_frame, timeout, buffer)
+    finally:
+        read_task.in_stream.offset = 0
+    return raw_data, frame_index
+
+def configure_line_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                         sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                         total_samples_to_read, lines_buffered=4):
+    """
+    Configures and returns tasks for a frame streamed one line at a time.
+
+    Regeneration is disabled on the write task and its buffer only holds lines_buffered
+    lines, so the scanning signals are written line by line while the frame is running
+    (see stream_writer) instead of being materialised for the whole frame.
+
+    Args:
+        channel_lr (str): The name of the analog output channel for left-right scanning.
+        channel_ud (str): The name of the analog output channel for up-down scanning.
+        channel_read (str): The name of the analog input channel for reading the signal.
+        min_tension (float): The minimum voltage that can be output by the analog output channels.
+        max_tension (float): The maximum voltage that can be output by the analog output channels.
+        sampling_frequency (float): The sampling frequency for data acquisition, in Hz.
+        write_frequency (float): The rate of the scanning signals (pixel rate), in Hz.
+        samples_per_line (int): The number of samples written for one line.
+        total_samples_to_write (int): The number of samples written for the entire image.
+        total_samples_to_read (int): The total number of samples to read during data acquisition.
+        lines_buffered (int): The number of lines the write buffer can hold.
+
+    Returns:
+        tuple: A tuple containing two nidaqmx task objects configured for writing and reading signals.
+
+    """
+    try:
+        write_task = nidaqmx.Task()
+        read_task = nidaqmx.Task()
+
+        # Channels configuration
+        write_task.ao_channels.add_ao_voltage_chan(channel_lr, min_val=min_tension, max_val=max_tension)
+        write_task.ao_channels.add_ao_voltage_chan(channel_ud, min_val=min_tension, max_val=max_tension)
+        read_task.ai_channels.add_ai_voltage_chan(channel_read, min_val=min_tension, max_val=max_tension,
+                                                  terminal_config=TerminalConfiguration.DIFF)
+
+        # Timing configuration, the write buffer is only a few lines long and never regenerated
+        write_task.timing.cfg_samp_clk_timing(rate=write_frequency, sample_mode=AcquisitionType.FINITE,
+                                              samps_per_chan=total_samples_to_write)
+        write_task.out_stream.regen_mode = RegenerationMode.DONT_ALLOW_REGENERATION
+        write_task.out_stream.output_buf_size = samples_per_line * lines_buffered
+        read_task.timing.cfg_samp_clk_timing(rate=sampling_frequency, sample_mode=AcquisitionType.FINITE,
+                                             samps_per_chan=total_samples_to_read)
+        check_clock_ratio(write_task, read_task)
+
+        # Trigger the read task at the start of the write task
+        read_trigger_source = '/' + channel_lr.split('/')[0] + '/ao/StartTrigger'
+        read_task.triggers.start_trigger.cfg_dig_edge_start_trig(read_trigger_source, trigger_edge=Edge.RISING)
+
+    except Exception:
+        write_task.close()
+        read_task.close()
+        raise
+
+    return write_task, read_task
+
+def stream_writer(write_task):
+    """
+    Returns a writer used to feed a running write task, one block of samples at a time.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+
+    Returns:
+        AnalogMultiChannelWriter: Its write_many_sample(data, timeout) blocks until the
+        buffer of the task has room for data.
+    """
+    return AnalogMultiChannelWriter(write_task.out_stream, auto_start=False)
+
+def wait_and_stop(write_task, read_task, timeout):
+    """
+    Waits for the end of a finite generation, then stops both tasks.
+
+    Args:
+        write_task (nidaqmx.Task): The task configured for writing scanning signals.
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+        timeout (float): The maximum time to wait, in seconds.
+
+    Returns:
+        None
+
+    Raises:
+        nidaqmx.DaqError: If the generation fails or does not end within timeout, the tasks
+            being stopped anyway.
+    """
+    with instrumentation.phase("wait"):
+        try:
+            write_task.wait_until_done(timeout=timeout)
+        finally:
+            write_task.stop()
+            read_task.stop()
+
+class ReadBuffer:
+    """
+    Reusable numpy buffer filled directly by the driver.
+
+    read_task.read() returns a Python list with one boxed float per sample, which then has
+    to be converted with np.array(). A ReadBuffer owns a preallocated float64 array and an
+    AnalogSingleChannelReader, so the samples are copied once by the driver into the array
+    and the same memory is reused for every read.
+
+    Attributes:
+        reader (AnalogSingleChannelReader): The stream reader bound to the read task.
+        data (numpy.array): The preallocated float64 array receiving the samples.
+    """
+
+    def __init__(self, read_task, samples):
+        """
+        Args:
+            read_task (nidaqmx.Task): The task configured for reading the input signal.
+            samples (int): The maximum number of samples read at once.
+        """
+        self.reader = AnalogSingleChannelReader(read_task.in_stream)
+        self.data = np.empty(samples, dtype=np.float64)
+
+    def read(self, samples, timeout):
+        """
+        Reads samples into the buffer.
+
+        Args:
+            samples (int): The number of samples to read.
+            timeout (float): The maximum timeout for data acquisition, in seconds.
+
+        Returns:
+            numpy.array: A view on the part of the buffer holding the samples. It is
+            overwritten by the next read.
+        """
+        view = self.data[:samples]
+        with instrumentation.phase("read", view.nbytes):
+            self.reader.read_many_sample(view, number_of_samples_per_channel=samples, timeout=timeout)
+        return view
+
+def read_samples(read_task, total_samples_to_read, timeout, buffer=None):
+    """
+    Reads samples from the read task, into buffer when one is given.
+
+    Args:
+        read_task (nidaqmx.Task): The task configured for reading the input signal.
+        total_samples_to_read (int): The number of samples to read.
+        timeout (float): The maximum timeout for data acquisition, in seconds.
+        buffer (ReadBuffer): Optional preallocated buffer bound to read_task.
+
+    Returns:
+        list or numpy.array: The raw data, a view on the buffer when one is given.
+    """
+    if buffer is None:
+        with instrumentation.phase("read", total_samples_to_read * 8):
+            return read_task.read(number_of_samples_per_channel=total_samples_to_read, timeout=timeout)
+    return buffer.read(total_samples_to_read, timeout)
+
+def write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout, buffer=None):
     """
    Writes scanning signals and reads the input signal simultaneously.
 
@@ -153,6 +520,7 @@ def write_and_read(write_task, read_task, data_to_write,total_samples_to_read, t
        data_to_write (numpy.array): The data to be written to the analog output channels.
        total_samples_to_read (int): The total number of samples to read during data acquisition.
        timeout (float): The maximum timeout for data acquisition, in seconds.
+       buffer (ReadBuffer): Optional preallocated buffer receiving the samples.
 
    Returns:
        numpy.array: The raw data read from the analog input channel.
@@ -163,20 +531,23 @@ def write_and_read(write_task, read_task, data_to_write,total_samples_to_read, t
         writer = AnalogMultiChannelWriter(write_task.out_stream)
     
         # Write both signals at the same time
-        writer.write_many_sample(data_to_write)
+        with instrumentation.phase("write", data_to_write.nbytes):
+            writer.write_many_sample(data_to_write)
     
         # Start the tasks
-        read_task.start()
-        write_task.start()
+        with instrumentation.phase("start"):
+            read_task.start()
+            write_task.start()
     
         # Read the data for the entire image
-        raw_data = read_task.read(number_of_samples_per_channel=total_samples_to_read, timeout=timeout)
+        raw_data = read_samples(read_task, total_samples_to_read, timeout, buffer)
         
         # Wait for the end of the tasks
-        write_task.wait_until_done(timeout=timeout)
+        with instrumentation.phase("wait"):
+            write_task.wait_until_done(timeout=timeout)
         
-        write_task.stop()
-        read_task.stop()
+            write_task.stop()
+            read_task.stop()
         print("Reading&Writing success")
         
         
@@ -190,10 +561,11 @@ def writer(write_task,data_to_write):
         writer = AnalogMultiChannelWriter(write_task.out_stream)
     
         # Write both signals at the same time
-        writer.write_many_sample(data_to_write)
+        with instrumentation.phase("write", data_to_write.nbytes):
+            writer.write_many_sample(data_to_write)
     except Exception as e:
          print("Error while writer's definition", e)   
-def quickwrite_and_read(write_task, read_task,total_samples_to_read, timeout):
+def quickwrite_and_read(write_task, read_task,total_samples_to_read, timeout, buffer=None):
     """
    Writes scanning signals and reads the input signal simultaneously.
 
@@ -207,6 +579,7 @@ def quickwrite_and_read(write_task, read_task,total_samples_to_read, timeout):
        data_to_write (numpy.array): The data to be written to the analog output channels.
        total_samples_to_read (int): The total number of samples to read during data acquisition.
        timeout (float): The maximum timeout for data acquisition, in seconds.
+       buffer (ReadBuffer): Optional preallocated buffer receiving the samples.
 
    Returns:
        numpy.array: The raw data read from the analog input channel.
@@ -215,17 +588,19 @@ def quickwrite_and_read(write_task, read_task,total_samples_to_read, timeout):
     try :
     
         # Start the tasks
-        read_task.start()
-        write_task.start()
+        with instrumentation.phase("start"):
+            read_task.start()
+            write_task.start()
     
         # Read the data for the entire image
-        raw_data = read_task.read(number_of_samples_per_channel=total_samples_to_read, timeout=timeout)
+        raw_data = read_samples(read_task, total_samples_to_read, timeout, buffer)
     
         # Wait for the end of the tasks
-        write_task.wait_until_done(timeout=timeout)
+        with instrumentation.phase("wait"):
+            write_task.wait_until_done(timeout=timeout)
         
-        write_task.stop()
-        read_task.stop()
+            write_task.stop()
+            read_task.stop()
         print("Reading&Writing success")
         
         
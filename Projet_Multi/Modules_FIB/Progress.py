@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 15:02:18 2026
+
+@author: Thomas
+"""
+import threading
+import time
+
+class Progress:
+    """
+    Progress of the running acquisition, from the sample counter of the card.
+
+    The scanning functions attach their read task while it acquires and detach it before
+    closing it. The interface polls fraction() and eta() at its own rate, each call reads
+    the acquired-sample counter of the backend once, so nothing runs between two polls.
+
+    An acquisition made of several tasks or frames calls begin() with the samples of all
+    of them, the samples of the detached tasks are then added up. Without begin() the
+    total is the one of the attached task. Streamed acquisitions without a task counter
+    can report their chunks with advance().
+
+    Attributes:
+        total (int): The number of samples of the whole acquisition, 0 when unknown.
+        done (int): The number of samples of the detached tasks and of advance().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.sampling_frequency = None
+        self._backend = None
+        self._read_task = None
+        self._task_samples = 0
+        self._begun = False
+        self._start_time = None
+
+    def begin(self, total_samples=0, sampling_frequency=None):
+        """
+        Starts tracking an acquisition of total_samples samples, 0 for the samples of the next attached task.
+        """
+        with self._lock:
+            self.total = total_samples
+            self.done = 0
+            self.sampling_frequency = sampling_frequency
+            self._backend = None
+            self._read_task = None
+            self._begun = total_samples > 0
+            self._start_time = time.perf_counter()
+
+    def attach(self, backend, read_task, samples, sampling_frequency=None):
+        """
+        Follows the counter of read_task, which acquires samples samples.
+        """
+        with self._lock:
+            if not self._begun:
+                self.total = self.done + samples
+            if sampling_frequency is not None:
+                self.sampling_frequency = sampling_frequency
+            if self._start_time is None:
+                self._start_time = time.perf_counter()
+            self._backend = backend
+            self._read_task = read_task
+            self._task_samples = samples
+
+    def detach(self):
+        """
+        Stops following the task, its samples are counted as done.
+        """
+        with self._lock:
+            if self._read_task is not None:
+                self.done += self._task_samples
+            self._backend = None
+            self._read_task = None
+
+    def advance(self, samples):
+        """
+        Counts samples acquired outside of an attached task.
+        """
+        with self._lock:
+            self.done += samples
+
+    def finish(self):
+        """
+        Marks the acquisition as complete.
+        """
+        with self._lock:
+            self._backend = None
+            self._read_task = None
+            self.done = max(self.done, self.total)
+            self._begun = False
+            self._start_time = None
+
+    def acquired(self):
+        """
+        Returns the number of samples acquired so far.
+        """
+        with self._lock:
+            backend, read_task, task_samples, done = self._backend, self._read_task, self._task_samples, self.done
+        if read_task is None:
+            return done
+        try:
+            return done + min(backend.samples_acquired(read_task), task_samples)
+        except Exception:
+            # The task may be closed between the copy and the read
+            return done
+
+    def fraction(self):
+        """
+        Returns the completed fraction of the acquisition, between 0 and 1.
+        """
+        if self.total <= 0:
+            return 0.0
+        return min(self.acquired() / self.total, 1.0)
+
+    def eta(self):
+        """
+        Returns the estimated remaining time in seconds, None when unknown.
+
+        The remaining samples are divided by the sampling frequency when known, otherwise
+        by the rate measured since begin().
+        """
+        acquired = self.acquired()
+        remaining = max(self.total - acquired, 0)
+        if self.sampling_frequency:
+            return remaining / self.sampling_frequency
+        if self._start_time is None or acquired == 0:
+            return None
+        return remaining * (time.perf_counter() - self._start_time) / acquired
+
+# Progress of the acquisition in progress, polled by the interface
+progress = Progress()
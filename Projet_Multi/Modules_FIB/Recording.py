@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 15 10:02:14 2026
+
+@author: Thomas
+"""
+import json
+import struct
+import time
+import numpy as np
+from Modules_FIB.Backends import DaqBackend, get_backend
+
+# File layout: MAGIC, then records made of a HEADER and a payload.
+# "PARM" records hold the scan parameters in JSON, "DATA" records the raw float64 samples.
+MAGIC = b"FIBREC1\n"
+HEADER = struct.Struct("<4sQd")   # tag, payload size in bytes, seconds since the start of the recording
+
+
+def scan_params(kind, channels, min_tension, max_tension, sampling_frequency, write_frequency, **counts):
+    """
+    Returns the "PARM" record of a task configuration, as it is read back from the file.
+    """
+    params = {"kind": kind, "channels": list(channels), "min_tension": min_tension, "max_tension": max_tension,
+              "sampling_frequency": sampling_frequency,
+              "write_frequency": write_frequency if write_frequency is not None else sampling_frequency}
+    params.update(counts)
+    return json.loads(json.dumps(params))
+
+
+class StreamRecorder:
+    """
+    Writes scan parameters and raw input samples to a chunked binary file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.start_time = time.perf_counter()
+
+    def _record(self, tag, payload):
+        self.file.write(HEADER.pack(tag, len(payload), time.perf_counter() - self.start_time))
+        self.file.write(payload)
+
+    def write_params(self, params):
+        """
+        Records a dict of scan parameters, it applies to the samples recorded after it.
+        """
+        self._record(b"PARM", json.dumps(params).encode("utf-8"))
+
+    def write_samples(self, samples):
+        """
+        Records a block of raw samples.
+        """
+        self._record(b"DATA", np.ascontiguousarray(samples, dtype=np.float64).tobytes())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class StreamPlayer:
+    """
+    Reads back a file written by StreamRecorder, one record at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a FIB recording")
+
+    def records(self):
+        """
+        Yields (tag, time, payload) tuples: a dict for "PARM", a float64 array for "DATA".
+        """
+        self.file.seek(len(MAGIC))
+        while True:
+            header = self.file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            tag, size, stamp = HEADER.unpack(header)
+            payload = self.file.read(size)
+            if tag == b"PARM":
+                yield "PARM", stamp, json.loads(payload.decode("utf-8"))
+            else:
+                yield "DATA", stamp, np.frombuffer(payload, dtype=np.float64)
+
+    def params(self):
+        """
+        Returns the list of the recorded scan parameters.
+        """
+        return [payload for tag, _, payload in self.records() if tag == "PARM"]
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingReadBuffer:
+    """
+    Read buffer of the RecordingBackend: reads with the buffer of the wrapped backend and records the samples.
+    """
+
+    def __init__(self, buffer, recorder):
+        self.buffer = buffer
+        self.recorder = recorder
+        self.data = buffer.data
+
+    def read(self, samples, timeout):
+        raw_data = self.buffer.read(samples, timeout)
+        self.recorder.write_samples(raw_data)
+        return raw_data
+
+
+class RecordingBackend(DaqBackend):
+    """
+    Backend teeing the raw input samples and the scan parameters of another backend to a file.
+
+    Everything is done by the wrapped backend (the NI card for example), every
+    configuration is recorded as a "PARM" record and every read as a "DATA" record.
+    The file can be played back with ReplayBackend, without the instrument.
+    """
+
+    def __init__(self, path, backend=None):
+        """
+        Args:
+            path (str): The file to record to.
+            backend (DaqBackend): The backend doing the acquisition, the default backend when None.
+        """
+        self.backend = get_backend(backend)
+        self.recorder = StreamRecorder(path)
+
+    @property
+    def hardware(self):
+        return self.backend.hardware
+
+    def _params(self, kind, channels, min_tension, max_tension, sampling_frequency, write_frequency, **counts):
+        self.recorder.write_params(scan_params(kind, channels, min_tension, max_tension, sampling_frequency,
+                                               write_frequency, **counts))
+
+    def device_names(self):
+        return self.backend.device_names()
+
+    def ao_channels(self, port_dev):
+        return self.backend.ao_channels(port_dev)
+
+    def ai_channels(self, port_dev):
+        return self.backend.ai_channels(port_dev)
+
+    def reset_card(self, port_dev):
+        self.backend.reset_card(port_dev)
+
+    def initial_voltage_setting(self, min_tension, max_tension, channel_ud):
+        self.backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+
+    def configure_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                        vertical_staircase, write_frequency=None):
+        self._params("finite", (channel_lr, channel_ud, channel_read), min_tension, max_tension, sampling_frequency,
+                     write_frequency, samples_to_write=len(complete_horizontal_staircase),
+                     samples_to_read=total_samples_to_read)
+        return self.backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                            sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                                            vertical_staircase, write_frequency)
+
+    def configure_timing(self, write_task, read_task, sampling_frequency, total_samples_to_write,
+                         total_samples_to_read, write_frequency=None):
+        self._params("timing", (), None, None, sampling_frequency, write_frequency,
+                     samples_to_write=total_samples_to_write, samples_to_read=total_samples_to_read)
+        self.backend.configure_timing(write_task, read_task, sampling_frequency, total_samples_to_write,
+                                      total_samples_to_read, write_frequency)
+
+    def configure_continuous_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                   sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                                   frames_buffered=4, write_frequency=None):
+        self._params("continuous", (channel_lr, channel_ud, channel_read), min_tension, max_tension,
+                     sampling_frequency, write_frequency, samples_to_write=len(complete_horizontal_staircase),
+                     samples_per_frame=samples_per_frame)
+        return self.backend.configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension,
+                                                       max_tension, sampling_frequency, complete_horizontal_staircase,
+                                                       samples_per_frame, frames_buffered, write_frequency)
+
+    def configure_line_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                             sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                             total_samples_to_read, lines_buffered=4):
+        self._params("line", (channel_lr, channel_ud, channel_read), min_tension, max_tension, sampling_frequency,
+                     write_frequency, samples_per_line=samples_per_line, samples_to_write=total_samples_to_write,
+                     samples_to_read=total_samples_to_read)
+        return self.backend.configure_line_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                                 sampling_frequency, write_frequency, samples_per_line,
+                                                 total_samples_to_write, total_samples_to_read, lines_buffered)
+
+    def commit_tasks(self, write_task, read_task):
+        self.backend.commit_tasks(write_task, read_task)
+
+    def start_tasks(self, write_task, read_task):
+        self.backend.start_tasks(write_task, read_task)
+
+    def read_buffer(self, read_task, samples):
+        return RecordingReadBuffer(self.backend.read_buffer(read_task, samples), self.recorder)
+
+    def read_samples(self, read_task, total_samples_to_read, timeout, buffer=None):
+        if isinstance(buffer, RecordingReadBuffer):
+            return buffer.read(total_samples_to_read, timeout)
+        raw_data = self.backend.read_samples(read_task, total_samples_to_read, timeout, buffer)
+        self.recorder.write_samples(raw_data)
+        return raw_data
+
+    def read_frame(self, read_task, samples_per_frame, next_frame, timeout, buffer=None):
+        if isinstance(buffer, RecordingReadBuffer):
+            buffer = buffer.buffer
+        raw_data, frame_index = self.backend.read_frame(read_task, samples_per_frame, next_frame, timeout, buffer)
+        self.recorder.write_samples(raw_data)
+        return raw_data, frame_index
+
+    def samples_acquired(self, read_task):
+        return self.backend.samples_acquired(read_task)
+
+    def stream_writer(self, write_task):
+        return self.backend.stream_writer(write_task)
+
+    def writer(self, write_task, data_to_write):
+        self.backend.writer(write_task, data_to_write)
+
+    def write_and_read(self, write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer=None):
+        if isinstance(buffer, RecordingReadBuffer):
+            buffer = buffer.buffer
+        raw_data = self.backend.write_and_read(write_task, read_task, data_to_write, total_samples_to_read,
+                                               timeout, buffer)
+        self.recorder.write_samples(raw_data)
+        return raw_data
+
+    def quickwrite_and_read(self, write_task, read_task, total_samples_to_read, timeout, buffer=None):
+        if isinstance(buffer, RecordingReadBuffer):
+            buffer = buffer.buffer
+        raw_data = self.backend.quickwrite_and_read(write_task, read_task, total_samples_to_read, timeout, buffer)
+        self.recorder.write_samples(raw_data)
+        return raw_data
+
+    def wait_and_stop(self, write_task, read_task, timeout):
+        self.backend.wait_and_stop(write_task, read_task, timeout)
+
+    def close(self, write_task, read_task):
+        self.backend.close(write_task, read_task)
+
+    def close_recording(self):
+        """
+        Closes the recording file.
+        """
+        self.recorder.close()
+
+
+class ReplayTask:
+    """
+    Task handle of the ReplayBackend.
+    """
+
+    def __init__(self, samples=None):
+        self.samples = samples
+        self.acquired = 0
+
+
+class ReplayReadBuffer:
+    """
+    Read buffer of the ReplayBackend.
+    """
+
+    def __init__(self, backend, read_task, samples):
+        self.backend = backend
+        self.read_task = read_task
+        self.data = np.empty(samples, dtype=np.float64)
+
+    def read(self, samples, timeout):
+        view = self.data[:samples]
+        self.backend._take(view)
+        self.read_task.acquired += samples
+        return view
+
+
+class ReplayBackend(DaqBackend):
+    """
+    Backend playing back the samples of a recording instead of acquiring them.
+
+    The written signals are ignored and every read returns the next recorded samples, so
+    the scanning functions called with the same parameters as during the recording get
+    the same raw data. With speed=None the samples are returned as fast as possible, with
+    speed=1.0 at the recorded pace (2.0 twice as fast...).
+
+    Every configuration is compared with the next recorded "PARM" record, and every
+    read with the sample counts of that record: a scan that differs from the recording
+    raises a ValueError instead of silently getting samples of another scan.
+    """
+
+    def __init__(self, path, speed=None, loop=False):
+        """
+        Args:
+            path (str): The recording to play back.
+            speed (float): The playback speed relative to the recording, unlimited when None.
+            loop (bool): Whether to start again at the end of the recording.
+        """
+        self.player = StreamPlayer(path)
+        self.speed = speed
+        self.loop = loop
+        self.params = self.player.params()
+        self._restart()
+
+    def _restart(self):
+        self._records = self.player.records()
+        self._pending = np.empty(0)
+        self._start_time = time.perf_counter()
+        self._next_params = 0
+
+    def _check(self, kind, channels, min_tension, max_tension, sampling_frequency, write_frequency, **counts):
+        """
+        Compares a configuration with the next recorded one.
+
+        Raises:
+            ValueError: If the configuration is not the recorded one.
+            EOFError: If every recorded configuration was already played back.
+        """
+        if self._next_params == len(self.params):
+            if not self.loop or not self.params:
+                raise EOFError(f"No more configurations in the recording {self.player.path}")
+            self._next_params = 0
+        recorded = self.params[self._next_params]
+        requested = scan_params(kind, channels, min_tension, max_tension, sampling_frequency, write_frequency,
+                                **counts)
+        if requested != recorded:
+            different = sorted(key for key in recorded.keys() | requested.keys()
+                               if recorded.get(key) != requested.get(key))
+            raise ValueError(f"The scan does not match the configuration {self._next_params} of the recording "
+                             f"{self.player.path}: "
+                             + ", ".join(f"{key} {requested.get(key)} instead of {recorded.get(key)}"
+                                         for key in different))
+        self._next_params += 1
+
+    @staticmethod
+    def _check_counts(write_task, read_task, samples_to_write, samples_to_read):
+        if samples_to_write is not None and write_task.samples not in (None, samples_to_write):
+            raise ValueError(f"{samples_to_write} samples written instead of the {write_task.samples} recorded")
+        if read_task.samples not in (None, samples_to_read):
+            raise ValueError(f"{samples_to_read} samples read instead of the {read_task.samples} recorded")
+
+    def _next_data(self):
+        for tag, stamp, payload in self._records:
+            if tag == "DATA":
+                if self.speed:
+                    remaining = self._start_time + stamp / self.speed - time.perf_counter()
+                    if remaining > 0:
+                        time.sleep(remaining)
+                return payload
+        if self.loop:
+            self._restart()
+            return self._next_data()
+        raise EOFError(f"End of the recording {self.player.path}")
+
+    def _take(self, out):
+        """
+        Fills out with the next recorded samples.
+        """
+        filled = 0
+        while filled < len(out):
+            if len(self._pending) == 0:
+                self._pending = self._next_data()
+            count = min(len(out) - filled, len(self._pending))
+            out[filled:filled + count] = self._pending[:count]
+            self._pending = self._pending[count:]
+            filled += count
+
+    def device_names(self):
+        return ["Replay"]
+
+    def ao_channels(self, port_dev):
+        return [f"{port_dev}/ao0", f"{port_dev}/ao1"]
+
+    def ai_channels(self, port_dev):
+        return [f"{port_dev}/ai0"]
+
+    def reset_card(self, port_dev):
+        pass
+
+    def initial_voltage_setting(self, min_tension, max_tension, channel_ud):
+        pass
+
+    def configure_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                        vertical_staircase, write_frequency=None):
+        self._check("finite", (channel_lr, channel_ud, channel_read), min_tension, max_tension, sampling_frequency,
+                    write_frequency, samples_to_write=len(complete_horizontal_staircase),
+                    samples_to_read=total_samples_to_read)
+        return ReplayTask(len(complete_horizontal_staircase)), ReplayTask(total_samples_to_read)
+
+    def configure_timing(self, write_task, read_task, sampling_frequency, total_samples_to_write,
+                         total_samples_to_read, write_frequency=None):
+        self._check("timing", (), None, None, sampling_frequency, write_frequency,
+                    samples_to_write=total_samples_to_write, samples_to_read=total_samples_to_read)
+        write_task.samples = total_samples_to_write
+        read_task.samples = total_samples_to_read
+
+    def configure_continuous_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                   sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                                   frames_buffered=4, write_frequency=None):
+        self._check("continuous", (channel_lr, channel_ud, channel_read), min_tension, max_tension,
+                    sampling_frequency, write_frequency, samples_to_write=len(complete_horizontal_staircase),
+                    samples_per_frame=samples_per_frame)
+        return ReplayTask(), ReplayTask()
+
+    def configure_line_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                             sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                             total_samples_to_read, lines_buffered=4):
+        self._check("line", (channel_lr, channel_ud, channel_read), min_tension, max_tension, sampling_frequency,
+                    write_frequency, samples_per_line=samples_per_line, samples_to_write=total_samples_to_write,
+                    samples_to_read=total_samples_to_read)
+        return ReplayTask(), ReplayTask(total_samples_to_read)
+
+    def commit_tasks(self, write_task, read_task):
+        pass
+
+    def start_tasks(self, write_task, read_task):
+        read_task.acquired = 0
+
+    def read_buffer(self, read_task, samples):
+        return ReplayReadBuffer(self, read_task, samples)
+
+    def read_samples(self, read_task, total_samples_to_read, timeout, buffer=None):
+        if buffer is None:
+            raw_data = np.empty(total_samples_to_read)
+            self._take(raw_data)
+            read_task.acquired += total_samples_to_read
+            return raw_data
+        return buffer.read(total_samples_to_read, timeout)
+
+    def samples_acquired(self, read_task):
+        # The recorded samples are counted once played back
+        return read_task.acquired
+
+    def read_frame(self, read_task, samples_per_frame, next_frame, timeout, buffer=None):
+        return self.read_samples(read_task, samples_per_frame, timeout, buffer), next_frame
+
+    def stream_writer(self, write_task):
+        return self
+
+    def write_many_sample(self, data, timeout=10.0):
+        pass
+
+    def writer(self, write_task, data_to_write):
+        pass
+
+    def write_and_read(self, write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer=None):
+        self._check_counts(write_task, read_task, np.shape(data_to_write)[-1], total_samples_to_read)
+        return self.quickwrite_and_read(write_task, read_task, total_samples_to_read, timeout, buffer)
+
+    def quickwrite_and_read(self, write_task, read_task, total_samples_to_read, timeout, buffer=None):
+        self._check_counts(write_task, read_task, None, total_samples_to_read)
+        self.start_tasks(write_task, read_task)
+        return self.read_samples(read_task, total_samples_to_read, timeout, buffer)
+
+    def wait_and_stop(self, write_task, read_task, timeout):
+        pass
+
+    def close(self, write_task, read_task):
+        pass
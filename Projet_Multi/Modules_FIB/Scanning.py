@@ -1,9 +1,422 @@
 import numpy as np
-from Modules_FIB import Ni_Dependencies as NID
+from Modules_FIB.Backends import get_backend
+from Modules_FIB.WaveformCache import waveforms
+from Modules_FIB.Instrumentation import instrumentation
+from Modules_FIB.Progress import progress
+from Modules_FIB.Timing import ScanTiming, scan_timing
+from Modules_FIB import ImageProcessing as ImPr
+from Modules_FIB.Distortion import scan_distortion, find_grid_points, grid_targets
 #import Ni_Dependencies as NID
-import time
 
-def Scanning_Rise(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read):
+def scan_window(roi, min_tension, max_tension):
+    """
+    Returns the voltage window of a scan as (x_min, x_max, y_min, y_max).
+
+    Parameters:
+    - roi: (x_min, x_max, y_min, y_max) in volts, None for the whole field.
+    - min_tension, max_tension: Voltage range of the field.
+
+    Raises:
+    - ValueError if the window is empty or outside of the field.
+    """
+    if roi is None:
+        return (min_tension, max_tension, min_tension, max_tension)
+    x_min, x_max, y_min, y_max = (float(tension) for tension in roi)
+    if not (min_tension <= x_min < x_max <= max_tension and min_tension <= y_min < y_max <= max_tension):
+        raise ValueError(f"The region of interest {roi} must be a non-empty window within "
+                         f"[{min_tension}, {max_tension}] V")
+    return (x_min, x_max, y_min, y_max)
+
+def transformed(transform):
+    """
+    Returns whether transform changes the scan, neither None nor the identity.
+    """
+    return transform is not None and not transform.is_identity
+
+def transform_key(transform):
+    """
+    Returns the part of the waveform keys describing transform and the distortion correction
+    (Distortion.scan_distortion), None for neither.
+    """
+    correction = scan_distortion.key()
+    if not transformed(transform) and correction is None:
+        return None
+    return (transform.key() if transformed(transform) else None, correction)
+
+def transform_staircases(staircases, transform, window, min_tension, max_tension):
+    """
+    Returns the (2, n) staircases rotated, zoomed and panned by transform (see Transform.ScanTransform),
+    then corrected for the distortion of the deflection (see Distortion.scan_distortion).
+
+    The staircases are returned unchanged without transform and correction, otherwise
+    they are mapped at once by the matrix of the transform and the polynomial of the
+    correction.
+
+    Parameters:
+    - staircases: (2, n) NumPy array, horizontal then vertical voltages.
+    - transform: Transform.ScanTransform of the scan, or None.
+    - window: Voltage window of the scan, (x_min, x_max, y_min, y_max).
+    - min_tension, max_tension: Voltage range of the field.
+
+    Raises:
+    - ValueError if the transformed window leaves the field.
+    """
+    if transformed(transform):
+        transform.check(window, min_tension, max_tension)
+        staircases = transform.apply(staircases)
+    return scan_distortion.correct(staircases, min_tension, max_tension)
+
+def frame_timing(time_per_pixel, sampling_frequency, pixels_number, timing=None, pixels_y=None):
+    """
+    Returns the sample counts of a frame for a timing model.
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+
+    Returns:
+    - samples_per_step, settling_pixels, delay_samples, total_samples_to_read and the timeout in seconds.
+    """
+    timing = timing if timing is not None else scan_timing
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    total_samples_to_read = timing.samples_to_read(pixels_number, samples_per_step, pixels_y)
+    timeout = total_samples_to_read / sampling_frequency + 1
+    return (samples_per_step, timing.settling_pixels(samples_per_step), timing.delay_samples, total_samples_to_read,
+            timeout)
+
+def frame_rows(raw_data, samples_per_step, pixels_number, settling_pixels=0, delay_samples=0, pixels_y=None):
+    """
+    Returns the samples of each line of a frame, without the delay and the settling.
+
+    Parameters:
+    - raw_data: Raw samples of the frame, list or 1D NumPy array.
+    - samples_per_step: Number of samples per pixel.
+    - pixels_number: Number of pixels per row in the image.
+    - settling_pixels: Number of pixels held at the start of each line.
+    - delay_samples: Number of samples read before the first line.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+
+    Returns:
+    - A (pixels_y, pixels_number * samples_per_step) view of the raw data when it is a NumPy array.
+    """
+    lines = pixels_number if pixels_y is None else pixels_y
+    samples_per_line = (pixels_number + settling_pixels) * samples_per_step
+    raw_data_array = np.asarray(raw_data)[delay_samples:delay_samples + lines * samples_per_line]
+    return raw_data_array.reshape(lines, samples_per_line)[:, settling_pixels * samples_per_step:]
+
+def reconstruct_image(raw_data, samples_per_step, pixels_number, settling_pixels=0, delay_samples=0, pixels_y=None):
+    """
+    Averages the raw samples of a frame into an image.
+
+    The raw data is only reshaped and sliced (no copy when it already is a numpy array,
+    for example a view on a read buffer): the samples of the delay and of the settling
+    at the start of each line are skipped, and the mean over each group of
+    samples_per_step samples gives the pixel value.
+
+    Parameters:
+    - raw_data: Raw samples of the frame, list or 1D NumPy array.
+    - samples_per_step: Number of samples per pixel.
+    - pixels_number: Number of pixels per row in the image.
+    - settling_pixels: Number of pixels held at the start of each line (see Timing.ScanTiming).
+    - delay_samples: Number of samples between the outputs and the inputs.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+
+    Returns:
+    - A 2D NumPy array of pixels_y rows of pixels_number pixels.
+    """
+    rows = frame_rows(raw_data, samples_per_step, pixels_number, settling_pixels, delay_samples, pixels_y)
+
+    with instrumentation.phase("reconstruct", rows.nbytes):
+        # If there is only one sample per pixel, we skip the averaging process
+        if samples_per_step == 1:
+            image_array = rows.copy()
+        else:
+            # Each group of samples_per_step samples of a line is a pixel
+            image_array = rows.reshape(len(rows), pixels_number, samples_per_step).mean(axis=2)
+    instrumentation.count("frames")
+    return image_array
+
+# Forward/backward offsets of the serpentine scans in samples, estimated once per scan configuration
+serpentine_offsets = {}
+# Lines of the first chunk of a serpentine frame whose offset is not cached yet, see reduce_chunks
+serpentine_lines = 16
+
+def flip_odd_rows(rows, first_row=0):
+    """
+    Reverses in place the odd rows of a serpentine scan, rows being raw samples of the
+    lines first_row, first_row + 1... of the frame.
+    """
+    odd = rows[1 - first_row % 2::2]
+    odd[:] = odd[:, ::-1]
+
+def shift_odd_rows(rows, first_row, offset):
+    """
+    Shifts in place the odd rows by offset samples (to the right when positive), the
+    samples entering the row repeat its edge.
+    """
+    odd = rows[1 - first_row % 2::2]
+    if offset > 0:
+        odd[:, offset:] = odd[:, :-offset]
+        odd[:, :offset] = odd[:, offset:offset + 1]
+    elif offset < 0:
+        odd[:, :offset] = odd[:, -offset:]
+        odd[:, offset:] = odd[:, offset - 1:offset]
+
+def serpentine_offset(rows, first_row=0, max_offset=None):
+    """
+    Estimates the offset between the forward and backward lines of a serpentine scan.
+
+    The lag of the deflection and of the detector shifts the forward lines one way and
+    the backward lines the other way, which gives a comb effect. The cross-correlation
+    of each forward line with the next (flipped) backward line, summed over the lines
+    and computed with FFTs, peaks at the offset between the two directions.
+
+    Parameters:
+    - rows: 2D NumPy array of raw samples, one line per row, odd rows already flipped.
+    - first_row: Index in the frame of the first row, for the parity of the lines.
+    - max_offset: Largest offset searched, in samples, a quarter of a line when None.
+
+    Returns:
+    - The offset in samples by which the odd rows have to be shifted (see shift_odd_rows), None
+      when rows has no forward and backward line to compare.
+    """
+    even = rows[first_row % 2::2]
+    odd = rows[1 - first_row % 2::2]
+    pairs = min(len(even), len(odd))
+    if pairs == 0:
+        return None
+    length = rows.shape[1]
+    if max_offset is None:
+        max_offset = length // 4
+    even = even[:pairs] - even[:pairs].mean(axis=1, keepdims=True)
+    odd = odd[:pairs] - odd[:pairs].mean(axis=1, keepdims=True)
+
+    # Zero padded to 2 * length so the correlation is not circular
+    size = 2 * length
+    spectrum = (np.fft.rfft(even, size) * np.conj(np.fft.rfft(odd, size))).sum(axis=0)
+    correlation = np.fft.irfft(spectrum, size)
+    lags = np.r_[0:max_offset + 1, -max_offset:0]
+    return int(lags[np.argmax(correlation[lags % size])])
+
+def serpentine_key(pixels_number, samples_per_step, sampling_frequency, settling_pixels, delay_samples):
+    """
+    Returns the key of a scan configuration in serpentine_offsets.
+    """
+    return ("Triangle", pixels_number, samples_per_step, sampling_frequency, settling_pixels, delay_samples)
+
+def align_serpentine(rows, first_row=0, offset_key=None, max_offset=None):
+    """
+    Flips the odd rows and aligns them on the even rows, in place.
+
+    The offset is estimated on these rows and kept in serpentine_offsets under
+    offset_key: the next frames with the same key reuse it. Without offset_key it is
+    estimated every time. A single row cannot be aligned: it is only flipped and the
+    offset is not cached.
+
+    Returns:
+    - The offset applied, in samples.
+    """
+    flip_odd_rows(rows, first_row)
+    if offset_key is not None and offset_key in serpentine_offsets:
+        offset = serpentine_offsets[offset_key]
+    else:
+        offset = serpentine_offset(rows, first_row, max_offset)
+        if offset is None:
+            return 0
+        if offset_key is not None:
+            serpentine_offsets[offset_key] = offset
+    shift_odd_rows(rows, first_row, offset)
+    return offset
+
+def reconstruct_serpentine(raw_data, samples_per_step, pixels_number, offset_key=None, max_offset=None,
+                           settling_pixels=0, delay_samples=0, pixels_y=None):
+    """
+    Averages the raw samples of a serpentine (triangle) frame into an image.
+
+    The odd lines, scanned backward, are flipped with array slicing and aligned on the
+    forward lines (see align_serpentine) before the averaging, so the sample offset
+    between the two directions is corrected with the resolution of a sample.
+
+    Parameters:
+    - raw_data: Raw samples of the frame, list or 1D NumPy array, not modified.
+    - samples_per_step: Number of samples per pixel.
+    - pixels_number: Number of pixels per row in the image.
+    - offset_key: Key of the scan configuration under which the offset is cached.
+    - max_offset: Largest offset searched, in samples.
+    - settling_pixels, delay_samples, pixels_y: As in reconstruct_image.
+
+    Returns:
+    - A 2D NumPy array of pixels_y rows of pixels_number pixels, in scan orientation.
+    """
+    rows = np.array(frame_rows(raw_data, samples_per_step, pixels_number, settling_pixels, delay_samples, pixels_y),
+                    dtype=np.float64)
+    with instrumentation.phase("reconstruct", rows.nbytes):
+        align_serpentine(rows, 0, offset_key, max_offset)
+        image_array = rows.reshape(len(rows), pixels_number, samples_per_step).mean(axis=2)
+    instrumentation.count("frames")
+    return image_array
+
+def rise_staircases(pixels_number, min_tension, max_tension, settling_pixels=0, pixels_y=None, roi=None):
+    """
+    Generates the staircases of a unidirectional raster, one sample per pixel.
+
+    The write task runs at the pixel rate (see pixel_frequency), so every DAC value
+    is written once instead of once per acquired sample.
+
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels the first voltage of each line is held, after the flyback.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - roi: Voltage window of the scan (see scan_window), the whole field when None.
+
+    Returns:
+    - The complete horizontal staircase and the vertical staircase,
+      pixels_y * (pixels_number + settling_pixels) samples each.
+    """
+    lines = pixels_number if pixels_y is None else pixels_y
+    x_min, x_max, y_min, y_max = scan_window(roi, min_tension, max_tension)
+
+    # Left-right staircase, after the settling, repeated "lines" times
+    line = np.concatenate((np.full(settling_pixels, float(x_min)), np.linspace(x_min, x_max, pixels_number)))
+    complete_horizontal_staircase = np.tile(line, lines)
+
+    # Top-down staircase (unique for the entire image)
+    vertical_staircase = np.repeat(np.linspace(y_max, y_min, lines), len(line))
+    return complete_horizontal_staircase, vertical_staircase
+
+def triangle_staircases(pixels_number, min_tension, max_tension, settling_pixels=0, pixels_y=None, roi=None):
+    """
+    Generates the staircases of a bidirectional (triangle) raster, one sample per pixel.
+
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels the first voltage of each line is held.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - roi: Voltage window of the scan (see scan_window), the whole field when None.
+
+    Returns:
+    - The complete horizontal staircase and the vertical staircase,
+      pixels_y * (pixels_number + settling_pixels) samples each.
+    """
+    lines = pixels_number if pixels_y is None else pixels_y
+    x_min, x_max, y_min, y_max = scan_window(roi, min_tension, max_tension)
+
+    # One forward and one backward line repeated for the "lines" lines
+    forward = np.concatenate((np.full(settling_pixels, float(x_min)), np.linspace(x_min, x_max, pixels_number)))
+    backward = np.concatenate((np.full(settling_pixels, float(x_max)), np.linspace(x_max, x_min, pixels_number)))
+    horizontal_staircase = np.append(forward, backward)
+    complete_horizontal_staircase = np.tile(horizontal_staircase, (lines + 1) // 2)[:lines * len(forward)]
+
+    # Top-down staircase (unique for the entire image)
+    vertical_staircase = np.repeat(np.linspace(y_max, y_min, lines), len(forward))
+    return complete_horizontal_staircase, vertical_staircase
+
+def scan_waveform(mode, pixels_number, samples_per_step, min_tension, max_tension, settling_pixels=0, pixels_y=None,
+                  roi=None, transform=None):
+    """
+    Returns the data to write for a raster, from the shared waveform cache.
+
+    Repeating an acquisition or toggling between modes with the same parameters
+    skips the synthesis of the staircases entirely.
+
+    Parameters:
+    - mode: "Normal" (rise) or "Triangle".
+    - pixels_number: Number of pixels per row in the image.
+    - samples_per_step: Number of samples per pixel, part of the key of the waveform.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels held at the start of each line.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - roi: Voltage window of the scan (see scan_window), the whole field when None.
+    - transform: Transform.ScanTransform of the scan, applied to the staircases (see transform_staircases).
+
+    Returns:
+    - A read-only (2, pixels_y * (pixels_number + settling_pixels)) array, horizontal staircase
+      then vertical staircase.
+    """
+    lines = pixels_number if pixels_y is None else pixels_y
+    window = scan_window(roi, min_tension, max_tension)
+    key = (mode, pixels_number, lines, samples_per_step, min_tension, max_tension, window, settling_pixels,
+           transform_key(transform))
+    staircases = triangle_staircases if mode == "Triangle" else rise_staircases
+    with instrumentation.phase("waveform"):
+        return waveforms.get(key, lambda: transform_staircases(
+            np.array(staircases(pixels_number, min_tension, max_tension, settling_pixels, lines, window)),
+            transform, window, min_tension, max_tension))
+
+def reduce_chunks(backend, read_task, image_array, samples_per_step, timeout, chunk_lines=16, on_lines=None,
+                  read_buffer=None, serpentine=False, offset_key=None, settling_pixels=0, delay_samples=0):
+    """
+    Reads a running frame chunk by chunk and averages each chunk into its pixels at once.
+
+    Only chunk_lines lines of raw samples are held at a time, so the memory is the one of
+    the image whatever the oversampling, and the rows are available while the frame runs.
+
+    Parameters:
+    - backend: DaqBackend of the acquisition.
+    - read_task: The started read task.
+    - image_array: Preallocated 2D NumPy array receiving the frame.
+    - samples_per_step: Number of samples per pixel.
+    - timeout: Maximum time to wait for a chunk, in seconds.
+    - chunk_lines: Number of lines read at a time, at least 2 for a serpentine frame, and
+                   serpentine_lines for its first chunk when the offset is not cached.
+    - on_lines: Optional on_lines(image_array, first_row, last_row) called after each chunk, the rows
+                [first_row, last_row) of image_array being complete.
+    - read_buffer: Optional read buffer of at least chunk_lines lines, reused between frames.
+    - serpentine: Whether the frame is a serpentine scan, its odd lines are then flipped and
+                  aligned chunk by chunk (see align_serpentine).
+    - offset_key: Key of the scan configuration under which the serpentine offset is cached.
+    - settling_pixels, delay_samples: Samples skipped, as in reconstruct_image.
+
+    Returns:
+    - image_array.
+    """
+    rows, columns = image_array.shape
+    samples_per_line = (columns + settling_pixels) * samples_per_step
+    # A serpentine chunk holds a forward and a backward line at least, to estimate their offset
+    chunk_lines = max(2 if serpentine else 1, min(chunk_lines, rows))
+    # The offset cached for the next frames is estimated on serpentine_lines lines at least
+    first_lines = chunk_lines
+    if serpentine and (offset_key is None or offset_key not in serpentine_offsets):
+        first_lines = max(chunk_lines, min(serpentine_lines, rows))
+    buffered_samples = max(first_lines * samples_per_line, delay_samples)
+    if read_buffer is None or len(read_buffer.data) < buffered_samples:
+        read_buffer = backend.read_buffer(read_task, buffered_samples)
+
+    # The samples acquired before the beam reaches the first line are skipped
+    if delay_samples:
+        read_buffer.read(delay_samples, timeout)
+
+    first = 0
+    while first < rows:
+        last = min(first + (first_lines if first == 0 else chunk_lines), rows)
+        raw_chunk = read_buffer.read((last - first) * samples_per_line, timeout)
+        with instrumentation.phase("reconstruct", raw_chunk.nbytes):
+            lines = raw_chunk.reshape(last - first, samples_per_line)[:, settling_pixels * samples_per_step:]
+            if serpentine:
+                align_serpentine(lines, first, offset_key)
+            if samples_per_step == 1:
+                image_array[first:last] = lines
+            else:
+                np.mean(lines.reshape(last - first, columns, samples_per_step), axis=2, out=image_array[first:last])
+        if on_lines is not None:
+            on_lines(image_array, first, last)
+        first = last
+    instrumentation.count("frames")
+    return image_array
+
+def pixel_frequency(sampling_frequency, samples_per_step):
+    """
+    Returns the write (pixel) rate matching an acquisition oversampled samples_per_step times.
+    """
+    return sampling_frequency / samples_per_step
+
+def Scanning_Rise(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read, backend=None,
+                  timing=None, pixels_y=None, roi=None, transform=None):
     """
     Generates and reads scanning signals for a Focused Ion Beam (FIB) system.
 
@@ -18,91 +431,218 @@ def Scanning_Rise(time_per_pixel, sampling_frequency, pixels_number, channel_lr,
     Parameters:
     - time_per_pixel: Time spent per pixel, in microseconds.
     - sampling_frequency: Sampling frequency for data acquisition, in Hz.
-    - pixels_number: Number of pixels per row and column in the image.
-                     Two additional pixels are considered to avoid synchronization issues.
+    - pixels_number: Number of pixels per row in the image.
     - channel_lr: Channel name for the left-right scanning signal.
     - channel_ud: Channel name for the up-down scanning signal.
     - channel_read: Channel name for reading the input signal.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition (settling and delay), the shared scan_timing when None.
+    - pixels_y: Number of rows in the image, pixels_number (square image) when None.
+    - roi: Voltage window (x_min, x_max, y_min, y_max) scanned, the whole field when None.
+    - transform: Transform.ScanTransform rotating, zooming and panning the scan, none when None.
 
     Returns:
-    - A 2D NumPy array representing the acquired image. The array dimensions correspond
-      to 'pixels_number' (minus 2 to compensate for the initial extra rows and columns),
-      and each element represents the averaged signal value at the corresponding pixel.
+    - A 2D NumPy array representing the acquired image. The array has 'pixels_y' rows of
+      'pixels_number' pixels, and each element represents the averaged signal value at the
+      corresponding pixel.
     """
 
-    # We have to take 2 more lines and columns because the acquisition isn't really synchronised at first
-    
-    #TEMPORAIRE###
-    #parts = channel_read.split('/')
-
-    #device_name = parts[0]
-    
-    #NID.Reset_Card(device_name)
-    #######
-    pixels_number += 2
-
-    # Converts microseconds to seconds
-    time_per_pixel = time_per_pixel / 1000000
-    timeout = time_per_pixel * pixels_number * pixels_number + 1
-
-    # Number of samples per step/pixel
-    samples_per_step = int(time_per_pixel * sampling_frequency)
-    total_samples_to_read = samples_per_step * pixels_number ** 2
+    # Settling at the start of each line and delay of the inputs, see Timing.ScanTiming
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, timing, pixels_y)
+    pixels_y = pixels_number if pixels_y is None else pixels_y
 
     # Configuring the voltages for the staircases
     min_tension = -10
     max_tension = 10
 
     # Set initial voltage for channel_ud
-    NID.initial_voltage_setting(min_tension, max_tension, channel_ud)
-
-    # Generating the staircase signal for left-right scanning (repeated "pixels_number" times)
-    horizontal_staircase = np.repeat(np.linspace(min_tension, max_tension, pixels_number), samples_per_step)
-    complete_horizontal_staircase = np.tile(horizontal_staircase, pixels_number)
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
 
-    # Generating the staircase signal for top-down scanning (unique for the entire image)
-    vertical_staircase = np.repeat(np.linspace(max_tension, min_tension, pixels_number),
-                                   samples_per_step * pixels_number)
+    # Staircase signals written at the pixel rate, built once per set of parameters
+    data_to_write = scan_waveform("Normal", pixels_number, samples_per_step, min_tension, max_tension, settling_pixels,
+                                  pixels_y, roi, transform)
+    complete_horizontal_staircase, vertical_staircase = data_to_write
 
     # Write both signal in one task and read with another
-    write_task,read_task = NID.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
-                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
-                        vertical_staircase)
-    print(write_task,read_task)
-    # Structure datas to write
-    data_to_write = np.array([complete_horizontal_staircase, vertical_staircase])
-    
-    # Create a StreamWriter for the analog outputs
-    raw_data=NID.write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout)
-    # Stop the tasks
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
+                            sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                            vertical_staircase, pixel_frequency(sampling_frequency, samples_per_step))
+    # Create a StreamWriter for the analog outputs, the samples are read into a preallocated buffer
+    read_buffer = backend.read_buffer(read_task, total_samples_to_read)
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
+    try:
+        raw_data=backend.write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout, read_buffer)
+        image_array = reconstruct_image(raw_data, samples_per_step, pixels_number, settling_pixels, delay_samples,
+                                        pixels_y)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+    return image_array
+
+def streamed_lines(pixels_number, min_tension, max_tension, settling_pixels=0, roi=None, transform=None):
+    """
+    Returns the lines of Scanning_Rise_Streamed as polynomials of their vertical voltage.
 
-    # If there is only one sample per pixel, we skip the averaging process
-    if samples_per_step == 1:
+    Every line is the line at 0 V plus the vertical voltage times a column of the transform
+    matrix, and the distortion correction (see Distortion.scan_distortion) is a polynomial
+    of the voltages, so a corrected line is a polynomial of its vertical voltage of the
+    degree of the correction. Its coefficients are found once from degree + 1 lines and
+    cached with the waveforms: a line is then a few multiply-adds (see streamed_line)
+    instead of a correction, and the memory stays the one of a few lines.
 
-            # Reshape to a numpy 2D array (pixels_number x pixels_number)
-            image_array = np.array(raw_data).reshape(pixels_number, pixels_number)
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels held at the start of each line.
+    - roi: Voltage window of the scan (see scan_window), the whole field when None.
+    - transform: Transform.ScanTransform of the scan, applied to the lines (see transform_staircases).
 
-    else:
+    Returns:
+    - A read-only (degree + 1, 2, pixels_number + settling_pixels) array of the coefficients, highest
+      degree first, of the polynomials of the level: -1 for the bottom line of the window, 1 for the top.
+
+    Raises:
+    - ValueError if the transformed window leaves the field.
+    """
+    window = scan_window(roi, min_tension, max_tension)
+    x_min, x_max, y_min, y_max = window
+    key = ("Streamed", pixels_number, min_tension, max_tension, window, settling_pixels, transform_key(transform))
+
+    def build():
+        line_base = np.zeros((2, pixels_number + settling_pixels))
+        line_base[0, :settling_pixels] = x_min
+        line_base[0, settling_pixels:] = np.linspace(x_min, x_max, pixels_number)
+        line_slope = np.array([[0.0], [1.0]])
+        if transformed(transform):
+            transform.check(window, min_tension, max_tension)
+            line_base = transform.apply(line_base)
+            line_slope = transform.matrix()[:, 1:]
+        centre, half_height = (y_max + y_min) / 2, (y_max - y_min) / 2
+        if not scan_distortion.active:
+            return np.array([np.broadcast_to(line_slope * half_height, line_base.shape), line_base + line_slope * centre])
+        # The polynomial through the corrected lines at the Chebyshev nodes of the window
+        degree = scan_distortion.degree
+        levels = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+        lines = np.array([scan_distortion.apply(line_base + line_slope * (centre + half_height * level))
+                          for level in levels])
+        return np.linalg.solve(np.vander(levels), lines.reshape(degree + 1, -1)).reshape(lines.shape)
+
+    with instrumentation.phase("waveform"):
+        return waveforms.get(key, build)
+
+def streamed_line(coefficients, level, min_tension, max_tension, out):
+    """
+    Evaluates a line of streamed_lines at level into out, clipped to the field like the corrected waveforms.
+    """
+    out[:] = coefficients[0]
+    for coefficient in coefficients[1:]:
+        out *= level
+        out += coefficient
+    np.clip(out, min_tension, max_tension, out=out)
+    return out
+
+def Scanning_Rise_Streamed(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                           lines_buffered=4, on_lines=None, backend=None, timing=None, pixels_y=None, roi=None,
+                           transform=None):
+    """
+    Same acquisition as Scanning_Rise, with the scanning signals streamed one line at a time.
+
+    Every line of a unidirectional raster has the same horizontal staircase, only the
+    vertical voltage changes. Instead of writing the whole frame, a single line buffer is
+    kept: the horizontal staircase is written once in it and the vertical voltage is
+    updated for each line before it is written to the running task. The input signal is
+    read and averaged line by line. The waveform memory is constant (lines_buffered lines
+    on the card, one line on the host), which allows 4096x4096 or 8192x8192 scans, and
+    the image is identical to the one of Scanning_Rise.
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - lines_buffered: Number of lines written ahead of the beam.
+    - on_lines: Optional line callback, see reduce_chunks.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    # Settling at the start of each line and delay of the inputs, see Timing.ScanTiming
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, timing, pixels_y)
+    pixels_y = pixels_number if pixels_y is None else pixels_y
+    lines_buffered = min(lines_buffered, pixels_y)
+    line_pixels = pixels_number + settling_pixels
+    samples_per_line = samples_per_step * line_pixels
+    line_timeout = samples_per_line * lines_buffered / sampling_frequency + 1
+
+    # Configuring the voltages for the staircases
+    min_tension = -10
+    max_tension = 10
+
+    # Set initial voltage for channel_ud
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+
+    # A single line buffer: each line is evaluated from the cached polynomials of the transformed and
+    # corrected lines (see streamed_lines), from the top of the window to its bottom
+    line_coefficients = streamed_lines(pixels_number, min_tension, max_tension, settling_pixels, roi, transform)
+    vertical_levels = np.linspace(1.0, -1.0, pixels_y)
+    line_to_write = np.empty((2, line_pixels))
 
-            # Convert raw_data to a NumPy array for efficient processing
-            raw_data_array = np.array(raw_data)
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_line_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                            sampling_frequency, pixel_frequency(sampling_frequency, samples_per_step),
+                            line_pixels, pixels_y * line_pixels, total_samples_to_read, lines_buffered)
+    line_writer = backend.stream_writer(write_task)
+    read_buffer = backend.read_buffer(read_task, max(samples_per_line, delay_samples))
+    image_array = np.empty((pixels_y, pixels_number))
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
 
-            # Reshape the array so that each row contains samples_per_step elements
-            reshaped_data = raw_data_array.reshape(-1, samples_per_step)
+    try:
+        # The first lines are written before the start
+        for row in range(lines_buffered):
+            streamed_line(line_coefficients, vertical_levels[row], min_tension, max_tension, line_to_write)
+            with instrumentation.phase("write", line_to_write.nbytes):
+                line_writer.write_many_sample(line_to_write, timeout=line_timeout)
+        backend.start_tasks(write_task, read_task)
 
-            # Compute the mean along the second axis (axis=1) to average each group
-            averaged_data = np.mean(reshaped_data, axis=1)
+        # The samples acquired before the beam reaches the first line are skipped
+        if delay_samples:
+            read_buffer.read(delay_samples, line_timeout)
 
-            # Reshape to a 2D array (pixels_number x pixels_number)
-            image_array = averaged_data.reshape(pixels_number, pixels_number)
+        # Each line read frees room for the next line to write
+        for row in range(pixels_y):
+            raw_line = read_buffer.read(samples_per_line, line_timeout)
+            with instrumentation.phase("reconstruct", raw_line.nbytes):
+                image_array[row] = raw_line[settling_pixels * samples_per_step:].reshape(
+                    pixels_number, samples_per_step).mean(axis=1)
+            if on_lines is not None:
+                on_lines(image_array, row, row + 1)
+            if row + lines_buffered < pixels_y:
+                streamed_line(line_coefficients, vertical_levels[row + lines_buffered], min_tension, max_tension,
+                              line_to_write)
+                with instrumentation.phase("write", line_to_write.nbytes):
+                    line_writer.write_many_sample(line_to_write, timeout=line_timeout)
 
-        # To avoid weird behaviour we delete the first column and the first row of the image twice
-    image_array = image_array[1:, 1:]
-    image_array = image_array[1:, 1:]
-    NID.close(write_task,read_task)
+        backend.wait_and_stop(write_task, read_task, timeout)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+    instrumentation.count("frames")
     return image_array
 
-def Scanning_Triangle(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read):
+def Scanning_Triangle(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read, backend=None,
+                      timing=None, pixels_y=None, roi=None, transform=None):
     """
     Generates and reads scanning signals for a Focused Ion Beam (FIB) system.
 
@@ -117,141 +657,1162 @@ def Scanning_Triangle(time_per_pixel, sampling_frequency, pixels_number, channel
     Parameters:
     - time_per_pixel: Time spent per pixel, in microseconds.
     - sampling_frequency: Sampling frequency for data acquisition, in Hz.
-    - pixels_number: Number of pixels per row and column in the image.
-                     Two additional pixels are considered to avoid synchronization issues.
+    - pixels_number: Number of pixels per row in the image.
     - channel_lr: Channel name for the left-right scanning signal.
     - channel_ud: Channel name for the up-down scanning signal.
     - channel_read: Channel name for reading the input signal.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition (settling and delay), the shared scan_timing when None.
+    - pixels_y: Number of rows in the image, pixels_number (square image) when None.
+    - roi: Voltage window (x_min, x_max, y_min, y_max) scanned, the whole field when None.
+    - transform: Transform.ScanTransform rotating, zooming and panning the scan, none when None.
 
     Returns:
-    - A 2D NumPy array representing the acquired image. The array dimensions correspond
-      to 'pixels_number' (minus 2 to compensate for the initial extra rows and columns),
-      and each element represents the averaged signal value at the corresponding pixel.
+    - A 2D NumPy array representing the acquired image. The array has 'pixels_y' rows of
+      'pixels_number' pixels, and each element represents the averaged signal value at the
+      corresponding pixel.
+      The backward lines are flipped and aligned on the forward lines (see reconstruct_serpentine).
     """
 
-    # We have to take 2 more lines and columns because the acquisition isn't really synchronised at first
-    pixels_number += 2
+    # Settling at the start of each line and delay of the inputs, see Timing.ScanTiming
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, timing, pixels_y)
+    pixels_y = pixels_number if pixels_y is None else pixels_y
 
-    # Converts microseconds to seconds
-    time_per_pixel = time_per_pixel / 1000000
-    timeout = time_per_pixel * pixels_number * pixels_number + 1
+    # Configuring the voltages for the staircases
+    min_tension = -10
+    max_tension = 10
 
-    # Number of samples per step/pixel
-    samples_per_step = int(time_per_pixel * sampling_frequency)
-    total_samples_to_read = samples_per_step * pixels_number ** 2
+    # Set initial voltage for channel_ud
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+
+    # Staircase signals written at the pixel rate, built once per set of parameters
+    data_to_write = scan_waveform("Triangle", pixels_number, samples_per_step, min_tension, max_tension, settling_pixels,
+                                  pixels_y, roi, transform)
+    complete_horizontal_staircase, vertical_staircase = data_to_write
+    
+    # Write both signal in one task and read with another
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
+                            sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                            vertical_staircase, pixel_frequency(sampling_frequency, samples_per_step))
+    
+    # Create a StreamWriter for the analog outputs, the samples are read into a preallocated buffer
+    read_buffer = backend.read_buffer(read_task, total_samples_to_read)
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
+    try:
+        raw_data=backend.write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout, read_buffer)
+        image_array = reconstruct_serpentine(raw_data, samples_per_step, pixels_number,
+                                             serpentine_key(pixels_number, samples_per_step, sampling_frequency,
+                                                            settling_pixels, delay_samples),
+                                             settling_pixels=settling_pixels, delay_samples=delay_samples,
+                                             pixels_y=pixels_y)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+    return image_array
+    
+def Scanning_Chunked(mode, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                     chunk_lines=16, on_lines=None, backend=None, timing=None, pixels_y=None, roi=None,
+                     transform=None):
+    """
+    Same acquisition as Scanning_Rise (or Scanning_Triangle), reduced while it runs.
+
+    The frame is read chunk_lines lines at a time and averaged into a preallocated image
+    (see reduce_chunks), so a long oversampled scan needs the memory of the image instead
+    of the memory of all its samples, and the lines can be shown as they arrive.
+
+    Parameters:
+    - mode: "Normal" or "Triangle".
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - chunk_lines: Number of lines read at a time.
+    - on_lines: Optional line callback, see reduce_chunks.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    # Settling at the start of each line and delay of the inputs, see Timing.ScanTiming
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, timing, pixels_y)
+    pixels_y = pixels_number if pixels_y is None else pixels_y
 
     # Configuring the voltages for the staircases
     min_tension = -10
     max_tension = 10
 
     # Set initial voltage for channel_ud
-    NID.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
 
-    # Generating the staircase signal for left-right scanning (repeated "pixels_number" times)
-    horizontal_staircase = np.repeat(np.append(np.linspace(min_tension, max_tension, pixels_number), 
-                                     np.linspace(max_tension, min_tension, pixels_number)), samples_per_step)
-    complete_horizontal_staircase = np.tile(horizontal_staircase, pixels_number//2)                                
-                                                                   
+    data_to_write = scan_waveform(mode, pixels_number, samples_per_step, min_tension, max_tension, settling_pixels,
+                                  pixels_y, roi, transform)
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                            sampling_frequency, data_to_write[0], total_samples_to_read,
+                            data_to_write[1], pixel_frequency(sampling_frequency, samples_per_step))
+    image_array = np.empty((pixels_y, pixels_number))
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
 
+    try:
+        backend.writer(write_task, data_to_write)
+        backend.start_tasks(write_task, read_task)
+        image = reduce_chunks(backend, read_task, image_array, samples_per_step, timeout, chunk_lines, on_lines,
+                              serpentine=mode == "Triangle",
+                              offset_key=serpentine_key(pixels_number, samples_per_step, sampling_frequency,
+                                                        settling_pixels, delay_samples),
+                              settling_pixels=settling_pixels, delay_samples=delay_samples)
+        backend.wait_and_stop(write_task, read_task, timeout)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+    return image
 
-    # Generating the staircase signal for top-down scanning (unique for the entire image)
-    vertical_staircase = np.repeat(np.linspace(max_tension, min_tension, pixels_number),
-                                   samples_per_step * pixels_number)
-    
-    # Write both signal in one task and read with another
-    write_task,read_task = NID.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
-                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
-                        vertical_staircase)
-    
-    # Structure datas to write
-    data_to_write = np.array([complete_horizontal_staircase, vertical_staircase])
-    # Create a StreamWriter for the analog outputs
-    raw_data=NID.write_and_read(write_task, read_task, data_to_write,total_samples_to_read, timeout)
+def ordered_staircases(order, pixels_number, pixels_y=None, min_tension=-10, max_tension=10, settling_pixels=0,
+                       segment=None, roi=None):
+    """
+    Generates the staircases visiting the pixels of a frame in any order, one sample per pixel.
 
-    # If there is only one sample per pixel, we skip the averaging process
-    if samples_per_step == 1:
+    The k-th sample of the staircases is the position of the pixel order[k] of the image
+    (row-major flat index). Orders visiting rows in segments of the same length can hold
+    the first position of each segment during settling_pixels pixels, as the raster lines.
+    Without segments the first position only is held during settling_pixels pixels.
 
-            # Reshape to a numpy 2D array (pixels_number x pixels_number)
-            image_array = np.array(raw_data).reshape(pixels_number, pixels_number)
+    Parameters:
+    - order: 1D NumPy array of the flat indices of the pixels, in visiting order.
+    - pixels_number: Number of pixels per row in the image.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels held at the start of each segment.
+    - segment: Number of pixels of the segments, the whole order when None.
+    - roi: Voltage window of the scan (see scan_window), the whole field when None.
 
-    else:
+    Returns:
+    - The horizontal and vertical staircases.
+    """
+    segment = len(order) if segment is None else segment
+    lines = pixels_number if pixels_y is None else pixels_y
+    x_min, x_max, y_min, y_max = scan_window(roi, min_tension, max_tension)
+    horizontal_staircase = np.linspace(x_min, x_max, pixels_number)[order % pixels_number]
+    vertical_staircase = np.linspace(y_max, y_min, lines)[order // pixels_number]
+    if settling_pixels and segment:
+        staircases = np.stack((horizontal_staircase, vertical_staircase)).reshape(2, -1, segment)
+        staircases = np.concatenate((np.repeat(staircases[:, :, :1], settling_pixels, axis=2), staircases), axis=2)
+        horizontal_staircase, vertical_staircase = staircases.reshape(2, -1)
+    return horizontal_staircase, vertical_staircase
+
+def ordered_waveform(order_key, order, pixels_number, pixels_y, samples_per_step, min_tension, max_tension,
+                     settling_pixels=0, segment=None, roi=None, transform=None):
+    """
+    Returns the data to write for an ordered scan (see ordered_staircases), from the shared waveform cache.
 
-            # Convert raw_data to a NumPy array for efficient processing
-            raw_data_array = np.array(raw_data)
+    Parameters:
+    - order_key: Hashable description of the order, for example ("Interlaced", 8).
+    - transform: Transform.ScanTransform of the scan, applied to the staircases (see transform_staircases).
+    - The other parameters are the ones of ordered_staircases, samples_per_step being part of the key.
 
-            # Reshape the array so that each row contains samples_per_step elements
-            reshaped_data = raw_data_array.reshape(-1, samples_per_step)
+    Returns:
+    - A read-only (2, n) array, horizontal staircase then vertical staircase.
+    """
+    window = scan_window(roi, min_tension, max_tension)
+    key = ("Ordered", order_key, pixels_number, pixels_y, samples_per_step, min_tension, max_tension, window,
+           settling_pixels, segment, transform_key(transform))
+    with instrumentation.phase("waveform"):
+        return waveforms.get(key, lambda: transform_staircases(
+            np.array(ordered_staircases(order, pixels_number, pixels_y, min_tension, max_tension, settling_pixels,
+                                        segment, window)), transform, window, min_tension, max_tension))
 
-            # Compute the mean along the second axis (axis=1) to average each group
-            averaged_data = np.mean(reshaped_data, axis=1)
+def reduce_ordered(backend, read_task, image_array, order, samples_per_step, timeout, parts, on_part=None,
+                   segment=None, chunk_pixels=16384, settling_pixels=0, delay_samples=0, read_buffer=None):
+    """
+    Reads a running ordered scan chunk by chunk and puts each pixel at its place in the image.
 
-            # Reshape to a 2D array (pixels_number x pixels_number)
-            image_array = averaged_data.reshape(pixels_number, pixels_number)
+    The pixels are averaged as in reduce_chunks, then scattered at once with
+    image_array.flat[order] = values. The scan is cut into parts (the passes of an
+    interlaced scan for example), on_part is called when each part is complete.
 
-        # To avoid weird behaviour we delete the first column and the first row of the image twice
-    image_array = image_array[1:, 1:]
-    image_array = image_array[1:, 1:]
-    NID.close(write_task,read_task)
+    Parameters:
+    - backend: DaqBackend of the acquisition.
+    - read_task: The started read task.
+    - image_array: Preallocated C-contiguous 2D NumPy array receiving the frame.
+    - order: 1D NumPy array of the flat indices of the pixels, in scan order.
+    - samples_per_step: Number of samples per pixel.
+    - timeout: Maximum time to wait for a chunk, in seconds.
+    - parts: Number of pixels of each part, in scan order, multiples of segment.
+    - on_part: Optional on_part(image_array, filled, part) called after each part, filled being
+               the boolean mask of the pixels acquired so far.
+    - segment: Number of pixels of the segments preceded by the settling, see ordered_staircases.
+    - chunk_pixels: Number of pixels read at a time, rounded to whole segments.
+    - settling_pixels, delay_samples: Samples skipped, as in reconstruct_image.
+    - read_buffer: Optional read buffer reused between frames.
+
+    Returns:
+    - image_array.
+    """
+    segment = segment or 1
+    samples_per_segment = (segment + settling_pixels) * samples_per_step
+    chunk_segments = max(1, chunk_pixels // segment)
+    buffered_samples = max(chunk_segments * samples_per_segment, delay_samples)
+    if read_buffer is None or len(read_buffer.data) < buffered_samples:
+        read_buffer = backend.read_buffer(read_task, buffered_samples)
+
+    # The samples acquired before the beam reaches the first pixel are skipped
+    if delay_samples:
+        read_buffer.read(delay_samples, timeout)
+
+    flat = image_array.reshape(-1)
+    filled = np.zeros(flat.size, dtype=bool)
+    position = 0
+    for part, part_pixels in enumerate(parts):
+        end = position + part_pixels
+        while position < end:
+            count = min(chunk_segments, (end - position) // segment)
+            raw_chunk = read_buffer.read(count * samples_per_segment, timeout)
+            with instrumentation.phase("reconstruct", raw_chunk.nbytes):
+                samples = raw_chunk.reshape(count, samples_per_segment)[:, settling_pixels * samples_per_step:]
+                indices = order[position:position + count * segment]
+                flat[indices] = samples.reshape(count * segment, samples_per_step).mean(axis=1)
+                filled[indices] = True
+            position += count * segment
+        if on_part is not None:
+            on_part(image_array, filled.reshape(image_array.shape), part)
+    instrumentation.count("frames")
     return image_array
+
+def interlaced_order(pixels_number, pixels_y=None, step=8):
+    """
+    Returns the visiting order of a line-interlaced raster.
+
+    The first pass scans every step-th line, each next pass the lines halfway between the
+    lines already scanned, until every line is scanned: with step 8, the lines 0, 8, 16...
+    then 4, 12... then 2, 6, 10... then the odd lines.
+
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - step: Line spacing of the first pass, a power of 2.
+
+    Returns:
+    - The flat indices of the pixels in scan order, and the list of the rows of each pass.
+    """
+    if step < 1 or step & (step - 1):
+        raise ValueError(f"The interlacing step must be a power of 2, not {step}")
+    lines = pixels_number if pixels_y is None else pixels_y
+    passes = [np.arange(0, lines, step)]
+    while step > 1:
+        passes.append(np.arange(step // 2, lines, step))
+        step //= 2
+    passes = [rows for rows in passes if len(rows)]
+    rows = np.concatenate(passes)
+    order = (rows[:, None] * pixels_number + np.arange(pixels_number)).ravel()
+    return order, passes
+
+def interpolate_rows(image_array, known_rows):
+    """
+    Returns a copy of the image where the rows not in known_rows are linearly interpolated.
+
+    Each row is interpolated between the nearest known rows above and below it at once for
+    the whole image, the rows beyond the first and last known rows repeat them.
+
+    Parameters:
+    - image_array: 2D NumPy array whose known rows are acquired.
+    - known_rows: 1D array of the indices of the acquired rows.
+
+    Returns:
+    - A 2D NumPy array of the shape of image_array.
+    """
+    known_rows = np.sort(known_rows)
+    rows = np.arange(image_array.shape[0])
+    above = np.clip(np.searchsorted(known_rows, rows, side="right") - 1, 0, len(known_rows) - 1)
+    below = np.minimum(above + 1, len(known_rows) - 1)
+    row_above, row_below = known_rows[above], known_rows[below]
+    weight = np.clip((rows - row_above) / np.maximum(row_below - row_above, 1), 0, 1)
+    return image_array[row_above] * (1 - weight)[:, None] + image_array[row_below] * weight[:, None]
+
+def Scanning_Ordered(order_key, order, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud,
+                     channel_read, parts=None, on_part=None, segment=None, backend=None, timing=None, pixels_y=None,
+                     roi=None, transform=None):
+    """
+    Acquires the pixels of an image in the order given, with the same tasks as Scanning_Chunked.
+
+    The staircases visit order (see ordered_staircases), the scan is read and averaged
+    while it runs and each pixel is scattered at its place (see reduce_ordered). The
+    pixels not in order keep the value NaN.
+
+    Parameters:
+    - order_key: Hashable description of the order, key of the cached waveform.
+    - order: 1D NumPy array of the flat indices of the pixels, in visiting order.
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - parts: Number of pixels of each part of the scan, the whole order in one part when None.
+    - on_part: Optional on_part(image_array, filled, part), see reduce_ordered.
+    - segment: Number of pixels of the segments beginning with the settling, the settling is only
+               at the start of the scan when None.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    timing = timing if timing is not None else scan_timing
+    pixels_y = pixels_number if pixels_y is None else pixels_y
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    settling_pixels = timing.settling_pixels(samples_per_step)
+    delay_samples = timing.delay_samples
+    segments = 1 if segment is None else len(order) // segment
+    total_samples_to_read = (len(order) + segments * settling_pixels) * samples_per_step + delay_samples
+    timeout = total_samples_to_read / sampling_frequency + 1
+
+    # Configuring the voltages for the staircases
+    min_tension = -10
+    max_tension = 10
+
+    # Set initial voltage for channel_ud
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+
+    data_to_write = ordered_waveform(order_key, order, pixels_number, pixels_y, samples_per_step, min_tension,
+                                     max_tension, settling_pixels, segment, roi, transform)
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                            sampling_frequency, data_to_write[0], total_samples_to_read,
+                            data_to_write[1], pixel_frequency(sampling_frequency, samples_per_step))
+    image_array = np.full((pixels_y, pixels_number), np.nan)
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
+
+    # Without segments the settling at the start is skipped as the delay
+    if segment is None:
+        delay_samples += settling_pixels * samples_per_step
+        settling_pixels = 0
+    try:
+        backend.writer(write_task, data_to_write)
+        backend.start_tasks(write_task, read_task)
+        image = reduce_ordered(backend, read_task, image_array, order, samples_per_step, timeout,
+                               [len(order)] if parts is None else parts, on_part, segment,
+                               settling_pixels=settling_pixels, delay_samples=delay_samples)
+        backend.wait_and_stop(write_task, read_task, timeout)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+    return image
+
+def Scanning_Interlaced(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                        step=8, on_pass=None, backend=None, timing=None, pixels_y=None, roi=None, transform=None):
+    """
+    Acquires an image coarse to fine, with interlaced passes (see interlaced_order).
+
+    Every line is scanned once, as in Scanning_Rise, but in the order of the passes: a
+    preview of the whole field is available after 1/step of the frame time, and refined
+    by each next pass. The passes are read and averaged while the frame runs (see
+    Scanning_Ordered), the lines not scanned yet are interpolated from the scanned ones.
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - step: Line spacing of the first pass, a power of 2.
+    - on_pass: Optional on_pass(preview, pass_index, passes) called when each pass is complete, preview
+               being the image with the missing lines interpolated.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    order, passes = interlaced_order(pixels_number, pixels_y, step)
+
+    def pass_done(image, filled, part):
+        if on_pass is not None:
+            on_pass(interpolate_rows(image, np.concatenate(passes[:part + 1])), part, len(passes))
+
+    # Each line is a segment beginning with the settling, as in the raster
+    return Scanning_Ordered(("Interlaced", step), order, time_per_pixel, sampling_frequency, pixels_number, channel_lr,
+                            channel_ud, channel_read, [len(rows) * pixels_number for rows in passes], pass_done,
+                            pixels_number, backend, timing, pixels_y, roi, transform)
+
+def hilbert_curve(bits):
+    """
+    Returns the coordinates of the points of a Hilbert curve filling a 2**bits square.
+
+    The index along the curve is converted to coordinates for all the points at once, one
+    vectorized step per level of the curve.
+
+    Returns:
+    - The x and y coordinates (int32 NumPy arrays) of the 4**bits points, in curve order.
+    """
+    side = 1 << bits
+    t = np.arange(side * side, dtype=np.int64)
+    x = np.zeros(side * side, dtype=np.int32)
+    y = np.zeros(side * side, dtype=np.int32)
+    level = 1
+    while level < side:
+        rx = ((t >> 1) & 1).astype(np.int32)
+        ry = ((t ^ rx) & 1).astype(np.int32)
+        # The quadrants are rotated so the sub-curves join
+        flip = (ry == 0) & (rx == 1)
+        x[flip] = level - 1 - x[flip]
+        y[flip] = level - 1 - y[flip]
+        swap = ry == 0
+        x[swap], y[swap] = y[swap], x[swap]
+        x += level * rx
+        y += level * ry
+        t >>= 2
+        level <<= 1
+    return x, y
+
+def hilbert_order(pixels_number, pixels_y=None):
+    """
+    Returns the visiting order of a Hilbert scan, from the shared cache.
+
+    The curve fills the smallest power-of-2 square containing the image, the points
+    outside of the image are left out. Consecutive pixels are neighbours (except where the
+    curve leaves a rectangular image), so the drift and the charging are spread in both
+    directions instead of building up along the slow axis of the raster.
+
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+
+    Returns:
+    - A read-only uint32 NumPy array of the flat indices of the pixels, in scan order.
+    """
+    lines = pixels_number if pixels_y is None else pixels_y
+
+    def build():
+        x, y = hilbert_curve((max(pixels_number, lines) - 1).bit_length())
+        inside = (x < pixels_number) & (y < lines)
+        return (y[inside].astype(np.uint32) * np.uint32(pixels_number) + x[inside].astype(np.uint32))
+
+    return waveforms.get(("HilbertOrder", pixels_number, lines), build)
+
+def Scanning_Hilbert(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                     backend=None, timing=None, pixels_y=None, roi=None, transform=None):
+    """
+    Acquires an image along a Hilbert curve (see hilbert_order).
+
+    Each step of the beam is to a neighbouring pixel, so no settling is needed inside the
+    scan, only before the first pixel. The samples are scattered at their place in the
+    image with a single indexed assignment per chunk (see reduce_ordered).
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    order = hilbert_order(pixels_number, pixels_y)
+    return Scanning_Ordered(("Hilbert",), order, time_per_pixel, sampling_frequency, pixels_number, channel_lr,
+                            channel_ud, channel_read, backend=backend, timing=timing, pixels_y=pixels_y, roi=roi,
+                            transform=transform)
+
+def sparse_order(pixels_number, pixels_y=None, fraction=0.25, seed=0):
+    """
+    Returns the visiting order of a sparse scan, from the shared cache.
+
+    A pseudo-random fraction of the pixels is chosen, always the same for a seed. They
+    are visited row by row, in alternate directions, so the beam never flies back across
+    the field and the steps stay short.
+
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+    - fraction: Fraction of the pixels visited, in ]0, 1].
+    - seed: Seed of the pseudo-random choice.
+
+    Returns:
+    - A read-only uint32 NumPy array of the flat indices of the pixels, in scan order.
+
+    Raises:
+    - ValueError if fraction is not in ]0, 1].
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"The fraction of the pixels scanned must be in ]0, 1], not {fraction}")
+    lines = pixels_number if pixels_y is None else pixels_y
+
+    def build():
+        pixels = pixels_number * lines
+        chosen = np.random.default_rng(seed).choice(pixels, max(1, round(fraction * pixels)), replace=False)
+        rows, columns = np.divmod(chosen, pixels_number)
+        # The odd rows are visited from right to left
+        columns = np.where(rows % 2 == 1, pixels_number - 1 - columns, columns)
+        return chosen[np.lexsort((columns, rows))].astype(np.uint32)
+
+    return waveforms.get(("SparseOrder", pixels_number, lines, fraction, seed), build)
+
+def Scanning_Sparse(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                    fraction=0.25, seed=0, backend=None, timing=None, pixels_y=None, roi=None, transform=None):
+    """
+    Acquires a fraction of the pixels of an image and fills in the others (see sparse_order).
+
+    The time and the dose are the ones of the pixels visited only. The pixels not visited
+    are filled by normalized convolution of the visited ones (see ImageProcessing.inpaint).
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - fraction: Fraction of the pixels visited, in ]0, 1].
+    - seed: Seed of the pseudo-random choice of the pixels.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+    """
+    order = sparse_order(pixels_number, pixels_y, fraction, seed)
+    image = Scanning_Ordered(("Sparse", fraction, seed), order, time_per_pixel, sampling_frequency, pixels_number,
+                             channel_lr, channel_ud, channel_read, backend=backend, timing=timing,
+                             pixels_y=pixels_y, roi=roi, transform=transform)
+    with instrumentation.phase("inpaint"):
+        return ImPr.inpaint(image, ~np.isnan(image))
+
+def adaptive_dwell(preview, min_samples, max_samples, fraction=0.25):
+    """
+    Returns the number of samples of each pixel of an adaptive scan, from a preview of the frame.
+
+    The information of a pixel is the gradient magnitude of the slightly smoothed preview:
+    edges and small features. The fraction of the pixels with the most information get
+    max_samples, the others min_samples. The smoothing averages the pixels inside the
+    image only, so its border is not seen as an edge, and the pixels without any gradient
+    keep min_samples.
+
+    Parameters:
+    - preview: 2D NumPy array of a fast scan of the frame.
+    - min_samples, max_samples: Number of samples of the pixels without and with information.
+    - fraction: Fraction of the pixels given max_samples, in ]0, 1].
+
+    Returns:
+    - A 2D int NumPy array of the shape of preview.
+
+    Raises:
+    - ValueError if fraction is not in ]0, 1].
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"The fraction of the pixels with the full dwell must be in ]0, 1], not {fraction}")
+    # box_blur counts the outside as zeros, dividing by the blurred ones gives the mean of the inside
+    smooth = ImPr.box_blur(preview, 1, 1) / ImPr.box_blur(np.ones(preview.shape), 1, 1)
+    information = np.hypot(*np.gradient(smooth))
+    if information.max() <= information.min():
+        return np.full(preview.shape, min_samples)
+    threshold = np.quantile(information, 1 - fraction)
+    # The flat areas never get the full dwell, even when they are more than 1 - fraction of the pixels
+    return np.where((information >= threshold) & (information > information.min()), max_samples, min_samples)
+
+def _adaptive_total(samples_per_step, prescan_samples, pixels_number, pixels_y, fraction, timing):
+    # The preview raster, then the adaptive raster with its settling and delay
+    pixels = pixels_number * pixels_y
+    full = round(fraction * pixels)
+    return (timing.samples_to_read(pixels_number, prescan_samples, pixels_y)
+            + full * samples_per_step + (pixels - full) * prescan_samples
+            + pixels_y * timing.settling_samples + timing.delay_samples)
+
+def prescan_dwell(time_per_pixel, sampling_frequency, pixels_number, fraction=0.25, prescan_time_per_pixel=None,
+                  timing=None, pixels_y=None):
+    """
+    Returns the time per pixel and the samples per pixel of the preview of an adaptive scan.
+
+    The preview and the adaptive raster read about 2 * prescan + fraction * dwell samples
+    per pixel, a raster dwell samples: the preview is only worth it when it is short
+    enough. The default preview, an eighth of the dwell, is shortened (down to one
+    sample) until the adaptive scan reads fewer samples than a raster.
+
+    Parameters:
+    - time_per_pixel: Time spent on the pixels with information, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - fraction: Fraction of the pixels given the full dwell.
+    - prescan_time_per_pixel: Time per pixel of the preview, in microseconds, the longest up to an
+                              eighth of time_per_pixel keeping the scan shorter than a raster when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y: Number of rows in the image, pixels_number when None.
+
+    Raises:
+    - ValueError if the adaptive scan would read as many samples as a raster or more: the
+      dwell is too short, or the fraction or the preview too large.
+    """
+    timing = timing if timing is not None else scan_timing
+    pixels_y = pixels_number if pixels_y is None else pixels_y
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    raster_samples = timing.samples_to_read(pixels_number, samples_per_step, pixels_y)
+
+    def shorter(prescan_samples):
+        return _adaptive_total(samples_per_step, prescan_samples, pixels_number, pixels_y, fraction,
+                               timing) < raster_samples
+
+    if prescan_time_per_pixel is not None:
+        prescan_samples = int(prescan_time_per_pixel / 1000000 * sampling_frequency)
+        if prescan_samples < 1 or not shorter(prescan_samples):
+            raise ValueError(f"A preview of {prescan_samples} samples per pixel makes the adaptive scan longer than "
+                             f"a raster of {samples_per_step} samples per pixel: shorten the preview or use a raster")
+        return prescan_time_per_pixel, prescan_samples
+
+    prescan_samples = max(int(time_per_pixel / 8 / 1000000 * sampling_frequency), 1)
+    while prescan_samples > 1 and not shorter(prescan_samples):
+        prescan_samples -= 1
+    if not shorter(prescan_samples):
+        raise ValueError(f"A dwell of {samples_per_step} samples per pixel with {fraction:g} of the pixels at full "
+                         f"dwell leaves no room for a preview: the adaptive scan would be longer than a raster, "
+                         f"increase the time per pixel, lower the fraction or use a raster")
+    # Half a sample more so the rounding down of Scanning_Rise keeps the samples
+    return (prescan_samples + 0.5) / sampling_frequency * 1000000, prescan_samples
+
+def adaptive_samples(time_per_pixel, sampling_frequency, pixels_number, fraction=0.25, prescan_time_per_pixel=None,
+                     timing=None, pixels_y=None):
+    """
+    Returns the number of input samples of an adaptive scan, the preview and the adaptive raster.
+
+    The pixels given the full dwell are the fraction of the pixels, the count is exact
+    unless several pixels share the information of the threshold or the preview is flat.
+
+    Parameters:
+    - The parameters of Scanning_Adaptive.
+
+    Raises:
+    - ValueError if the adaptive scan would not be shorter than a raster (see prescan_dwell).
+    """
+    timing = timing if timing is not None else scan_timing
+    pixels_y = pixels_number if pixels_y is None else pixels_y
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    prescan_samples = prescan_dwell(time_per_pixel, sampling_frequency, pixels_number, fraction,
+                                    prescan_time_per_pixel, timing, pixels_y)[1]
+    return _adaptive_total(samples_per_step, prescan_samples, pixels_number, pixels_y, fraction, timing)
+
+def adaptive_waveform(counts, pixels_number, pixels_y, min_tension, max_tension, settling_samples=0, roi=None,
+                      transform=None):
+    """
+    Generates the waveform of a raster whose pixels have their own dwell, written at the sampling rate.
+
+    The positions are the ones of the raster, one per pixel and one held at the start of
+    each line, from the waveform cache. Each is repeated for the samples of its pixel, and
+    the first one of each line for settling_samples samples, with a single np.repeat.
+
+    Parameters:
+    - counts: (pixels_y, pixels_number) int NumPy array of the samples of each pixel, at least 1.
+    - pixels_number: Number of pixels per row in the image.
+    - pixels_y: Number of rows in the image.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_samples: Number of samples the first voltage of each line is held.
+    - roi, transform: Voltage window and transform of the scan, as in scan_waveform.
+
+    Returns:
+    - The (2, n) data to write, one value per input sample, and the (pixels_y, pixels_number + 1)
+      samples of each position, the settling being the first column.
+    """
+    positions = scan_waveform("Normal", pixels_number, 1, min_tension, max_tension, 1, pixels_y, roi, transform)
+    repeats = np.empty((pixels_y, pixels_number + 1), dtype=np.intp)
+    repeats[:, 0] = settling_samples
+    repeats[:, 1:] = counts
+    with instrumentation.phase("waveform"):
+        return np.repeat(positions, repeats.ravel(), axis=1), repeats
+
+def reduce_dwell(raw_data, repeats):
+    """
+    Returns the image of an adaptive scan, each pixel averaged over its own number of samples.
+
+    The sums of the runs of samples of all the positions are computed at once by
+    np.add.reduceat at the first sample of each run, the settling runs are dropped.
+
+    Parameters:
+    - raw_data: 1D NumPy array of the samples of the frame, without the delay.
+    - repeats: The samples of each position, as returned by adaptive_waveform.
+
+    Returns:
+    - A 2D NumPy array of pixels_y rows of pixels_number pixels.
+    """
+    runs = repeats.ravel()
+    starts = np.cumsum(runs) - runs
+    with instrumentation.phase("reconstruct", raw_data.nbytes):
+        # An empty settling run gives the first sample of the line, dropped with the settling column
+        sums = np.add.reduceat(raw_data, starts).reshape(repeats.shape)
+        return sums[:, 1:] / repeats[:, 1:]
+
+def Scanning_Adaptive(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                      fraction=0.25, prescan_time_per_pixel=None, backend=None, timing=None, pixels_y=None, roi=None,
+                      transform=None):
+    """
+    Acquires an image spending the dwell time on the pixels with information (see adaptive_dwell).
+
+    A fast raster at prescan_time_per_pixel gives a preview of the frame. The raster is then
+    scanned again with the full dwell on the fraction of the pixels where the preview has
+    edges and features, and the dwell of the preview on the others. The outputs are written
+    at the sampling rate, so each pixel can hold its own number of samples (see
+    adaptive_waveform). The samples of both scans are averaged, so the edges get about the
+    signal-to-noise ratio of a full raster in a fraction of its time.
+
+    Parameters:
+    - time_per_pixel: Time spent on the pixels with information, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row in the image.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - fraction: Fraction of the pixels given the full dwell, in ]0, 1].
+    - prescan_time_per_pixel: Time per pixel of the preview, in microseconds, chosen by prescan_dwell when None.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - pixels_y, roi, transform: Rows, voltage window and transform of the image, as in Scanning_Rise.
+
+    Returns:
+    - A 2D NumPy array representing the acquired image, as Scanning_Rise.
+
+    Raises:
+    - ValueError if the adaptive scan would not be shorter than a raster (see prescan_dwell).
+    """
+    timing = timing if timing is not None else scan_timing
+    pixels_y = pixels_number if pixels_y is None else pixels_y
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    prescan_time_per_pixel, prescan_samples = prescan_dwell(time_per_pixel, sampling_frequency, pixels_number,
+                                                            fraction, prescan_time_per_pixel, timing, pixels_y)
+    backend = get_backend(backend)
+
+    preview = Scanning_Rise(prescan_time_per_pixel, sampling_frequency, pixels_number,
+                            channel_lr, channel_ud, channel_read, backend, timing, pixels_y, roi, transform)
+    counts = adaptive_dwell(preview, prescan_samples, samples_per_step, fraction)
+
+    # Configuring the voltages for the staircases
+    min_tension = -10
+    max_tension = 10
+
+    data_to_write, repeats = adaptive_waveform(counts, pixels_number, pixels_y, min_tension, max_tension,
+                                               timing.settling_samples, roi, transform)
+    delay_samples = timing.delay_samples
+    total_samples_to_read = data_to_write.shape[1] + delay_samples
+    timeout = total_samples_to_read / sampling_frequency + 1
+
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    # The outputs are written at the sampling rate, one value per input sample
+    with instrumentation.phase("configure"):
+        write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                            sampling_frequency, data_to_write[0], total_samples_to_read,
+                            data_to_write[1], sampling_frequency)
+    read_buffer = backend.read_buffer(read_task, total_samples_to_read)
+    progress.attach(backend, read_task, total_samples_to_read, sampling_frequency)
+    try:
+        raw_data = backend.write_and_read(write_task, read_task, data_to_write, total_samples_to_read, timeout,
+                                          read_buffer)
+    finally:
+        progress.detach()
+        backend.close(write_task,read_task)
+
+    # Both scans are averaged, weighted by their number of samples
+    image_array = reduce_dwell(raw_data[delay_samples:], repeats)
+    return (image_array * counts + preview * prescan_samples) / (counts + prescan_samples)
+
+def calibrate_delay(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                    backend=None, timing=None):
+    """
+    Measures the delay between the outputs and the inputs and stores it in the timing.
+
+    A triangle frame is acquired without delay compensation: the delay shifts the forward
+    lines one way and the backward lines the other way, so the offset between the two
+    directions (see serpentine_offset) is twice the delay.
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row and column of the calibration frame.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming receiving the delay, the shared scan_timing when None.
+
+    Returns:
+    - The delay in samples.
+
+    Raises:
+    - ValueError if the frame has less than 2 lines.
+    """
+    if pixels_number < 2:
+        raise ValueError("At least 2 lines are needed to calibrate the delay")
+    timing = timing if timing is not None else scan_timing
+    uncompensated = ScanTiming(timing.settling_samples, 0)
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, uncompensated)
+
+    min_tension = -10
+    max_tension = 10
+    backend = get_backend(backend)
+    backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    data_to_write = scan_waveform("Triangle", pixels_number, samples_per_step, min_tension, max_tension, settling_pixels)
+    write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, data_to_write[0], total_samples_to_read,
+                        data_to_write[1], pixel_frequency(sampling_frequency, samples_per_step))
+    try:
+        raw_data = backend.write_and_read(write_task, read_task, data_to_write, total_samples_to_read, timeout)
+    finally:
+        backend.close(write_task,read_task)
+
+    rows = np.array(frame_rows(raw_data, samples_per_step, pixels_number, settling_pixels), dtype=np.float64)
+    flip_odd_rows(rows)
+    offset = serpentine_offset(rows)
+    if offset is None:
+        raise ValueError("At least 2 lines are needed to calibrate the delay")
+    timing.delay_samples = max(int(round(offset / 2)), 0)
+
+    # The offsets cached for the previous delay are no longer valid
+    serpentine_offsets.clear()
+    return timing.delay_samples
+
+def calibrate_distortion(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                         degree=3, backend=None, timing=None, correction=None):
+    """
+    Fits the distortion correction of the deflection on a frame of a reference grid of bright dots.
+
+    The frame is acquired without correction, the dots are found in it (see
+    Distortion.find_grid_points) and put on a regular lattice (see Distortion.grid_targets).
+    The polynomial giving the voltages at which the dots were seen from their place on the
+    lattice is the correction. The waveforms built afterwards are corrected, the ones built
+    before are no longer used as the correction is part of their keys.
+
+    Parameters:
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels per row and column of the calibration frame.
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - degree: Degree of the polynomial of the correction.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - correction: Distortion.DistortionCorrection receiving the fit, the shared scan_distortion when None.
+
+    Returns:
+    - The correction.
+    """
+    correction = correction if correction is not None else scan_distortion
+    samples_per_step, settling_pixels, delay_samples, total_samples_to_read, timeout = frame_timing(
+        time_per_pixel, sampling_frequency, pixels_number, timing)
+
+    min_tension = -10
+    max_tension = 10
+    backend = get_backend(backend)
+    backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    # Built outside of the cache, whose waveforms are corrected
+    data_to_write = np.array(rise_staircases(pixels_number, min_tension, max_tension, settling_pixels))
+    write_task,read_task = backend.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, data_to_write[0], total_samples_to_read,
+                        data_to_write[1], pixel_frequency(sampling_frequency, samples_per_step))
+    try:
+        raw_data = backend.write_and_read(write_task, read_task, data_to_write, total_samples_to_read, timeout)
+    finally:
+        backend.close(write_task,read_task)
+
+    image_array = reconstruct_image(raw_data, samples_per_step, pixels_number, settling_pixels, delay_samples)
+    commands = find_grid_points(image_array, scan_window(None, min_tension, max_tension))
+    correction.fit(grid_targets(commands), commands, degree)
+    return correction
+
+def VideoStair(time_per_pixel, sampling_frequency, pixels_number, timing=None, pixels_y=None, roi=None, transform=None):
     
-def VideoStair(time_per_pixel, sampling_frequency, pixels_number):
-    
-    pixels_number += 2
-    # Converts microseconds to seconds
-    time_per_pixel = time_per_pixel / 1000000
+    timing = timing if timing is not None else scan_timing
     # Number of samples per step/pixel
-    samples_per_step = int(time_per_pixel * sampling_frequency)
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
     # Configuring the voltages for the staircases
     min_tension = -10
     max_tension = 10
-    horizontal_staircase = np.repeat(np.linspace(min_tension, max_tension, pixels_number), samples_per_step)
-    complete_horizontal_staircase = np.tile(horizontal_staircase, pixels_number)
-# Generating the staircase signal for top-down scanning (unique for the entire image)
-    vertical_staircase = np.repeat(np.linspace(max_tension, min_tension, pixels_number),
-                               samples_per_step * pixels_number)
-    data_to_write = np.array([complete_horizontal_staircase, vertical_staircase])
+    # Staircase signals written at the pixel rate, built once per set of parameters
+    data_to_write = scan_waveform("Normal", pixels_number, samples_per_step, min_tension, max_tension,
+                                  timing.settling_pixels(samples_per_step), pixels_y, roi, transform)
+    complete_horizontal_staircase, vertical_staircase = data_to_write
     return data_to_write,complete_horizontal_staircase,vertical_staircase
     
 def videoInitConf(channel_lr,channel_ud,channel_read,complete_horizontal_staircase,vertical_staircase,
-                  pixels_number,time_per_pixel,data_to_write,sampling_frequency):
-    # We have to take 2 more lines and columns because the acquisition isn't really synchronised at first
-    pixels_number += 2
+                  pixels_number,time_per_pixel,data_to_write,sampling_frequency,backend=None,timing=None,pixels_y=None):
+    """
+    Configures and starts a continuous video acquisition.
 
-    # Converts microseconds to seconds
-    time_per_pixel = time_per_pixel / 1000000
-    timeout = time_per_pixel * pixels_number * pixels_number + 1
+    The raster built by VideoStair is written once and regenerated by the write task,
+    while the read task streams the input signal. The tasks keep running until they
+    are closed, frames are then taken from the stream with videoGo.
 
-    # Number of samples per step/pixel
-    samples_per_step = int(time_per_pixel * sampling_frequency)
-    total_samples_to_read = samples_per_step * pixels_number ** 2
+    Parameters:
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - complete_horizontal_staircase, vertical_staircase, data_to_write: Outputs of VideoStair.
+    - pixels_number: Number of pixels per row in the image.
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the same as for VideoStair.
+    - pixels_y: Number of rows in the image, the same as for VideoStair.
+
+    Returns:
+    - samples_per_step, total_samples_to_read (samples per frame), timeout, write_task, read_task
+    """
+    timing = timing if timing is not None else scan_timing
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+
+    # The frames follow each other, the delay only shifts them (see videoGo)
+    total_samples_to_read = timing.samples_per_frame(pixels_number, samples_per_step, pixels_y)
+    timeout = total_samples_to_read / sampling_frequency + 1
 
     # Configuring the voltages for the staircases
     min_tension = -10
     max_tension = 10
     
-    NID.initial_voltage_setting(min_tension, max_tension, channel_ud)
-    write_task,read_task=NID.configure_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension, 
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    write_task,read_task=backend.configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
                         sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
-                        vertical_staircase)
-    print("initialvoltset")
-    NID.writer(write_task,data_to_write)
-    print("writer")
+                        write_frequency=pixel_frequency(sampling_frequency, samples_per_step))
+    backend.writer(write_task,data_to_write)
+    backend.start_tasks(write_task,read_task)
     return samples_per_step,total_samples_to_read,timeout,write_task,read_task
     
-def videoGo(pixels_number,write_task,read_task,samples_per_step,total_samples_to_read,timeout):
-    pixels_number+=2
-    print("quickavt")
-    raw_data = NID.quickwrite_and_read(write_task, read_task,total_samples_to_read, timeout)
-    print("quick")
-    # If there is only one sample per pixel, we skip the averaging process
+def videoGo(pixels_number,write_task,read_task,samples_per_step,total_samples_to_read,timeout,next_frame=0,read_buffer=None,
+            backend=None,timing=None,pixels_y=None):
+    """
+    Takes one frame out of a continuous video acquisition started by videoInitConf.
 
-    image_array = np.array(raw_data).reshape(pixels_number, pixels_number)
+    Parameters:
+    - pixels_number: Number of pixels per row in the image.
+    - write_task, read_task: Tasks returned by videoInitConf.
+    - samples_per_step: Number of samples per pixel.
+    - total_samples_to_read: Number of samples in one frame.
+    - timeout: Maximum time to wait for the frame, in seconds.
+    - next_frame: Index of the first frame that has not been read yet.
+    - read_buffer: Optional read buffer of the backend, reused for every frame.
+    - backend: DaqBackend of the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the same as for VideoStair.
+    - pixels_y: Number of rows in the image, the same as for VideoStair.
 
-    image_array = image_array[1:, 1:]
-    image_array = image_array[1:, 1:]
-    
-    
-    return image_array
+    Returns:
+    - The 2D NumPy image of the newest frame and the index of that frame.
+    """
+    timing = timing if timing is not None else scan_timing
+    backend = get_backend(backend)
+    raw_data, frame_index = backend.read_frame(read_task, total_samples_to_read, next_frame, timeout, read_buffer)
+
+    # The raster is periodic: the first delay_samples samples of the frame are the end of the
+    # previous one, at the same place as the end of this one
+    if timing.delay_samples:
+        raw_data = np.roll(raw_data, -timing.delay_samples)
+    image_array = reconstruct_image(raw_data, samples_per_step, pixels_number, timing.settling_pixels(samples_per_step),
+                                    pixels_y=pixels_y)
+    return image_array, frame_index
+
+
+def line_waveform(pixels_number, samples_per_step, min_tension, max_tension, settling_pixels=0, line_tension=0.0,
+                  roi=None, transform=None):
+    """
+    Returns the data to write for a line scan, from the shared waveform cache.
+
+    A single line is written and regenerated by the card: the horizontal staircase of
+    a line (settling included) and a constant vertical voltage.
+
+    Parameters:
+    - pixels_number: Number of pixels of the line.
+    - samples_per_step: Number of samples per pixel, part of the key of the waveform.
+    - min_tension, max_tension: Voltage range of the field.
+    - settling_pixels: Number of pixels held at the start of the line.
+    - line_tension: Vertical voltage of the line.
+    - roi: Voltage window whose horizontal range is scanned (see scan_window), the whole field when None.
+    - transform: Transform.ScanTransform of the scan, applied to the line (see transform_staircases).
+
+    Returns:
+    - A read-only (2, pixels_number + settling_pixels) array, horizontal staircase then vertical voltage.
+    """
+    if not min_tension <= line_tension <= max_tension:
+        raise ValueError(f"The line at {line_tension} V must be within [{min_tension}, {max_tension}] V")
+    x_min, x_max, _, _ = scan_window(roi, min_tension, max_tension)
+    key = ("Line", pixels_number, samples_per_step, min_tension, max_tension, x_min, x_max, float(line_tension),
+           settling_pixels, transform_key(transform))
+    with instrumentation.phase("waveform"):
+        return waveforms.get(key, lambda: transform_staircases(np.array(
+            (np.concatenate((np.full(settling_pixels, float(x_min)), np.linspace(x_min, x_max, pixels_number))),
+             np.full(pixels_number + settling_pixels, float(line_tension)))),
+            transform, (x_min, x_max, line_tension, line_tension), min_tension, max_tension))
+
+def lineInitConf(channel_lr, channel_ud, channel_read, time_per_pixel, sampling_frequency, pixels_number, repeats=1,
+                 line_tension=0.0, roi=None, backend=None, timing=None, transform=None):
+    """
+    Configures and starts a continuous line scan.
+
+    The same continuous tasks as the video are used, the write task regenerating a single
+    line (see line_waveform). The read stream is cut into frames of repeats lines, each
+    frame gives one profile averaged over its lines (see lineGo).
+
+    Parameters:
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - time_per_pixel: Time spent per pixel, in microseconds.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - pixels_number: Number of pixels of the line.
+    - repeats: Number of lines averaged into each profile.
+    - line_tension: Vertical voltage of the line.
+    - roi: Voltage window whose horizontal range is scanned, the whole field when None.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the shared scan_timing when None.
+    - transform: Transform.ScanTransform rotating, zooming and panning the line, none when None.
+
+    Returns:
+    - samples_per_step, samples_per_frame (samples of repeats lines), timeout, write_task, read_task
+    """
+    timing = timing if timing is not None else scan_timing
+    samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+    settling_pixels = timing.settling_pixels(samples_per_step)
+    samples_per_frame = timing.samples_per_frame(pixels_number, samples_per_step, repeats)
+    timeout = samples_per_frame / sampling_frequency + 1
+
+    min_tension = -10
+    max_tension = 10
+    data_to_write = line_waveform(pixels_number, samples_per_step, min_tension, max_tension, settling_pixels,
+                                  line_tension, roi, transform)
+
+    backend = get_backend(backend)
+    with instrumentation.phase("initial_voltage"):
+        backend.initial_voltage_setting(min_tension, max_tension, channel_ud)
+    write_task,read_task=backend.configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, data_to_write[0], samples_per_frame,
+                        write_frequency=pixel_frequency(sampling_frequency, samples_per_step))
+    backend.writer(write_task,data_to_write)
+    backend.start_tasks(write_task,read_task)
+    return samples_per_step,samples_per_frame,timeout,write_task,read_task
+
+def lineGo(pixels_number,read_task,samples_per_step,samples_per_frame,timeout,next_frame=0,read_buffer=None,
+           backend=None,timing=None):
+    """
+    Takes the newest profile out of a line scan started by lineInitConf.
+
+    Parameters:
+    - pixels_number: Number of pixels of the line.
+    - read_task: Read task returned by lineInitConf.
+    - samples_per_step: Number of samples per pixel.
+    - samples_per_frame: Number of samples of the lines averaged into one profile.
+    - timeout: Maximum time to wait for the lines, in seconds.
+    - next_frame: Index of the first frame that has not been read yet.
+    - read_buffer: Optional read buffer of the backend, reused for every frame.
+    - backend: DaqBackend of the acquisition, the default backend when None.
+    - timing: Timing.ScanTiming of the acquisition, the same as for lineInitConf.
+
+    Returns:
+    - The 1D NumPy profile of the newest frame and the index of that frame.
+    """
+    timing = timing if timing is not None else scan_timing
+    backend = get_backend(backend)
+    raw_data, frame_index = backend.read_frame(read_task, samples_per_frame, next_frame, timeout, read_buffer)
+
+    # Every line is the same, the delay only shifts them as in videoGo
+    if timing.delay_samples:
+        raw_data = np.roll(raw_data, -timing.delay_samples)
+    settling_pixels = timing.settling_pixels(samples_per_step)
+    repeats = samples_per_frame // ((pixels_number + settling_pixels) * samples_per_step)
+    lines = reconstruct_image(raw_data, samples_per_step, pixels_number, settling_pixels, pixels_y=repeats)
+    return lines.mean(axis=0), frame_index
+
+
+def spotInitConf(channel_lr, channel_ud, channel_read, x_tension, y_tension, sampling_frequency, samples_per_chunk,
+                 backend=None, transform=None, chunks_buffered=16):
+    """
+    Parks the beam at (x_tension, y_tension) and starts a continuous acquisition of the detector.
+
+    The continuous tasks of the video are used, the write task regenerating a constant
+    two-sample buffer so the beam stays parked while the read task streams the input
+    signal, hardware-timed at sampling_frequency. The samples are read chunk by chunk
+    with spotGo, the card buffering chunks_buffered chunks.
+
+    Parameters:
+    - channel_lr: Channel name for the left-right scanning signal.
+    - channel_ud: Channel name for the up-down scanning signal.
+    - channel_read: Channel name for reading the input signal.
+    - x_tension, y_tension: Voltages of the beam position.
+    - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+    - samples_per_chunk: Number of samples read at a time.
+    - backend: DaqBackend used for the acquisition, the default backend when None.
+    - transform: Transform.ScanTransform of the scans, the spot being placed in the transformed image.
+    - chunks_buffered: Number of chunks the read buffer of the card holds.
+
+    Returns:
+    - timeout, write_task, read_task
+    """
+    min_tension = -10
+    max_tension = 10
+    if not (min_tension <= x_tension <= max_tension and min_tension <= y_tension <= max_tension):
+        raise ValueError(f"The spot ({x_tension}, {y_tension}) V must be within [{min_tension}, {max_tension}] V")
+    timeout = samples_per_chunk / sampling_frequency + 1
+    data_to_write = transform_staircases(np.array([[x_tension, x_tension], [y_tension, y_tension]], dtype=np.float64),
+                                         transform, (x_tension, x_tension, y_tension, y_tension), min_tension,
+                                         max_tension)
+
+    backend = get_backend(backend)
+    write_task,read_task=backend.configure_continuous_tasks(channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, data_to_write[0], samples_per_chunk, frames_buffered=chunks_buffered,
+                        write_frequency=pixel_frequency(sampling_frequency, samples_per_chunk))
+    backend.writer(write_task,data_to_write)
+    backend.start_tasks(write_task,read_task)
+    return timeout,write_task,read_task
+
+def spotGo(read_task, samples_per_chunk, decimation, timeout, read_buffer, backend=None, next_chunk=0,
+           chunks_buffered=16):
+    """
+    Reads the next chunk of a spot acquisition started by spotInitConf and decimates it.
+
+    The chunks follow each other without gap, each group of decimation samples is averaged
+    into one point. The card overwrites the oldest samples once its buffer is full: when
+    the chunk next_chunk is about to be overwritten, the newest complete chunk is read
+    instead (see read_frame), the chunks in between are lost.
+
+    Parameters:
+    - read_task: Read task returned by spotInitConf.
+    - samples_per_chunk: Number of samples of the chunk, a multiple of decimation.
+    - decimation: Number of samples averaged into one point.
+    - timeout: Maximum time to wait for the chunk, in seconds.
+    - read_buffer: Read buffer of the backend of at least samples_per_chunk samples.
+    - backend: DaqBackend of the acquisition, the default backend when None.
+    - next_chunk: Index of the first chunk that has not been read yet.
+    - chunks_buffered: Number of chunks the read buffer of the card holds, as for spotInitConf.
+
+    Returns:
+    - A 1D NumPy array of samples_per_chunk // decimation points and the index of the chunk.
+    """
+    backend = get_backend(backend)
+    # One chunk of margin, the card keeps acquiring until the chunk is read
+    behind = backend.samples_acquired(read_task) - next_chunk * samples_per_chunk
+    if behind > (chunks_buffered - 1) * samples_per_chunk:
+        raw_data, chunk_index = backend.read_frame(read_task, samples_per_chunk, next_chunk, timeout, read_buffer)
+    else:
+        raw_data = backend.read_samples(read_task, samples_per_chunk, timeout, read_buffer)
+        chunk_index = next_chunk
+    with instrumentation.phase("reconstruct", raw_data.nbytes):
+        points = raw_data.reshape(-1, decimation).mean(axis=1)
+    return points, chunk_index
     
 if __name__ == "__main__":
     channel_read = "Dev1/ai0"
@@ -260,11 +1821,13 @@ if __name__ == "__main__":
     sampling_frequency = 250000  # Sampling rate in Hz
     time_per_pixel = 4  # Time spent per pixel in microseconds
     pixels_number = 256  # Number of pixels per row and column
+    backend = get_backend()
     data_to_write,complete_horizontal_staircase,vertical_staircase=VideoStair(time_per_pixel, sampling_frequency, pixels_number)
     
     samples_per_step,total_samples_to_read,timeout,write_task,read_task=videoInitConf(channel_lr,channel_ud,channel_read,complete_horizontal_staircase,vertical_staircase,
-                      pixels_number,time_per_pixel,data_to_write,sampling_frequency)
+                      pixels_number,time_per_pixel,data_to_write,sampling_frequency,backend)
     
-    data=videoGo(pixels_number,write_task,read_task,samples_per_step,total_samples_to_read,timeout)
-    NID.close(write_task,read_task)
+    read_buffer=backend.read_buffer(read_task,total_samples_to_read)
+    data,frame_index=videoGo(pixels_number,write_task,read_task,samples_per_step,total_samples_to_read,timeout,0,read_buffer,backend)
+    backend.close(write_task,read_task)
     print(data)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 14 11:47:55 2026
+
+@author: Thomas
+"""
+import time
+import numpy as np
+from Modules_FIB.Backends import DaqBackend
+from Modules_FIB.Instrumentation import instrumentation
+
+class Specimen:
+    """
+    Synthetic specimen sampled at the deflection voltages.
+
+    The specimen is an image covering the whole field [min_tension, max_tension] on both
+    axes. The top row of the image is at max_tension on the vertical axis, as the
+    rasters of Scanning start at the top.
+
+    Attributes:
+        image (numpy.array): The detector signal in volts over the field.
+        min_tension, max_tension (float): The voltage range covered by the image.
+    """
+
+    def __init__(self, image=None, min_tension=-10, max_tension=10, size=1024, seed=0):
+        """
+        Args:
+            image (numpy.array): The detector signal over the field, synthetic() when None.
+            min_tension, max_tension (float): The voltage range covered by the image.
+            size (int): The size of the synthetic image.
+            seed (int): The seed of the synthetic image.
+        """
+        self.image = np.asarray(image, dtype=np.float64) if image is not None else self.synthetic(size, seed)
+        self.min_tension = min_tension
+        self.max_tension = max_tension
+
+    @staticmethod
+    def synthetic(size=1024, seed=0):
+        """
+        Builds a test specimen: a shaded background, a grid of lines and particles of
+        random size and brightness, which gives edges in every direction.
+
+        Returns:
+            numpy.array: A (size, size) signal between 0 and about 5 V.
+        """
+        rng = np.random.default_rng(seed)
+        rows, cols = np.mgrid[0:size, 0:size] / size
+        image = 0.5 + 0.5 * rows + 0.3 * cols
+
+        # Grid of thin lines
+        period = max(size // 16, 4)
+        grid = (np.arange(size) % period) < max(period // 16, 1)
+        image[grid, :] += 0.8
+        image[:, grid] += 0.8
+
+        # Particles
+        for _ in range(60):
+            center_row, center_col = rng.random(2)
+            radius = rng.uniform(0.005, 0.06)
+            disk = (rows - center_row) ** 2 + (cols - center_col) ** 2 < radius ** 2
+            image[disk] = rng.uniform(2, 5)
+        return image
+
+    def sample(self, x, y):
+        """
+        Returns the signal at the voltages (x, y), nearest pixel, vectorized.
+        """
+        height, width = self.image.shape
+        span = self.max_tension - self.min_tension
+        cols = np.rint((x - self.min_tension) / span * (width - 1)).astype(np.intp)
+        rows = np.rint((self.max_tension - y) / span * (height - 1)).astype(np.intp)
+        np.clip(cols, 0, width - 1, out=cols)
+        np.clip(rows, 0, height - 1, out=rows)
+        return self.image[rows, cols]
+
+
+class SimulatedTask:
+    """
+    Task handle of the SimulatedBackend, for writing or reading.
+
+    Written samples are kept as chunks (start sample, (2, n) array). A regenerated buffer
+    is a single chunk, a streamed task receives one chunk per write.
+    """
+
+    def __init__(self, channels, rate, samples, continuous=False, regenerate=True, buffer_size=None):
+        self.channels = channels
+        self.rate = rate
+        self.samples = samples
+        self.continuous = continuous
+        self.regenerate = regenerate
+        self.buffer_size = buffer_size
+        self.chunks = []
+        self.written = 0
+        self.position = 0
+        self.start_time = None
+        self.source = None
+        self.last_output = np.zeros(2)
+
+
+class SimulatedReadBuffer:
+    """
+    Preallocated buffer of the SimulatedBackend, same interface as Ni_Dependencies.ReadBuffer.
+    """
+
+    def __init__(self, backend, read_task, samples):
+        self.backend = backend
+        self.read_task = read_task
+        self.data = np.empty(samples, dtype=np.float64)
+
+    def read(self, samples, timeout):
+        view = self.data[:samples]
+        self.backend._acquire(self.read_task, view)
+        return view
+
+
+class SimulatedStreamWriter:
+    """
+    Stream writer of the SimulatedBackend, same interface as AnalogMultiChannelWriter.
+    """
+
+    def __init__(self, backend, write_task):
+        self.backend = backend
+        self.write_task = write_task
+
+    def write_many_sample(self, data, timeout=10.0):
+        self.backend._append(self.write_task, data)
+
+
+class SimulatedBackend(DaqBackend):
+    """
+    Backend simulating the card and the FIB, to run and profile the acquisition without hardware.
+
+    Each input sample is the specimen signal at the beam position plus gaussian noise. The
+    beam position follows the output voltages with:
+    - a pure delay, in seconds,
+    - a first order lag: after each step of the output, the beam approaches the new voltage
+      with the time constant lag. Each step is assumed to start from the previous voltage,
+      which holds while lag is shorter than a pixel.
+
+    In realtime mode the reads return at the rate the card would acquire the samples,
+    otherwise as fast as numpy computes them.
+    """
+
+    def __init__(self, specimen=None, noise=0.02, lag=1e-6, delay=0.0, realtime=True, seed=None, device="Sim1"):
+        """
+        Args:
+            specimen (Specimen): The sampled specimen, Specimen() when None.
+            noise (float): The standard deviation of the noise, in volts.
+            lag (float): The time constant of the deflection, in seconds.
+            delay (float): The delay between the output and the beam, in seconds.
+            realtime (bool): Whether the reads are paced at the sampling frequency.
+            seed (int): The seed of the noise.
+            device (str): The name of the simulated device.
+        """
+        self.specimen = specimen if specimen is not None else Specimen()
+        self.noise = noise
+        self.lag = lag
+        self.delay = delay
+        self.realtime = realtime
+        self.device = device
+        self.rng = np.random.default_rng(seed)
+        self.parked = np.zeros(2)
+
+    # Devices
+    def device_names(self):
+        return [self.device]
+
+    def ao_channels(self, port_dev):
+        return [f"{port_dev}/ao0", f"{port_dev}/ao1"]
+
+    def ai_channels(self, port_dev):
+        return [f"{port_dev}/ai{i}" for i in range(4)]
+
+    def reset_card(self, port_dev):
+        self.parked = np.zeros(2)
+
+    # Configuration
+    def initial_voltage_setting(self, min_tension, max_tension, channel_ud):
+        self.parked[1] = max_tension
+
+    def _tasks(self, channel_lr, channel_ud, channel_read, write_rate, write_samples, read_rate, read_samples,
+               continuous=False, regenerate=True, buffer_size=None):
+        # As Ni_Dependencies.check_clock_ratio, the clocks are only locked at an integer ratio
+        ratio = read_rate / write_rate
+        if abs(ratio - round(ratio)) > 1e-6:
+            raise ValueError(f"The read rate {read_rate} Hz is not a multiple of the write rate {write_rate} Hz "
+                             f"(ratio {ratio}), choose a time per pixel that is a whole number of samples")
+        write_task = SimulatedTask((channel_lr, channel_ud), write_rate, write_samples, continuous, regenerate,
+                                   buffer_size)
+        read_task = SimulatedTask((channel_read,), read_rate, read_samples, continuous)
+        write_task.last_output = self.parked.copy()
+        read_task.source = write_task
+        return write_task, read_task
+
+    def configure_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                        sampling_frequency, complete_horizontal_staircase, total_samples_to_read,
+                        vertical_staircase, write_frequency=None):
+        return self._tasks(channel_lr, channel_ud, channel_read, write_frequency or sampling_frequency,
+                           len(complete_horizontal_staircase), sampling_frequency, total_samples_to_read)
+
+    def configure_timing(self, write_task, read_task, sampling_frequency, total_samples_to_write,
+                         total_samples_to_read, write_frequency=None):
+        write_task.rate = write_frequency or sampling_frequency
+        write_task.samples = total_samples_to_write
+        read_task.rate = sampling_frequency
+        read_task.samples = total_samples_to_read
+
+    def configure_continuous_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                                   sampling_frequency, complete_horizontal_staircase, samples_per_frame,
+                                   frames_buffered=4, write_frequency=None):
+        return self._tasks(channel_lr, channel_ud, channel_read, write_frequency or sampling_frequency,
+                           len(complete_horizontal_staircase), sampling_frequency,
+                           samples_per_frame * frames_buffered, continuous=True)
+
+    def configure_line_tasks(self, channel_lr, channel_ud, channel_read, min_tension, max_tension,
+                             sampling_frequency, write_frequency, samples_per_line, total_samples_to_write,
+                             total_samples_to_read, lines_buffered=4):
+        return self._tasks(channel_lr, channel_ud, channel_read, write_frequency, total_samples_to_write,
+                           sampling_frequency, total_samples_to_read, regenerate=False,
+                           buffer_size=samples_per_line * lines_buffered)
+
+    def commit_tasks(self, write_task, read_task):
+        pass
+
+    # Output side
+    def writer(self, write_task, data_to_write):
+        with instrumentation.phase("write", np.asarray(data_to_write).nbytes):
+            data = np.array(data_to_write, dtype=np.float64)
+            write_task.chunks = [(0, data)]
+            write_task.written = data.shape[1]
+
+    def _append(self, write_task, data):
+        # Without regeneration the card blocks the writer until there is room in the buffer
+        if self.realtime and write_task.start_time is not None and write_task.buffer_size:
+            while write_task.written - self._elapsed(write_task) >= write_task.buffer_size:
+                time.sleep(0.0005)
+        write_task.chunks.append((write_task.written, np.array(data, dtype=np.float64)))
+        write_task.written += data.shape[1]
+
+    def stream_writer(self, write_task):
+        return SimulatedStreamWriter(self, write_task)
+
+    def _elapsed(self, task):
+        return int((time.perf_counter() - task.start_time) * task.rate)
+
+    def _output_at(self, write_task, steps):
+        """
+        Returns the (2, len(steps)) output voltages at the given output sample indices.
+        """
+        output = np.empty((2, len(steps)))
+        before = steps < 0
+        if write_task.written == 0:
+            output[:] = write_task.last_output[:, None]
+            return output
+        if write_task.continuous:
+            indices = steps % write_task.written
+        else:
+            indices = np.minimum(steps, write_task.written - 1)
+        indices[before] = 0
+        for start, chunk in write_task.chunks:
+            inside = (indices >= start) & (indices < start + chunk.shape[1])
+            output[:, inside] = chunk[:, indices[inside] - start]
+        output[:, before] = write_task.last_output[:, None]
+        return output
+
+    # Input side
+    def _acquire(self, read_task, out):
+        """
+        Fills out with the next samples of read_task.
+        """
+        with instrumentation.phase("read", out.nbytes):
+            self._simulate(read_task, out)
+
+    def _simulate(self, read_task, out):
+        write_task = read_task.source
+        count = len(out)
+        first = read_task.position
+        ratio = max(int(round(read_task.rate / write_task.rate)), 1)
+
+        # Output sample driving each input sample, and the position inside that output step
+        indices = np.arange(first, first + count) - int(round(self.delay * read_task.rate))
+        steps = indices // ratio
+        phases = indices - steps * ratio
+
+        current = self._output_at(write_task, steps)
+        if self.lag > 0:
+            previous = self._output_at(write_task, steps - 1)
+            decay = np.exp(-(phases + 1) / (self.lag * read_task.rate))
+            current += (previous - current) * decay
+        out[:] = self.specimen.sample(current[0], current[1])
+        if self.noise > 0:
+            out += self.rng.normal(0, self.noise, count)
+        read_task.position = first + count
+
+        # Written chunks that are behind the beam are dropped
+        if not write_task.regenerate and len(write_task.chunks) > 1:
+            oldest = steps[0] - 1
+            write_task.chunks = [(start, chunk) for start, chunk in write_task.chunks
+                                 if start + chunk.shape[1] > oldest]
+
+        if self.realtime:
+            remaining = read_task.start_time + read_task.position / read_task.rate - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def start_tasks(self, write_task, read_task):
+        now = time.perf_counter()
+        write_task.start_time = now
+        read_task.start_time = now
+        read_task.position = 0
+
+    def read_buffer(self, read_task, samples):
+        return SimulatedReadBuffer(self, read_task, samples)
+
+    def read_samples(self, read_task, total_samples_to_read, timeout, buffer=None):
+        if buffer is None:
+            raw_data = np.empty(total_samples_to_read)
+            self._acquire(read_task, raw_data)
+            return raw_data
+        return buffer.read(total_samples_to_read, timeout)
+
+    def read_frame(self, read_task, samples_per_frame, next_frame, timeout, buffer=None):
+        if self.realtime:
+            acquired = self._elapsed(read_task)
+            frame_index = max(next_frame, acquired // samples_per_frame - 1)
+        else:
+            frame_index = next_frame
+        read_task.position = frame_index * samples_per_frame
+        return self.read_samples(read_task, samples_per_frame, timeout, buffer), frame_index
+
+    def samples_acquired(self, read_task):
+        # Out of realtime the samples are computed when read
+        if read_task.start_time is None or not self.realtime:
+            return read_task.position
+        acquired = self._elapsed(read_task)
+        if not read_task.continuous and read_task.samples:
+            acquired = min(acquired, read_task.samples)
+        return acquired
+
+    def write_and_read(self, write_task, read_task, data_to_write, total_samples_to_read, timeout, buffer=None):
+        self.writer(write_task, data_to_write)
+        return self.quickwrite_and_read(write_task, read_task, total_samples_to_read, timeout, buffer)
+
+    def quickwrite_and_read(self, write_task, read_task, total_samples_to_read, timeout, buffer=None):
+        self.start_tasks(write_task, read_task)
+        raw_data = self.read_samples(read_task, total_samples_to_read, timeout, buffer)
+        self.wait_and_stop(write_task, read_task, timeout)
+        return raw_data
+
+    def wait_and_stop(self, write_task, read_task, timeout):
+        with instrumentation.phase("wait"):
+            self._wait(write_task)
+
+    def _wait(self, write_task):
+        if self.realtime and write_task.samples:
+            remaining = write_task.start_time + write_task.samples / write_task.rate - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        # The outputs keep their last value
+        last = min(write_task.samples or write_task.written, write_task.written) - 1
+        write_task.last_output = self._output_at(write_task, np.array([last]))[:, 0]
+        self.parked = write_task.last_output.copy()
+        write_task.start_time = None
+
+    def close(self, write_task, read_task):
+        write_task.chunks = []
+        read_task.source = None
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:07:52 2026
+
+@author: Thomas
+"""
+import threading
+import time
+import numpy as np
+from Modules_FIB import Scanning
+from Modules_FIB.Video import VideoStream
+from Modules_FIB.Instrumentation import instrumentation
+
+class RingBuffer:
+    """
+    Preallocated ring buffer of the points of a time series.
+
+    The acquisition thread appends the points with extend(), the interface reads the last
+    points and their statistics at its own rate. The oldest points are overwritten once
+    the buffer is full, so the memory stays the same however long the series.
+
+    Attributes:
+        capacity (int): The number of points kept.
+        total (int): The number of points appended since the last clear().
+    """
+
+    def __init__(self, capacity):
+        self._lock = threading.Lock()
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float64)
+        self.total = 0
+
+    def extend(self, values):
+        """
+        Appends values, overwriting the oldest points when the buffer is full.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        appended = len(values)
+        # Only the last capacity points can be kept, written where they would have been
+        values = values[-self.capacity:]
+        with self._lock:
+            start = (self.total + appended - len(values)) % self.capacity
+            end = start + len(values)
+            if end <= self.capacity:
+                self._data[start:end] = values
+            else:
+                split = self.capacity - start
+                self._data[start:] = values[:split]
+                self._data[:end - self.capacity] = values[split:]
+            self.total += appended
+
+    def latest(self, points=None):
+        """
+        Returns a copy of the last points (all the points kept when None), oldest first.
+        """
+        with self._lock:
+            available = min(self.total, self.capacity)
+            points = available if points is None else min(points, available)
+            end = self.total % self.capacity
+            start = end - points
+            if start >= 0:
+                return self._data[start:end].copy()
+            return np.concatenate((self._data[start:], self._data[:end]))
+
+    def stats(self, points):
+        """
+        Returns the mean, standard deviation, minimum and maximum of the last points, None when empty.
+        """
+        values = self.latest(points)
+        if len(values) == 0:
+            return None
+        return values.mean(), values.std(), values.min(), values.max()
+
+    def clear(self):
+        """
+        Forgets every point.
+        """
+        with self._lock:
+            self.total = 0
+
+
+class SpotStream(VideoStream):
+    """
+    Continuous acquisition of the detector with the beam parked on a spot.
+
+    open() parks the beam and starts the stream (spotInitConf), grab() returns the next
+    chunk of points (spotGo). The chunks follow each other without gap as long as the
+    consumer keeps up: the card buffers chunks_buffered chunks while one is processed.
+    Beyond, the oldest chunks would be overwritten, the stream jumps to the newest chunk
+    and the chunks skipped are counted in dropped.
+
+    Attributes:
+        parameters (tuple): (sampling_frequency, decimation, x_tension, y_tension, channel_lr, channel_ud,
+            channel_read, transform, chunk_interval) of the open stream, None when closed.
+        point_rate (float): The number of points per second after the decimation.
+        chunks_buffered (int): The number of chunks the card buffers.
+    """
+    chunks_buffered = 16
+
+    def open(self, sampling_frequency, decimation, x_tension, y_tension, channel_lr, channel_ud, channel_read,
+             transform=None, chunk_interval=0.02):
+        """
+        Parks the beam and starts the acquisition, closing the previous one if any.
+
+        Parameters:
+        - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+        - decimation: Number of samples averaged into one point.
+        - x_tension, y_tension: Voltages of the beam position.
+        - channel_lr, channel_ud, channel_read: Channel names of the scan and of the detector.
+        - transform: Transform.ScanTransform of the scans, the spot being placed in the transformed image.
+        - chunk_interval: Duration of the chunks read at a time, in seconds.
+        """
+        self.close()
+        self.decimation = max(int(decimation), 1)
+        self.point_rate = sampling_frequency / self.decimation
+        points_per_chunk = max(int(round(chunk_interval * self.point_rate)), 1)
+        self.samples_per_chunk = points_per_chunk * self.decimation
+        self.timeout, self.write_task, self.read_task = Scanning.spotInitConf(
+            channel_lr, channel_ud, channel_read, x_tension, y_tension, sampling_frequency, self.samples_per_chunk,
+            self.backend, transform, self.chunks_buffered)
+        self.read_buffer = self.backend.read_buffer(self.read_task, self.samples_per_chunk)
+        self.parameters = (sampling_frequency, decimation, x_tension, y_tension, channel_lr, channel_ud, channel_read,
+                           transform, chunk_interval)
+        self.next_frame = 0
+        self.frames = 0
+        self.dropped = 0
+        self._times.clear()
+
+    def grab(self):
+        """
+        Returns the points of the next chunk as a 1D NumPy array, waiting for it if needed.
+        """
+        points, chunk_index = Scanning.spotGo(self.read_task, self.samples_per_chunk, self.decimation, self.timeout,
+                                              self.read_buffer, self.backend, self.next_frame, self.chunks_buffered)
+        skipped = chunk_index - self.next_frame
+        if skipped:
+            self.dropped += skipped
+            instrumentation.count("dropped", skipped)
+        self.next_frame = chunk_index + 1
+        self.frames += 1
+        self._times.append(time.perf_counter())
+        return points
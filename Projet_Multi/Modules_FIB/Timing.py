@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:41:26 2026
+
+@author: Thomas
+"""
+from math import ceil
+
+class ScanTiming:
+    """
+    Timing model of a raster, replacing the two extra rows and columns that were scanned and cropped.
+
+    Two effects are modelled:
+    - the settling of the deflection at the start of each line, after the flyback: the
+      first voltage of the line is held for settling_samples input samples, rounded up
+      to whole pixels as the outputs are written at the pixel rate. Only these samples
+      are discarded.
+    - the delay between the outputs and the inputs (amplifiers, detector): the input
+      samples are read delay_samples samples later than the outputs are written. It is
+      measured by Scanning.calibrate_delay.
+
+    Attributes:
+        settling_samples (int): The input samples discarded at the start of each line.
+        delay_samples (int): The delay from the outputs to the inputs, in input samples.
+    """
+
+    def __init__(self, settling_samples=2, delay_samples=0):
+        """
+        Args:
+            settling_samples (int): The input samples discarded at the start of each line.
+            delay_samples (int): The delay from the outputs to the inputs, in input samples.
+        """
+        self.settling_samples = settling_samples
+        self.delay_samples = delay_samples
+
+    def copy(self):
+        """
+        Returns a copy, so an acquisition keeps its timing if the shared one is calibrated meanwhile.
+        """
+        return ScanTiming(self.settling_samples, self.delay_samples)
+
+    def settling_pixels(self, samples_per_step):
+        """
+        Returns the number of pixels held at the start of each line.
+        """
+        return ceil(self.settling_samples / samples_per_step)
+
+    def line_pixels(self, pixels_number, samples_per_step):
+        """
+        Returns the number of pixels written per line, settling included.
+        """
+        return pixels_number + self.settling_pixels(samples_per_step)
+
+    def samples_per_frame(self, pixels_number, samples_per_step, pixels_y=None):
+        """
+        Returns the number of input samples of one frame of pixels_y lines (square when None), without the delay.
+        """
+        lines = pixels_number if pixels_y is None else pixels_y
+        return lines * self.line_pixels(pixels_number, samples_per_step) * samples_per_step
+
+    def samples_to_read(self, pixels_number, samples_per_step, pixels_y=None):
+        """
+        Returns the number of input samples to read for one frame, the delay included.
+        """
+        return self.samples_per_frame(pixels_number, samples_per_step, pixels_y) + self.delay_samples
+
+    def to_dict(self):
+        return {"settling_samples": self.settling_samples, "delay_samples": self.delay_samples}
+
+    def update(self, config):
+        """
+        Sets the values found in a dict written by to_dict.
+        """
+        self.settling_samples = int(config.get("settling_samples", self.settling_samples))
+        self.delay_samples = int(config.get("delay_samples", self.delay_samples))
+
+# Timing used by the acquisitions when none is given
+scan_timing = ScanTiming()
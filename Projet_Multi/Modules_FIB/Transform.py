@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:27:53 2026
+
+@author: Thomas
+"""
+import numpy as np
+
+class ScanTransform:
+    """
+    Rotation, zoom and pan of the scan, applied to the (x, y) voltages of the waveforms.
+
+    The voltages of the image grid are mapped to the voltages written by
+
+        (x', y') = matrix @ (x, y) + (pan_x, pan_y)
+
+    matrix rotating by rotation degrees and shrinking by zoom around the centre of the
+    field. A whole waveform is mapped by one matrix product when it is built, so the
+    transformed waveforms are cached as the others and the scan is rotated for free,
+    instead of rotating the images afterwards.
+
+    Attributes:
+        rotation (float): The rotation of the scan, in degrees, counterclockwise.
+        zoom (float): The magnification, the field scanned being 1/zoom of the window.
+        pan_x, pan_y (float): The offset of the centre of the scan, in volts.
+    """
+
+    def __init__(self, rotation=0.0, zoom=1.0, pan_x=0.0, pan_y=0.0):
+        """
+        Args:
+            rotation (float): The rotation of the scan, in degrees, counterclockwise.
+            zoom (float): The magnification, greater than 0.
+            pan_x, pan_y (float): The offset of the centre of the scan, in volts.
+
+        Raises:
+            ValueError: If zoom is not greater than 0.
+        """
+        if not zoom > 0:
+            raise ValueError(f"The zoom must be greater than 0, not {zoom}")
+        self.rotation = float(rotation)
+        self.zoom = float(zoom)
+        self.pan_x = float(pan_x)
+        self.pan_y = float(pan_y)
+
+    def key(self):
+        """
+        Returns the parameters as a tuple, part of the keys of the cached waveforms.
+        """
+        return (self.rotation, self.zoom, self.pan_x, self.pan_y)
+
+    def __eq__(self, other):
+        return isinstance(other, ScanTransform) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return (f"ScanTransform(rotation={self.rotation}, zoom={self.zoom}, pan_x={self.pan_x}, "
+                f"pan_y={self.pan_y})")
+
+    @property
+    def is_identity(self):
+        return self.key() == (0.0, 1.0, 0.0, 0.0)
+
+    def matrix(self):
+        """
+        Returns the 2x2 rotation and zoom matrix.
+        """
+        angle = np.radians(self.rotation)
+        return np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]) / self.zoom
+
+    def offset(self):
+        """
+        Returns the pan as a (2, 1) array, added to every (x, y) column.
+        """
+        return np.array([[self.pan_x], [self.pan_y]])
+
+    def apply(self, staircases):
+        """
+        Returns the (2, n) voltages staircases transformed, as a new array.
+        """
+        return self.matrix() @ staircases + self.offset()
+
+    def check(self, window, min_tension, max_tension):
+        """
+        Checks that the window (x_min, x_max, y_min, y_max), once transformed, stays in the field.
+
+        The transform is affine, so the corners of the window are the extreme voltages.
+
+        Raises:
+            ValueError: If a transformed corner is outside of [min_tension, max_tension].
+        """
+        x_min, x_max, y_min, y_max = window
+        corners = self.apply(np.array([[x_min, x_max, x_max, x_min], [y_min, y_min, y_max, y_max]], dtype=np.float64))
+        if corners.min() < min_tension - 1e-9 or corners.max() > max_tension + 1e-9:
+            raise ValueError(f"The transformed scan reaches [{corners.min():.2f}, {corners.max():.2f}] V, outside of "
+                             f"[{min_tension}, {max_tension}] V: increase the zoom or reduce the pan")
+
+    def to_dict(self):
+        return {"rotation": self.rotation, "zoom": self.zoom, "pan_x": self.pan_x, "pan_y": self.pan_y}
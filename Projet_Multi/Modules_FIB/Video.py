@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 10:12:40 2026
+
+@author: Thomas
+"""
+from collections import deque
+import queue
+import threading
+import time
+import numpy as np
+from Modules_FIB import Scanning
+from Modules_FIB.Backends import get_backend
+from Modules_FIB.Instrumentation import instrumentation
+from Modules_FIB.Timing import scan_timing
+
+class VideoStream:
+    """
+    Continuous acquisition taking frames back to back out of a running stream.
+
+    open() configures and starts the tasks (VideoStair and videoInitConf), grab() returns
+    the newest complete frame (videoGo). Frames the card acquired while the previous one
+    was processed are skipped and counted as dropped.
+
+    Attributes:
+        backend (DaqBackend): The backend of the acquisition.
+        parameters (tuple): (time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud,
+            channel_read, pixels_y, roi, transform) of the open stream, None when closed.
+        timing (ScanTiming): The timing of the open stream, a copy of the shared scan_timing.
+        frames (int): The number of frames grabbed since open().
+        dropped (int): The number of frames skipped since open().
+    """
+
+    def __init__(self, backend=None, window=30):
+        """
+        Args:
+            backend (DaqBackend): The backend of the acquisition, the default backend when None.
+            window (int): The number of frames over which the frame rate is measured.
+        """
+        self.backend = get_backend(backend)
+        self.parameters = None
+        self.write_task = None
+        self.read_task = None
+        self.read_buffer = None
+        self.timing = None
+        self.frames = 0
+        self.dropped = 0
+        self.next_frame = 0
+        self._times = deque(maxlen=window)
+
+    @property
+    def is_open(self):
+        return self.parameters is not None
+
+    def open(self, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read, pixels_y=None,
+             roi=None, transform=None):
+        """
+        Starts the continuous acquisition, closing the previous one if any.
+
+        Parameters:
+        - time_per_pixel: Time spent per pixel, in microseconds.
+        - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+        - pixels_number: Number of pixels per row in the image.
+        - channel_lr, channel_ud, channel_read: Channel names of the scan and of the detector.
+        - pixels_y: Number of rows in the image, pixels_number when None.
+        - roi: Voltage window (x_min, x_max, y_min, y_max) scanned, the whole field when None.
+        - transform: Transform.ScanTransform rotating, zooming and panning the scan, none when None.
+        """
+        self.close()
+        # The timing stays the one of the opening, a calibration applies at the next opening
+        self.timing = scan_timing.copy()
+        data_to_write, complete_horizontal_staircase, vertical_staircase = Scanning.VideoStair(
+            time_per_pixel, sampling_frequency, pixels_number, self.timing, pixels_y, roi, transform)
+        (self.samples_per_step, self.total_samples_to_read, self.timeout, self.write_task,
+         self.read_task) = Scanning.videoInitConf(channel_lr, channel_ud, channel_read, complete_horizontal_staircase,
+                                                  vertical_staircase, pixels_number, time_per_pixel, data_to_write,
+                                                  sampling_frequency, self.backend, self.timing, pixels_y)
+        self.read_buffer = self.backend.read_buffer(self.read_task, self.total_samples_to_read)
+        self.parameters = (time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                           pixels_y, roi, transform)
+        self.frames = 0
+        self.dropped = 0
+        self.next_frame = 0
+        self._times.clear()
+
+    def grab(self):
+        """
+        Returns the newest complete frame as a 2D NumPy array, waiting for it if needed.
+        """
+        image_array, frame_index = Scanning.videoGo(self.parameters[2], self.write_task, self.read_task,
+                                                    self.samples_per_step, self.total_samples_to_read, self.timeout,
+                                                    self.next_frame, self.read_buffer, self.backend, self.timing,
+                                                    self.parameters[6])
+        skipped = frame_index - self.next_frame
+        if skipped:
+            self.dropped += skipped
+            instrumentation.count("dropped", skipped)
+        self.next_frame = frame_index + 1
+        self.frames += 1
+        self._times.append(time.perf_counter())
+        return image_array
+
+    def fps(self):
+        """
+        Returns the frame rate achieved over the last frames, in frames per second.
+        """
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def close(self):
+        """
+        Stops the acquisition and closes its tasks.
+        """
+        if self.write_task is not None:
+            self.backend.close(self.write_task, self.read_task)
+        self.write_task = None
+        self.read_task = None
+        self.read_buffer = None
+        self.parameters = None
+
+
+class LineStream(VideoStream):
+    """
+    Continuous line scan taking profiles back to back out of a running stream.
+
+    The tasks are the continuous ones of the video (lineInitConf), a single line being
+    regenerated. grab() returns the newest profile, averaged over repeats lines (lineGo).
+
+    Attributes:
+        parameters (tuple): (time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud,
+            channel_read, repeats, line_tension, roi, transform) of the open stream, None when closed.
+    """
+
+    def open(self, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read, repeats=1,
+             line_tension=0.0, roi=None, transform=None):
+        """
+        Starts the line scan, closing the previous one if any.
+
+        Parameters:
+        - time_per_pixel: Time spent per pixel, in microseconds.
+        - sampling_frequency: Sampling frequency for data acquisition, in Hz.
+        - pixels_number: Number of pixels of the line.
+        - channel_lr, channel_ud, channel_read: Channel names of the scan and of the detector.
+        - repeats: Number of lines averaged into each profile.
+        - line_tension: Vertical voltage of the line.
+        - roi: Voltage window whose horizontal range is scanned, the whole field when None.
+        - transform: Transform.ScanTransform rotating, zooming and panning the line, none when None.
+        """
+        self.close()
+        self.timing = scan_timing.copy()
+        (self.samples_per_step, self.total_samples_to_read, self.timeout, self.write_task,
+         self.read_task) = Scanning.lineInitConf(channel_lr, channel_ud, channel_read, time_per_pixel, sampling_frequency,
+                                                 pixels_number, repeats, line_tension, roi, self.backend, self.timing,
+                                                 transform)
+        self.read_buffer = self.backend.read_buffer(self.read_task, self.total_samples_to_read)
+        self.parameters = (time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,
+                           repeats, line_tension, roi, transform)
+        self.frames = 0
+        self.dropped = 0
+        self.next_frame = 0
+        self._times.clear()
+
+    def grab(self):
+        """
+        Returns the newest complete profile as a 1D NumPy array, waiting for it if needed.
+        """
+        profile, frame_index = Scanning.lineGo(self.parameters[2], self.read_task, self.samples_per_step,
+                                               self.total_samples_to_read, self.timeout, self.next_frame,
+                                               self.read_buffer, self.backend, self.timing)
+        skipped = frame_index - self.next_frame
+        if skipped:
+            self.dropped += skipped
+            instrumentation.count("dropped", skipped)
+        self.next_frame = frame_index + 1
+        self.frames += 1
+        self._times.append(time.perf_counter())
+        return profile
+
+
+class TripleBuffer:
+    """
+    Latest-frame-wins handoff between the acquisition thread and the display.
+
+    The producer copies each frame into its back buffer and swaps it with the middle
+    buffer, the consumer swaps the middle buffer with its front buffer when a new frame
+    is there. Neither side waits for the other and at most one frame is pending: a frame
+    replaced before being taken is counted as coalesced instead of being queued.
+
+    The buffers are reallocated when the shape of the frames changes.
+
+    Attributes:
+        produced (int): The number of frames put.
+        displayed (int): The number of frames taken.
+        coalesced (int): The number of frames replaced by a newer one before being taken.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._back = None
+        self._middle = None
+        self._front = None
+        self._fresh = False
+        self.produced = 0
+        self.displayed = 0
+        self.coalesced = 0
+
+    def put(self, frame):
+        """
+        Publishes a copy of frame, replacing the pending one if it was not taken. Producer side.
+        """
+        frame = np.asarray(frame)
+        if self._back is None or self._back.shape != frame.shape or self._back.dtype != frame.dtype:
+            self._back = np.empty_like(frame)
+        np.copyto(self._back, frame)
+        with self._lock:
+            self._back, self._middle = self._middle, self._back
+            if self._fresh:
+                self.coalesced += 1
+                instrumentation.count("coalesced")
+            self._fresh = True
+            self.produced += 1
+
+    def take(self):
+        """
+        Returns the newest frame, or None when there is no new frame since the last call. Consumer side.
+
+        The returned array stays valid until the next call of take().
+        """
+        with self._lock:
+            if not self._fresh:
+                return None
+            self._front, self._middle = self._middle, self._front
+            self._fresh = False
+            self.displayed += 1
+        return self._front
+
+    def clear(self):
+        """
+        Drops the pending frame and resets the counters.
+        """
+        with self._lock:
+            self._fresh = False
+            self.produced = 0
+            self.displayed = 0
+            self.coalesced = 0
+
+
+class VideoWorker:
+    """
+    Command loop of a long-lived acquisition thread producing video frames back to back.
+
+    The commands are queued by any thread with start(), stop(), change_parameters(),
+    snapshot() and shutdown(), and executed by run() in the acquisition thread between
+    two frames. While no video is running, run() sleeps on the queue.
+
+    The callbacks are called from the acquisition thread:
+    - on_frame(image): every frame,
+    - on_snapshot(image): the first frame after snapshot(),
+    - on_stats(fps, frames, dropped): about every stats_interval seconds,
+    - on_error(message): when an acquisition fails, the video is then stopped.
+
+    Attributes:
+        stream (VideoStream): The continuous acquisition, a LineStream for a line scan.
+    """
+    START, STOP, PARAMETERS, SNAPSHOT, SHUTDOWN = "start", "stop", "parameters", "snapshot", "shutdown"
+
+    def __init__(self, backend=None, on_frame=None, on_snapshot=None, on_stats=None, on_error=None,
+                 stats_interval=1.0, stream=None):
+        """
+        Args:
+            backend (DaqBackend): The backend of the acquisition, the default backend when None.
+            on_frame, on_snapshot, on_stats, on_error (callable): The callbacks described above.
+            stats_interval (float): The period of on_stats, in seconds.
+            stream (VideoStream): The stream producing the frames, a VideoStream of backend when None.
+        """
+        self.stream = stream if stream is not None else VideoStream(backend)
+        self.commands = queue.Queue()
+        self.on_frame = on_frame
+        self.on_snapshot = on_snapshot
+        self.on_stats = on_stats
+        self.on_error = on_error
+        self.stats_interval = stats_interval
+        self._snapshot = False
+        self._running = False
+
+    # Commands, thread safe
+    def start(self, *parameters):
+        """Starts the stream with the parameters of its open()."""
+        self.commands.put((self.START, parameters))
+
+    def stop(self):
+        """Stops the video, the tasks are closed."""
+        self.commands.put((self.STOP, None))
+
+    def change_parameters(self, *parameters):
+        """Restarts the running video with other parameters."""
+        self.commands.put((self.PARAMETERS, parameters))
+
+    def snapshot(self):
+        """Asks for a copy of the next frame through on_snapshot."""
+        self.commands.put((self.SNAPSHOT, None))
+
+    def shutdown(self):
+        """Stops the video and makes run() return."""
+        self.commands.put((self.SHUTDOWN, None))
+
+    # Acquisition thread
+    def _execute(self, command, parameters):
+        """
+        Executes one command, returns False on shutdown.
+        """
+        if command == self.SHUTDOWN:
+            self.stream.close()
+            return False
+        if command == self.START or (command == self.PARAMETERS and self._running):
+            if parameters != self.stream.parameters:
+                self.stream.open(*parameters)
+            self._running = True
+        elif command == self.STOP:
+            self.stream.close()
+            self._running = False
+        elif command == self.SNAPSHOT:
+            self._snapshot = True
+        return True
+
+    def run(self):
+        """
+        Runs the command loop until shutdown(), to be called in the acquisition thread.
+        """
+        last_stats = time.perf_counter()
+        while True:
+            try:
+                # Commands are taken between frames, or awaited while the video is stopped
+                command, parameters = self.commands.get(block=not self._running)
+                if not self._execute(command, parameters):
+                    return
+                continue
+            except queue.Empty:
+                pass
+            except Exception as e:
+                self.stream.close()
+                self._running = False
+                if self.on_error is not None:
+                    self.on_error(str(e))
+                continue
+
+            try:
+                image_array = self.stream.grab()
+            except Exception as e:
+                self.stream.close()
+                self._running = False
+                if self.on_error is not None:
+                    self.on_error(str(e))
+                continue
+            if self._snapshot:
+                self._snapshot = False
+                if self.on_snapshot is not None:
+                    self.on_snapshot(image_array.copy())
+            if self.on_frame is not None:
+                self.on_frame(image_array)
+
+            now = time.perf_counter()
+            if self.on_stats is not None and now - last_stats >= self.stats_interval:
+                last_stats = now
+                self.on_stats(self.stream.fps(), self.stream.frames, self.stream.dropped)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 12 10:12:41 2026
+
+@author: Thomas
+"""
+from collections import OrderedDict
+import numpy as np
+
+class WaveformCache:
+    """
+    Least recently used cache for the scanning waveforms.
+
+    Waveforms are keyed by the parameters they are built from, for example
+    (mode, pixels_number, samples_per_step, min_tension, max_tension). When the total
+    size of the cached arrays goes over the byte budget, the least recently used
+    waveforms are evicted. Cached arrays are made read-only because they are shared
+    between acquisitions.
+
+    Attributes:
+        max_bytes (int): The byte budget of the cache.
+        current_bytes (int): The number of bytes currently cached.
+        hits (int): The number of requests answered from the cache.
+        misses (int): The number of requests that had to build the waveform.
+        evictions (int): The number of waveforms evicted to respect the budget.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): The byte budget of the cache.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, builder):
+        """
+        Returns the waveform of key, building it with builder() on a miss.
+
+        Args:
+            key (tuple): The hashable parameters of the waveform.
+            builder (callable): Called without argument to build the waveform, a numpy
+                array or a tuple of numpy arrays.
+
+        Returns:
+            The cached waveform.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = builder()
+        arrays = value if isinstance(value, tuple) else (value,)
+        nbytes = 0
+        for array in arrays:
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+                nbytes += array.nbytes
+
+        # A waveform bigger than the whole budget is returned without being cached
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+        return value
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+    def set_budget(self, max_bytes):
+        """
+        Changes the byte budget, evicting waveforms if needed.
+        """
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        """
+        Removes every waveform from the cache, the counters are kept.
+        """
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            dict: hits, misses, evictions, entries, current_bytes and max_bytes.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes}
+
+    def __len__(self):
+        return len(self._entries)
+
+# Cache shared by all the scanning functions
+waveforms = WaveformCache()
@@ -1,11 +1,21 @@
 import sys
 from PyQt6 import QtCore, QtWidgets, uic
-from PyQt6.QtGui import QImage, QPixmap
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer
+from PyQt6.QtGui import QImage, QPixmap, QGuiApplication, QPainter, QPolygonF
+from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer, QRectF, QPointF
 import warnings
 from Modules_FIB import ImageProcessing as ImPr
 from Modules_FIB import Scanning
-from Modules_FIB import Ni_Dependencies as NID
+from Modules_FIB.Acquisition import AcquisitionSession
+from Modules_FIB.Video import VideoWorker, TripleBuffer, LineStream
+from Modules_FIB.Spot import RingBuffer, SpotStream
+from Modules_FIB import Backends
+from Modules_FIB.Simulation import SimulatedBackend
+from Modules_FIB.Recording import RecordingBackend, ReplayBackend
+from Modules_FIB.Instrumentation import instrumentation
+from Modules_FIB.Progress import progress
+from Modules_FIB.Timing import scan_timing
+from Modules_FIB.Transform import ScanTransform
+from Modules_FIB.Distortion import scan_distortion
 from Modules_FIB import Visa_Dependencies as VID
 from Modules_FIB.Visa_Dependencies import PowerSupply as PS
 import time
@@ -53,12 +63,22 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.pushButton_save_image.clicked.connect(self.saveImage)
         self.pushButton_load_config.clicked.connect(self.loadConfig)
         self.pushButton_save_config.clicked.connect(self.saveConfig)
+        # Measures the delay between the scan outputs and the detector, see Scanning.calibrate_delay
+        self.pushButton_calibrate_delay = QtWidgets.QPushButton("Calibrate delay", self)
+        self.pushButton_calibrate_delay.clicked.connect(self.calibrateDelay)
+        self.statusBar().addPermanentWidget(self.pushButton_calibrate_delay)
+        # Fits the correction of the deflection non-linearity on a grid, see Scanning.calibrate_distortion
+        self.pushButton_calibrate_distortion = QtWidgets.QPushButton("Calibrate distortion", self)
+        self.pushButton_calibrate_distortion.clicked.connect(self.calibrateDistortion)
+        self.statusBar().addPermanentWidget(self.pushButton_calibrate_distortion)
         
         # Continuous acquisition part
         self.pushButton_video.clicked.connect(self.togglevideo)
         self.video_in_progress = False
-        self.timer=QTimer()
-        self.timer.timeout.connect(self.Scanningcontinue)
+        self.pushButton_line_scan.clicked.connect(self.toggleLineScan)
+        self.line_scan_in_progress = False
+        self.pushButton_spot.clicked.connect(self.toggleSpot)
+        self.spot_in_progress = False
         # Connect sliders to their respective functions
         self.brightness_slider.valueChanged.connect(self.gpp_4323_brightness_slider_changed)
         self.brightness_slider.sliderReleased.connect(self.gpp_4323_brightness_slider_released)
@@ -66,14 +86,71 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # Ensure required time recalculation after modification
         self.spinBox_time_per_pixel.valueChanged.connect(self.required_time)
         self.spinBox_image_size.valueChanged.connect(self.required_time)
+        self.spinBox_image_height.valueChanged.connect(self.required_time)
+        self.comboBox_Scanning_Mode.currentTextChanged.connect(self.required_time)
+        self.doubleSpinBox_sparse_fraction.valueChanged.connect(self.required_time)
         
         # Initialize instance variables
         self.port_dev = None
         self.gpp_power_supply = None
         self.sweep_thread = None
         self.population_thread = None
-        self.progressBarThread = None
+        self.progressTimer = QTimer()   # Polls the acquired samples during a sweep
+        self.progressTimer.timeout.connect(self.updateProgressBar)
         self.currentImage = None
+        self.backend = Backends.get_backend()   # NI card, simulated FIB or replay
+        self.closed = False   # Set once the application is quitting, see quit
+        self.simulated = not self.backend.hardware
+        self.acquisition_session = AcquisitionSession(self.backend)   # Keeps the sweep tasks alive between images
+
+        # A single acquisition thread produces the video frames, it waits for commands while the video is stopped
+        # The frames are handed to the display through a triple buffer, only the newest one is painted
+        self.video_frames = TripleBuffer()
+        self.acquisition_thread = AcquisitionThread(self.video_frames.put, self.backend)
+        self.acquisition_thread.snapshotTaken.connect(self.videoSnapshot)
+        self.acquisition_thread.statsUpdated.connect(self.videoStats)
+        self.acquisition_thread.errorOccurred.connect(self.handleVideoError)
+        self.acquisition_thread.start()
+        self.displayTimer = QTimer()
+        self.displayTimer.timeout.connect(self.displayVideoFrame)
+
+        # The line scan has its own acquisition thread and buffer, its profiles are plotted at 50 Hz or more
+        self.line_profiles = TripleBuffer()
+        self.line_thread = AcquisitionThread(self.line_profiles.put, self.backend, LineStream(self.backend))
+        self.line_thread.statsUpdated.connect(self.lineScanStats)
+        self.line_thread.errorOccurred.connect(self.handleLineScanError)
+        self.line_thread.start()
+        self.profileDisplayTimer = QTimer()
+        self.profileDisplayTimer.timeout.connect(self.displayProfile)
+
+        # The spot time series streams into a ring buffer, plotted with its statistics at a fixed rate
+        self.spot_series = RingBuffer(1)
+        self.spot_thread = AcquisitionThread(self.spot_series.extend, self.backend, SpotStream(self.backend))
+        self.spot_thread.errorOccurred.connect(self.handleSpotError)
+        self.spot_thread.statsUpdated.connect(self.spotStats)
+        self.spot_dropped = 0
+        self.spot_thread.start()
+        self.spotDisplayTimer = QTimer()
+        self.spotDisplayTimer.timeout.connect(self.displaySpot)
+        self.spinBox_time_per_pixel.valueChanged.connect(self.videoParametersChanged)
+        self.spinBox_sampling_frequency.valueChanged.connect(self.videoParametersChanged)
+        self.comboBox_hs.currentTextChanged.connect(self.videoParametersChanged)
+        self.comboBox_vs.currentTextChanged.connect(self.videoParametersChanged)
+        self.comboBox_sensor.currentTextChanged.connect(self.videoParametersChanged)
+        self.spinBox_image_size.valueChanged.connect(self.videoParametersChanged)
+        self.spinBox_image_height.valueChanged.connect(self.videoParametersChanged)
+        self.lineEdit_roi.editingFinished.connect(self.videoParametersChanged)
+        self.doubleSpinBox_rotation.valueChanged.connect(self.videoParametersChanged)
+        self.doubleSpinBox_zoom.valueChanged.connect(self.videoParametersChanged)
+        self.doubleSpinBox_pan_x.valueChanged.connect(self.videoParametersChanged)
+        self.doubleSpinBox_pan_y.valueChanged.connect(self.videoParametersChanged)
+        self.spinBox_line_repeats.valueChanged.connect(self.videoParametersChanged)
+
+        # With "--profile" the median duration of each phase is shown in the status bar
+        self.profileTimer = QTimer()
+        self.profileTimer.timeout.connect(self.showProfile)
+        if instrumentation.enabled:
+            self.profileTimer.start(1000)
 
         # Initialize the comboBoxes
         self.populate_dev_combobox()
@@ -93,10 +170,36 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         Function to quit the application safely.
         Disconnects from the power supply if connected before exiting.
         """
+        if self.closed:
+            return
+        self.closed = True
         if self.gpp_power_supply is not None:
             self.gpp_power_supply.disconnect()
+        self.acquisition_thread.worker.shutdown()
+        self.acquisition_thread.wait()
+        self.line_thread.worker.shutdown()
+        self.line_thread.wait()
+        self.spot_thread.worker.shutdown()
+        self.spot_thread.wait()
+        self.acquisition_session.close()
+        # With "--record", the last records are only flushed when the file is closed
+        if isinstance(self.backend, RecordingBackend):
+            self.backend.close_recording()
         QtCore.QCoreApplication.instance().quit()
 
+    def closeEvent(self, event):
+        """
+        Closing the window quits the application safely, as the quit button.
+        """
+        self.quit()
+        event.accept()
+
+    def showProfile(self):
+        """
+        Shows the median duration of each phase of the acquisition in the status bar.
+        """
+        self.statusBar().showMessage(instrumentation.report_line())
+
     #########################################################################################
     
     #a replacer (dsl de l'oganisation C: )
@@ -104,32 +207,231 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if not self.video_in_progress:
             self.startvideo()
         else:
-            self.stopvideo(self.write_task,self.read_task)
+            self.stopvideo()
+
+    # Width, height and region of interest of the scans, a small strip gives a fast video
+    def scanGeometry(self):
+        """
+        Returns (pixels_number, pixels_y, roi) from the interface, roi being None for the whole field.
+
+        Raises:
+        ValueError: If the region of interest is not 4 voltages within the field.
+        """
+        text = self.lineEdit_roi.text().strip()
+        roi = None
+        if text:
+            roi = tuple(float(value) for value in text.replace(";", ",").split(","))
+            if len(roi) != 4:
+                raise ValueError("The ROI must be x min, x max, y min, y max in volts")
+            Scanning.scan_window(roi, -10, 10)
+        return self.spinBox_image_size.value(), self.spinBox_image_height.value(), roi
+
+    # Rotation, zoom and pan of the scans, baked into the waveforms
+    def scanTransform(self):
+        """
+        Returns the ScanTransform of the interface, None when the scan is neither rotated, zoomed nor panned.
+        """
+        transform = ScanTransform(self.doubleSpinBox_rotation.value(), self.doubleSpinBox_zoom.value(),
+                                  self.doubleSpinBox_pan_x.value(), self.doubleSpinBox_pan_y.value())
+        return None if transform.is_identity else transform
+
+    # Parameters of VideoStream.open taken from the interface
+    def videoParameters(self):
+        pixels_number, pixels_y, roi = self.scanGeometry()
+        return (self.spinBox_time_per_pixel.value(), self.spinBox_sampling_frequency.value(), pixels_number,
+                self.comboBox_hs.currentText(), self.comboBox_vs.currentText(), self.comboBox_sensor.currentText(),
+                pixels_y, roi, self.scanTransform())
     
     def startvideo(self):
-        time_per_pixel = self.spinBox_time_per_pixel.value()
-        sampling_frequency = self.spinBox_sampling_frequency.value()
-        pixels_number = 256
-        channel_lr = self.comboBox_hs.currentText()
-        channel_ud = self.comboBox_vs.currentText()
-        channel_read = self.comboBox_sensor.currentText()
-        mode = self.comboBox_Scanning_Mode.currentText()
+        if self.line_scan_in_progress or self.spot_in_progress:
+            self.Message('Error', f"Please stop the line scan or the spot first")
+            return
+        try:
+            parameters = self.videoParameters()
+        except ValueError as e:
+            self.Message('Error', f"{e}")
+            return
         self.video_in_progress = True
-        data_to_write,complete_horizontal_staircase,vertical_staircase=Scanning.VideoStair(time_per_pixel, sampling_frequency, pixels_number)
-       
-        self.samples_per_step,self.total_samples_to_read,self.timeout,self.write_task,self.read_task=Scanning.videoInitConf(channel_lr,channel_ud,channel_read,complete_horizontal_staircase,vertical_staircase,
-                         pixels_number,time_per_pixel,data_to_write,sampling_frequency)
-        
+        self.acquisition_session.close()   # The video uses the same channels
+        self.video_frames.clear()
+        self.acquisition_thread.worker.start(*parameters)
         self.pushButton_video.setText('Arrêter')
-        self.timer.start(100)   
-        self.Scanningcontinue()
-        print("ici")
+        # The display is not refreshed faster than the screen
+        refresh_rate = QGuiApplication.primaryScreen().refreshRate() or 60
+        self.displayTimer.start(max(int(1000 / refresh_rate), 1))
         
-    def stopvideo(self,write_task,read_task):
+    def stopvideo(self):
         self.video_in_progress = False
         self.pushButton_video.setText('Lancer')
-        self.timer.stop() 
-        NID.close(self.write_task,self.read_task)
+        self.acquisition_thread.worker.stop()
+        self.displayTimer.stop()
+
+    # The running video or line scan is restarted with the new parameters
+    def videoParametersChanged(self):
+        try:
+            if self.video_in_progress:
+                self.acquisition_thread.worker.change_parameters(*self.videoParameters())
+            if self.line_scan_in_progress:
+                self.line_thread.worker.change_parameters(*self.lineScanParameters())
+        except ValueError as e:
+            self.Message('Error', f"{e}")
+
+    # During the video the image is saved from a snapshot of the next frame
+    def videoSnapshot(self, np_image):
+        self.saveImage(ImPr.normalize(np_image))
+
+    # Paints the newest frame, the frames acquired since the last refresh are skipped
+    def displayVideoFrame(self):
+        np_image = self.video_frames.take()
+        if np_image is not None:
+            self.displayImage(np_image)
+
+    def videoStats(self, fps, frames, dropped):
+        if not instrumentation.enabled:
+            self.statusBar().showMessage(f"Video: {fps:.1f} fps, {frames} frames, {dropped} dropped, "
+                                         f"{self.video_frames.coalesced} not displayed")
+
+    def handleVideoError(self, error_message):
+        self.video_in_progress = False
+        self.pushButton_video.setText('Lancer')
+        self.displayTimer.stop()
+        self.Message('Error', f"Video returned: {error_message}")
+
+    # Line scan part
+    def toggleLineScan(self):
+        if not self.line_scan_in_progress:
+            self.startLineScan()
+        else:
+            self.stopLineScan()
+
+    # Parameters of LineStream.open: the line is the horizontal range of the ROI, at the middle of its height
+    def lineScanParameters(self):
+        pixels_number, pixels_y, roi = self.scanGeometry()
+        line_tension = 0.0 if roi is None else (roi[2] + roi[3]) / 2
+        return (self.spinBox_time_per_pixel.value(), self.spinBox_sampling_frequency.value(), pixels_number,
+                self.comboBox_hs.currentText(), self.comboBox_vs.currentText(), self.comboBox_sensor.currentText(),
+                self.spinBox_line_repeats.value(), line_tension, roi, self.scanTransform())
+
+    def startLineScan(self):
+        if self.video_in_progress or self.spot_in_progress:
+            self.Message('Error', f"Please stop the video or the spot first")
+            return
+        try:
+            parameters = self.lineScanParameters()
+        except ValueError as e:
+            self.Message('Error', f"{e}")
+            return
+        self.line_scan_in_progress = True
+        self.acquisition_session.close()   # The line scan uses the same channels
+        self.line_profiles.clear()
+        self.line_thread.worker.start(*parameters)
+        self.pushButton_line_scan.setText('Stop line scan')
+        # At least 50 profiles per second are plotted, the profiles acquired in between are skipped
+        refresh_rate = max(QGuiApplication.primaryScreen().refreshRate() or 60, 50)
+        self.profileDisplayTimer.start(max(int(1000 / refresh_rate), 1))
+
+    def stopLineScan(self):
+        self.line_scan_in_progress = False
+        self.pushButton_line_scan.setText('Line scan')
+        self.line_thread.worker.stop()
+        self.profileDisplayTimer.stop()
+
+    # Plots the newest profile
+    def displayProfile(self):
+        profile = self.line_profiles.take()
+        if profile is not None:
+            self.plotCurve(profile)
+
+    # Plots values as a polyline scaled to their range
+    def plotCurve(self, values):
+        with instrumentation.phase("display"):
+            width, height = self.QPixmap_profile.width(), self.QPixmap_profile.height()
+            low, high = values.min(), values.max()
+            scale = (height - 1) / (high - low) if high > low else 0
+            xs = np.linspace(0, width - 1, len(values))
+            ys = (height - 1) - (values - low) * scale
+            pixmap = QPixmap(width, height)
+            pixmap.fill(Qt.GlobalColor.black)
+            painter = QPainter(pixmap)
+            painter.setPen(Qt.GlobalColor.green)
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, ys)]))
+            painter.end()
+            self.QPixmap_profile.setPixmap(pixmap)
+        instrumentation.count("displayed")
+
+    def lineScanStats(self, fps, frames, dropped):
+        if not instrumentation.enabled:
+            self.statusBar().showMessage(f"Line scan: {fps:.1f} profiles/s, {frames} profiles, {dropped} dropped, "
+                                         f"{self.line_profiles.coalesced} not displayed")
+
+    def handleLineScanError(self, error_message):
+        self.stopLineScan()
+        self.Message('Error', f"Line scan returned: {error_message}")
+
+    # Spot part
+    spot_history = 60      # Seconds of points kept
+    spot_plotted = 10      # Seconds of points plotted
+    spot_statistics = 1    # Seconds of points of the rolling statistics
+    spot_refresh = 40      # Refresh period of the plot, in milliseconds
+
+    def toggleSpot(self):
+        if not self.spot_in_progress:
+            self.startSpot()
+        else:
+            self.stopSpot()
+
+    def startSpot(self):
+        if self.video_in_progress or self.line_scan_in_progress:
+            self.Message('Error', f"Please stop the video or the line scan first")
+            return
+        sampling_frequency = self.spinBox_sampling_frequency.value()
+        decimation = self.spinBox_spot_decimation.value()
+        self.spot_point_rate = sampling_frequency / decimation
+        # The ring buffer is reallocated only when the rate of the points changes
+        capacity = int(self.spot_history * self.spot_point_rate)
+        if capacity != self.spot_series.capacity:
+            self.spot_series = RingBuffer(capacity)
+            self.spot_thread.worker.on_frame = self.spot_series.extend
+        self.spot_series.clear()
+        self.spot_dropped = 0
+        self.spot_in_progress = True
+        self.acquisition_session.close()   # The spot uses the same channels
+        self.spot_thread.worker.start(sampling_frequency, decimation, self.doubleSpinBox_spot_x.value(),
+                                      self.doubleSpinBox_spot_y.value(), self.comboBox_hs.currentText(),
+                                      self.comboBox_vs.currentText(), self.comboBox_sensor.currentText(),
+                                      self.scanTransform())
+        self.pushButton_spot.setText('Stop spot')
+        self.spotDisplayTimer.start(self.spot_refresh)
+
+    def stopSpot(self):
+        self.spot_in_progress = False
+        self.pushButton_spot.setText('Spot')
+        self.spot_thread.worker.stop()
+        self.spotDisplayTimer.stop()
+
+    # Plots the last seconds of the time series and shows its rolling statistics
+    def displaySpot(self):
+        values = self.spot_series.latest(int(self.spot_plotted * self.spot_point_rate))
+        if len(values) < 2:
+            return
+        # More points than pixels are averaged down to the width of the plot
+        width = self.QPixmap_profile.width()
+        if len(values) > width:
+            values = values[len(values) % width:].reshape(width, -1).mean(axis=1)
+        self.plotCurve(values)
+        mean, std, low, high = self.spot_series.stats(int(self.spot_statistics * self.spot_point_rate))
+        self.statusBar().showMessage(f"Spot: mean {mean:.4f} V, std {std:.4f} V, min {low:.4f} V, max {high:.4f} V "
+                                     f"over {self.spot_statistics} s, {self.spot_series.total} points, "
+                                     f"{self.spot_dropped} chunks dropped")
+
+    # The chunks lost when the display could not keep up, see SpotStream
+    def spotStats(self, rate, chunks, dropped):
+        self.spot_dropped = dropped
+
+    def handleSpotError(self, error_message):
+        self.stopSpot()
+        self.Message('Error', f"Spot returned: {error_message}")
+
     # OP connection part
     
     def OPProgram(self):
@@ -148,8 +450,7 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         It is used to provide a selection of available NI devices for user interaction.
         """
         try:
-            system = NID.Ni_Cards_System()
-            items = [device.name for device in system.devices]  # Lists the connected NI devices
+            items = self.backend.device_names()  # Lists the connected NI devices
             self.comboBox_dev.clear()  # Clear existing items
             self.comboBox_dev.addItems(items)  # Add new items
 
@@ -166,17 +467,15 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         """
         try:
             self.port_dev = self.comboBox_dev.currentText()
-            system = NID.Ni_Cards_System()
-            if (not self.comboBox_dev.currentText() in system.devices) or (
+            if (not self.comboBox_dev.currentText() in self.backend.device_names()) or (
                     self.comboBox_dev.currentText() == ""):  # Checks if the device is connected
                 self.Message('Error', 'Wrong port choice')
                 self.populate_dev_combobox()
                 self.port_dev = None
             else:  # If the device is connected, we do this
                 self.port_dev = self.comboBox_dev.currentText()
-                device = NID.Ni_Cards_Device(self.port_dev)
-                ao_channels = [chan.name for chan in device.ao_physical_chans]  # Lists the available analog output channels
-                ai_channels = [chan.name for chan in device.ai_physical_chans]  # Lists the available analog input channels
+                ao_channels = self.backend.ao_channels(self.port_dev)  # Lists the available analog output channels
+                ai_channels = self.backend.ai_channels(self.port_dev)  # Lists the available analog input channels
                 self.comboBox_vs.clear()  # Clear existing items
                 self.comboBox_hs.clear()  # Clear existing items
                 self.comboBox_vs.addItems(ao_channels)  # Add new items
@@ -274,33 +573,16 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     #########################################################################################
     # Sweep part
-    def Scanningcontinue(self):
-        time_per_pixel = 4
-        sampling_frequency = 250000
-        pixels_number = 256
-        channel_lr = self.comboBox_hs.currentText()
-        channel_ud = self.comboBox_vs.currentText()
-        channel_read = self.comboBox_sensor.currentText()
-        mode = self.comboBox_Scanning_Mode.currentText()
-        
-        self.VideoRthread = VideoR_thread(self.total_samples_to_read,self.timeout,
-                                          self.write_task,self.read_task,
-                                          time_per_pixel, sampling_frequency, pixels_number, channel_lr, 
-                                          channel_ud, channel_read,mode)
-        self.VideoRthread.image.connect(self.displayImage)
-        self.VideoRthread.finished.connect(self.thread_cleanup)
-        self.VideoRthread.start()
-    
     def Sweep(self):
         """
         Function to start the Sweep operation.
-        Checks for valid configurations and starts the SweepThread and ProgressBarThread.
+        Checks for valid configurations and starts the SweepThread and the progress timer.
         """
         if self.port_dev is None:
             self.Message('Error', f"Please connect to NI Card first")
         elif self.comboBox_hs.currentText() == self.comboBox_vs.currentText():
             self.Message('Error', f"Please choose different channels for horizontal and vertical sweep")
-        elif self.gpp_power_supply is None:
+        elif self.gpp_power_supply is None and not self.simulated:
             self.Message('Error', f"Please connect to GPP power supply first")
         elif self.spinBox_time_per_pixel.value() < 1000000/self.spinBox_sampling_frequency.value():
             self.Message('Error', f"You must be at least have {ceil(1000000/self.spinBox_sampling_frequency.value())} µs per pixel")
@@ -309,23 +591,43 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 # Gets the values from the comboBoxes
                 time_per_pixel = self.spinBox_time_per_pixel.value()
                 sampling_frequency = self.spinBox_sampling_frequency.value()
-                pixels_number = self.spinBox_image_size.value()
+                pixels_number, pixels_y, roi = self.scanGeometry()
                 channel_lr = self.comboBox_hs.currentText()
                 channel_ud = self.comboBox_vs.currentText()
                 channel_read = self.comboBox_sensor.currentText()
                 mode = self.comboBox_Scanning_Mode.currentText()
+                # These modes and the large frames are not run by the session, they open their own tasks on the same channels
+                if mode in ("Interlaced", "Hilbert", "Sparse", "Adaptive") or pixels_number * pixels_y > 1024 ** 2:
+                    self.acquisition_session.close()
                 # Sweep signal generation in a thread
-                self.sweep_thread = SweepThread(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,mode)
+                self.sweep_thread = SweepThread(time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,mode,
+                                                self.acquisition_session, pixels_y, roi,
+                                                self.doubleSpinBox_sparse_fraction.value(), self.scanTransform())
                 self.sweep_thread.errorOccurred.connect(self.handleSweepError)
                 self.sweep_thread.image.connect(self.displayImage)
+                self.sweep_thread.lines.connect(self.displayLines)   # The lines are shown as they are acquired
+                self.sweep_thread.preview.connect(self.displayImage)   # The passes of an interlaced sweep
+                self.sweep_thread.status.connect(self.statusBar().showMessage)   # The timings of the session
+                self.sweep_thread.finished.connect(self.sweepFinished)
                 self.sweep_thread.finished.connect(self.thread_cleanup)
 
-                self.progressBarThread = ProgressBar(time_per_pixel, pixels_number)
-                self.progressBarThread.progressUpdated.connect(self.updateProgressBar)
-                self.progressBarThread.finished.connect(self.thread_cleanup)
+                # The progress follows the samples acquired by the card, polled 10 times per second
+                samples_per_step = int(time_per_pixel / 1000000 * sampling_frequency)
+                if mode == "Adaptive":
+                    # Two tasks, the preview and the adaptive raster
+                    progress.begin(Scanning.adaptive_samples(time_per_pixel, sampling_frequency, pixels_number,
+                                                             self.doubleSpinBox_sparse_fraction.value(),
+                                                             pixels_y=pixels_y), sampling_frequency)
+                elif mode in ("Hilbert", "Sparse"):
+                    # Not a raster, the total is the one of the read task
+                    progress.begin(0, sampling_frequency)
+                else:
+                    progress.begin(scan_timing.samples_to_read(pixels_number, samples_per_step, pixels_y), sampling_frequency)
+                self.progressBar_sweep.setValue(0)
+                self.progressTimer.start(100)
+                self.startProgressiveDisplay(pixels_number, pixels_y)
 
                 self.sweep_thread.start()
-                self.progressBarThread.start()
             except Exception as e:
                 self.Message('Error', f"Sweep function returned : {e}")
 
@@ -344,18 +646,25 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.Message('Error', f"Sweep function returned: {error_message}")
 
     # Update the progression bar
-    def updateProgressBar(self, value):
+    def updateProgressBar(self):
         """
-        Updates the progress bar's value during the sweep process.
+        Updates the progress bar and the remaining time during the sweep process.
 
-        This method is connected to the `progressUpdated` signal of the ProgressBar thread. It is
-        called periodically to update the progress bar on the UI to reflect the current progress of
-        the sweep operation.
-
-        Parameters:
-            value (int): The current progress value to set on the progress bar.
+        This method is called by the progress timer. The progress is read from the number of
+        samples acquired by the card, so it stays accurate whatever the dwell time and the
+        number of frames of the acquisition.
         """
-        self.progressBar_sweep.setValue(value)
+        self.progressBar_sweep.setValue(int(progress.fraction() * 100))
+        eta = progress.eta()
+        if eta is not None:
+            self.progressBar_sweep.setFormat(f"%p% - {ceil(eta)} s")
+
+    # The sweep thread is done, successfully or not
+    def sweepFinished(self):
+        self.progressTimer.stop()
+        progress.finish()
+        self.progressBar_sweep.setFormat("%p%")
+        self.progressBar_sweep.setValue(100)
 
     #########################################################################################
     # Image part
@@ -367,49 +676,161 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         Normalizes the values and updates the QPixmap with the new image.
 
         Args:
-        image (numpy.ndarray): List of pixel values to be displayed.
+        image (numpy.ndarray): 2D array of pixel values to be displayed, of any width and height.
         """
         try:
-            if self.video_in_progress == True:
-                pixels_number=256
-            else :
-                pixels_number = self.spinBox_image_size.value()
-            
-            scanning_mode = self.comboBox_Scanning_Mode.currentText()
-            # Normalise the values between 0 and 255
-            np_image_norm=ImPr.normalize(np_image)
-            if scanning_mode=="Triangle":
-                np_image_norm=ImPr.triangle_scanning(np_image_norm,pixels_number)
+            # Normalise the values between 0 and 255, the triangle scans are already flipped by Scanning
+            with instrumentation.phase("normalize"):
+                np_image_norm=np.ascontiguousarray(ImPr.normalize(np_image))
                 
             self.currentImage = np_image_norm   # Useful to save the image
 
-            stride = pixels_number  # Number of bytes per line for a grayscale image
-            qImage = QImage(np_image_norm.data, pixels_number, pixels_number, stride, QImage.Format.Format_Grayscale8)
-            pixmap = QPixmap.fromImage(qImage)
-            pixmap = pixmap.scaled(self.QPixmap_ui.width(), self.QPixmap_ui.height(),
-                                   Qt.AspectRatioMode.KeepAspectRatio)
-            self.QPixmap_ui.setPixmap(pixmap)
-            self.repaint()
+            with instrumentation.phase("display"):
+                height, width = np_image_norm.shape
+                stride = width  # Number of bytes per line for a grayscale image
+                qImage = QImage(np_image_norm.data, width, height, stride, QImage.Format.Format_Grayscale8)
+                pixmap = QPixmap.fromImage(qImage)
+                pixmap = pixmap.scaled(self.QPixmap_ui.width(), self.QPixmap_ui.height(),
+                                       Qt.AspectRatioMode.KeepAspectRatio)
+                self.QPixmap_ui.setPixmap(pixmap)   # Painted by the event loop, no synchronous repaint
+            instrumentation.count("displayed")
 
         except Exception as e:
             self.Message('Error', f" Couldn't display the image : {e}")
 
+    # Prepares the persistent image filled line by line during a sweep
+    def startProgressiveDisplay(self, pixels_number, pixels_y=None):
+        """
+        Creates the persistent QImage and pixmap updated by displayLines during a sweep.
+
+        The QImage shares the memory of a uint8 array, only the rows received are converted
+        and only their part of the pixmap is repainted.
+
+        Args:
+        pixels_number (int): Number of pixels per row of the sweep.
+        pixels_y (int): Number of rows of the sweep, pixels_number when None.
+        """
+        pixels_y = pixels_number if pixels_y is None else pixels_y
+        self.progressive_array = np.zeros((pixels_y, pixels_number), dtype=np.uint8)
+        self.progressive_qimage = QImage(self.progressive_array.data, pixels_number, pixels_y, pixels_number,
+                                         QImage.Format.Format_Grayscale8)
+        self.progressive_pixmap = QPixmap.fromImage(self.progressive_qimage).scaled(
+            self.QPixmap_ui.width(), self.QPixmap_ui.height(), Qt.AspectRatioMode.KeepAspectRatio)
+        self.progressive_range = None
+        self.QPixmap_ui.setPixmap(self.progressive_pixmap)
+
+    # Display the new lines of a sweep
+    def displayLines(self, np_image, first_row, last_row):
+        """
+        Updates the rows [first_row, last_row) of the image being acquired.
+
+        The grey levels use the range of the rows received so far, the rows already shown are
+        only converted again when a new row widens this range. The complete image is then
+        normalized as a whole by displayImage.
+
+        Args:
+        np_image (numpy.ndarray): The image being acquired, complete up to last_row.
+        first_row, last_row (int): The rows completed since the previous call.
+        """
+        try:
+            rows = np_image[first_row:last_row]
+            low, high = rows.min(), rows.max()
+            if self.progressive_range is not None:
+                low, high = min(low, self.progressive_range[0]), max(high, self.progressive_range[1])
+            if self.progressive_range != (low, high):
+                self.progressive_range = (low, high)
+                first_row = 0   # The rows already shown use the previous range
+            with instrumentation.phase("normalize"):
+                scale = 255 / (high - low) if high > low else 0
+                self.progressive_array[first_row:last_row] = (np_image[first_row:last_row] - low) * scale
+
+            with instrumentation.phase("display"):
+                # Only the band of the pixmap covering the new rows is repainted
+                height, width = self.progressive_array.shape
+                row_scale = self.progressive_pixmap.height() / height
+                painter = QPainter(self.progressive_pixmap)
+                painter.drawImage(QRectF(0, first_row * row_scale, self.progressive_pixmap.width(),
+                                         (last_row - first_row) * row_scale),
+                                  self.progressive_qimage, QRectF(0, first_row, width, last_row - first_row))
+                painter.end()
+                self.QPixmap_ui.setPixmap(self.progressive_pixmap)
+
+        except Exception as e:
+            # The next lines of the sweep are not shown, the image is still shown when complete
+            if isinstance(self.sender(), SweepThread):
+                self.sender().lines.disconnect(self.displayLines)
+            self.Message('Error', f" Couldn't display the lines : {e}")
+
     # Save the image
-    def saveImage(self):
+    def saveImage(self, image=None):
         """
         Function to save the current image displayed in the interface.
         Opens a dialog to choose the file location and format.
+
+        Args:
+        image (numpy.ndarray): Image to save instead of the current image, if any.
         """
+        if image is None or isinstance(image, bool):
+            if self.video_in_progress:
+                self.acquisition_thread.worker.snapshot()   # Saved by videoSnapshot
+                return
+            image = self.currentImage
         try:
             # Get the save name
             filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Image", "", "PNG Files (*.png);;JPEG Files (*.jpeg);;BMP Files (*.bmp);;TIFF Files (*.tiff);;All Files (*)")
             if filename:
                 # Save the image currently displayed on the QPixmap
-                img = Image.fromarray(self.currentImage)
+                img = Image.fromarray(image)
                 img.save(filename)
         except Exception as e:
             self.Message('Error', f"Failed to save image : {e}")
 
+    def calibrateDelay(self):
+        """
+        Measures the delay between the scan outputs and the detector on a triangle frame of
+        the current parameters. The delay is used by the next acquisitions and saved with the config.
+        """
+        if self.port_dev is None:
+            self.Message('Error', f"Please connect to NI Card first")
+        elif self.video_in_progress or self.line_scan_in_progress or self.spot_in_progress or (self.sweep_thread is not None and self.sweep_thread.isRunning()):
+            self.Message('Error', f"Please wait for the end of the acquisition")
+        else:
+            try:
+                # The tasks of the session use the same channels
+                self.acquisition_session.close()
+                delay = Scanning.calibrate_delay(self.spinBox_time_per_pixel.value(), self.spinBox_sampling_frequency.value(),
+                                                 self.spinBox_image_size.value(), self.comboBox_hs.currentText(),
+                                                 self.comboBox_vs.currentText(), self.comboBox_sensor.currentText(),
+                                                 self.backend)
+                self.required_time()
+                self.Message('Success', f"Delay calibrated : {delay} samples "
+                                        f"({delay / self.spinBox_sampling_frequency.value() * 1000000:.1f} µs)")
+            except Exception as e:
+                self.Message('Error', f"Delay calibration failed : {e}")
+
+    def calibrateDistortion(self):
+        """
+        Fits the distortion correction of the deflection on a frame of a grid of bright dots, of the
+        current size. The next waveforms are corrected, the correction is saved with the config.
+        """
+        if self.port_dev is None:
+            self.Message('Error', f"Please connect to NI Card first")
+        elif self.video_in_progress or self.line_scan_in_progress or self.spot_in_progress or (self.sweep_thread is not None and self.sweep_thread.isRunning()):
+            self.Message('Error', f"Please wait for the end of the acquisition")
+        else:
+            try:
+                # The tasks of the session use the same channels
+                self.acquisition_session.close()
+                correction = Scanning.calibrate_distortion(self.spinBox_time_per_pixel.value(),
+                                                           self.spinBox_sampling_frequency.value(),
+                                                           self.spinBox_image_size.value(), self.comboBox_hs.currentText(),
+                                                           self.comboBox_vs.currentText(), self.comboBox_sensor.currentText(),
+                                                           backend=self.backend)
+                self.Message('Success', f"Distortion calibrated on {correction.points} grid points, "
+                                        f"residual {correction.residual * 1000:.1f} mV")
+            except Exception as e:
+                self.Message('Error', f"Distortion calibration failed : {e}")
+
     #########################################################################################
     # Config part
     def saveConfig(self):
@@ -423,11 +844,19 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 "time_per_pixel": self.spinBox_time_per_pixel.value(),
                 "sampling_frequency": self.spinBox_sampling_frequency.value(),
                 "pixels_number": self.spinBox_image_size.value(),
+                "pixels_y": self.spinBox_image_height.value(),
+                "roi": self.lineEdit_roi.text(),
                 "channel_lr": self.comboBox_hs.currentText(),
                 "channel_ud": self.comboBox_vs.currentText(),
                 "channel_read": self.comboBox_sensor.currentText(),
                 "port_dev": self.comboBox_dev.currentText(),
-                "gpp_power_supply": self.comboBox_gpp_4323.currentText()
+                "gpp_power_supply": self.comboBox_gpp_4323.currentText(),
+                "sparse_fraction": self.doubleSpinBox_sparse_fraction.value(),
+                "scan_transform": ScanTransform(self.doubleSpinBox_rotation.value(), self.doubleSpinBox_zoom.value(),
+                                                self.doubleSpinBox_pan_x.value(),
+                                                self.doubleSpinBox_pan_y.value()).to_dict(),
+                "scan_timing": scan_timing.to_dict(),
+                "scan_distortion": scan_distortion.to_dict()
             }
 
             # Saves into a json file
@@ -452,12 +881,22 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self.spinBox_time_per_pixel.setValue(config.get("time_per_pixel", 0))
             self.spinBox_sampling_frequency.setValue(config.get("sampling_frequency", 0))
             self.spinBox_image_size.setValue(config.get("pixels_number", 0))
+            self.spinBox_image_height.setValue(config.get("pixels_y", config.get("pixels_number", 0)))
+            self.lineEdit_roi.setText(config.get("roi", ""))
             self.comboBox_dev.setCurrentText(config.get("port_dev", ""))
             self.connect_to_card()
             self.comboBox_hs.setCurrentText(config.get("channel_lr", ""))
             self.comboBox_vs.setCurrentText(config.get("channel_ud", ""))
             self.comboBox_sensor.setCurrentText(config.get("channel_read", ""))
             self.comboBox_gpp_4323.setCurrentText(config.get("gpp_power_supply", ""))
+            self.doubleSpinBox_sparse_fraction.setValue(config.get("sparse_fraction", 0.25))
+            transform = config.get("scan_transform", {})
+            self.doubleSpinBox_rotation.setValue(transform.get("rotation", 0.0))
+            self.doubleSpinBox_zoom.setValue(transform.get("zoom", 1.0))
+            self.doubleSpinBox_pan_x.setValue(transform.get("pan_x", 0.0))
+            self.doubleSpinBox_pan_y.setValue(transform.get("pan_y", 0.0))
+            scan_timing.update(config.get("scan_timing", {}))
+            scan_distortion.update(config.get("scan_distortion", {}))
 
         # Handles errors
         except FileNotFoundError:
@@ -514,11 +953,24 @@ class MyWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         time per pixel and the total number of pixels. It updates the UI to display this
         information in a user-friendly format.
         """
-        time_per_pixel = self.spinBox_time_per_pixel.value() / 1000000   # µs to s
-        pixels_number = self.spinBox_image_size.value() + 2
+        sampling_frequency = self.spinBox_sampling_frequency.value()
+        samples_per_step = max(int(self.spinBox_time_per_pixel.value() / 1000000 * sampling_frequency), 1)
+        samples = scan_timing.samples_to_read(self.spinBox_image_size.value(), samples_per_step,
+                                              self.spinBox_image_height.value())
+        if self.comboBox_Scanning_Mode.currentText() == "Sparse":
+            samples *= self.doubleSpinBox_sparse_fraction.value()
+        elif self.comboBox_Scanning_Mode.currentText() == "Adaptive":
+            # A short preview, then the full dwell on the fraction only
+            try:
+                samples = Scanning.adaptive_samples(self.spinBox_time_per_pixel.value(), sampling_frequency,
+                                                    self.spinBox_image_size.value(),
+                                                    self.doubleSpinBox_sparse_fraction.value(),
+                                                    pixels_y=self.spinBox_image_height.value())
+            except ValueError:
+                pass   # Not shorter than a raster, the sweep refuses it and the time of a raster is shown
 
         # Change the display format to minutes if there are more than 60 seconds required
-        seconds = int(time_per_pixel * pixels_number ** 2)
+        seconds = int(samples / sampling_frequency)
         minutes = seconds // 60
         remaining_seconds = seconds % 60
         if minutes == 0:
@@ -617,22 +1069,35 @@ class SweepThread(QThread):
     Attributes:
         errorOccurred (pyqtSignal): Signal emitted when an error occurs in the thread.
         image (pyqtSignal): Signal emitted with the image data once the sweep process is complete.
+        lines (pyqtSignal): Signal emitted with the image being acquired and the range of rows
+            completed since the previous emission, at most every line_interval seconds.
+        preview (pyqtSignal): Signal emitted with the interpolated image after each pass of an
+            interlaced sweep.
     """
     errorOccurred = QtCore.pyqtSignal(str)  # Signal to handle possible errors
     image = QtCore.pyqtSignal(np.ndarray)
+    lines = QtCore.pyqtSignal(np.ndarray, int, int)
+    preview = QtCore.pyqtSignal(np.ndarray)
+    status = QtCore.pyqtSignal(str)
+    line_interval = 0.05
 
     def __init__(self, time_per_pixel, sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,mode,
-                 parent=None):
+                 session=None, pixels_y=None, roi=None, sparse_fraction=0.25, transform=None, parent=None):
         """
         Initializes the SweepThread with necessary parameters for the sweep process.
 
         Parameters:
             time_per_pixel (float): Time spent per pixel in the scan.
             sampling_frequency (int): The sampling frequency for the scan.
-            pixels_number (int): Number of pixels in each dimension of the scan.
+            pixels_number (int): Number of pixels per row of the scan.
             channel_lr (str): The channel used for left-right movement.
             channel_ud (str): The channel used for up-down movement.
             channel_read (str): The channel used for reading the data.
+            session (AcquisitionSession): Keeps the tasks alive between sweeps, if any.
+            pixels_y (int): Number of rows of the scan, pixels_number when None.
+            roi (tuple): Voltage window (x_min, x_max, y_min, y_max) of the scan, the whole field when None.
+            sparse_fraction (float): Fraction of the pixels scanned in Sparse mode, given the full dwell in Adaptive mode.
+            transform (ScanTransform): Rotation, zoom and pan of the scan, none when None.
             parent (QObject): The parent object for this thread, if any.
         """
         super(SweepThread, self).__init__(parent)  # Initialize the QThread parent class
@@ -643,6 +1108,27 @@ class SweepThread(QThread):
         self.channel_ud = channel_ud
         self.channel_read = channel_read
         self.mode=mode
+        self.session=session
+        self.pixels_y = pixels_number if pixels_y is None else pixels_y
+        self.roi = roi
+        self.sparse_fraction = sparse_fraction
+        self.transform = transform
+        self._dirty_row = None
+        self._last_emission = 0
+
+    # Gathers the completed rows and emits them at a limited rate
+    def emitLines(self, image, first_row, last_row):
+        if self._dirty_row is None:
+            self._dirty_row = first_row
+        now = time.perf_counter()
+        if now - self._last_emission >= self.line_interval or last_row == image.shape[0]:
+            self.lines.emit(image, self._dirty_row, last_row)
+            self._dirty_row = None
+            self._last_emission = now
+
+    # Each pass of an interlaced sweep is shown, the missing lines being interpolated
+    def emitPass(self, preview, pass_index, passes):
+        self.preview.emit(preview)
 
     # Get the list of pixels and send it back
     def run(self):
@@ -654,12 +1140,45 @@ class SweepThread(QThread):
         """
         try:
             # Sweep signal generation from "Sweep.py"
-            if self.mode=="Triangle" : 
-                data = Scanning.Scanning_Triangle(self.time_per_pixel, self.sampling_frequency, self.pixels_number, self.channel_lr,
-                               self.channel_ud, self.channel_read)
+            large = self.pixels_number * self.pixels_y > 1024 ** 2
+            if self.mode == "Interlaced":
+                # Coarse to fine: every 8th line first, then the passes refine the preview
+                data = Scanning.Scanning_Interlaced(self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                               self.channel_lr, self.channel_ud, self.channel_read, on_pass=self.emitPass,
+                               pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
+            elif self.mode == "Hilbert":
+                # Along a space-filling curve, the pixels are put back in place at the end
+                data = Scanning.Scanning_Hilbert(self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                               self.channel_lr, self.channel_ud, self.channel_read, pixels_y=self.pixels_y,
+                               roi=self.roi, transform=self.transform)
+            elif self.mode == "Sparse":
+                # A fraction of the pixels, the others are filled in
+                data = Scanning.Scanning_Sparse(self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                               self.channel_lr, self.channel_ud, self.channel_read, self.sparse_fraction,
+                               pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
+            elif self.mode == "Adaptive":
+                # A fast preview, then the dwell is spent on the edges and features it shows
+                data = Scanning.Scanning_Adaptive(self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                               self.channel_lr, self.channel_ud, self.channel_read, self.sparse_fraction,
+                               pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
+            elif self.session is not None and not large:
+                data = self.session.sweep(self.time_per_pixel, self.sampling_frequency, self.pixels_number, self.channel_lr,
+                                          self.channel_ud, self.channel_read, self.mode, on_lines=self.emitLines,
+                                          pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
+                self.status.emit(f"Sweep: {self.session.timings_report()}")
+            elif self.mode=="Triangle" : 
+                # Reduced while acquired, the memory is the one of the image whatever the oversampling
+                data = Scanning.Scanning_Chunked(self.mode, self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                               self.channel_lr, self.channel_ud, self.channel_read, on_lines=self.emitLines,
+                               pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
+            elif large:
+                # Large frames are streamed line by line so the waveform memory stays constant
+                data = Scanning.Scanning_Rise_Streamed(self.time_per_pixel, self.sampling_frequency, self.pixels_number,
+                                   self.channel_lr, self.channel_ud, self.channel_read, on_lines=self.emitLines,
+                                   pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
             else:
                 data = Scanning.Scanning_Rise(self.time_per_pixel, self.sampling_frequency, self.pixels_number, self.channel_lr,
-                                   self.channel_ud, self.channel_read)
+                                   self.channel_ud, self.channel_read, pixels_y=self.pixels_y, roi=self.roi, transform=self.transform)
             self.image.emit(data)
         except Exception as e:
             self.errorOccurred.emit(str(e))
@@ -678,79 +1197,31 @@ class Population(QThread):
         self.list.emit(items)
 
 
-# Thread class for the progress bar
-class ProgressBar(QThread):
+# Thread class for the video
+class AcquisitionThread(QThread):
     """
-    A QThread subclass for populating the list of connected GPIB devices.
+    A QThread subclass running the VideoWorker command loop for the whole life of the interface.
 
-    This thread class is used to asynchronously retrieve and emit the list of connected GPIB devices,
-    ensuring that the UI remains responsive during this potentially time-consuming process.
+    The frames are produced back to back in this thread and handed to on_frame, the put() of a
+    TripleBuffer read by the display, the interface only sends commands (start, stop, change parameters, snapshot) to
+    self.worker. The stream is the video by default, a LineStream for the line scan.
 
     Attributes:
-        list (pyqtSignal): Signal emitted with the list of connected GPIB devices.
+        snapshotTaken (pyqtSignal): Signal emitted with the frame asked by worker.snapshot().
+        statsUpdated (pyqtSignal): Signal emitted with the frame rate, frames and dropped frames.
+        errorOccurred (pyqtSignal): Signal emitted when the video fails.
     """
-    progressUpdated = pyqtSignal(int)  # Signal to update the progression
-
-    def __init__(self, time_per_pixel, pixels_number, parent=None):
-        """
-        Initializes the Population thread.
-
-        Parameters:
-            parent (QObject): The parent object for this thread, if any.
-        """
-        super(ProgressBar, self).__init__(parent)
-        time_per_pixel = time_per_pixel / 1000000
-        self.total_time = time_per_pixel * (pixels_number +2) ** 2
-        self.interval = time_per_pixel  # Update interval
-
-    # Calculates the percentage progress and send it back
-    def run(self):
-        """
-        Executes the device population process in a separate thread.
+    snapshotTaken = QtCore.pyqtSignal(np.ndarray)
+    statsUpdated = QtCore.pyqtSignal(float, int, int)
+    errorOccurred = QtCore.pyqtSignal(str)
 
-        This method is automatically called when the thread starts. It retrieves the list of connected
-        GPIB devices and emits it through the 'list' signal.
-        """
-        start_time = time.time()
-        while time.time() - start_time < self.total_time:
-            elapsed_time = time.time() - start_time
-            progress = int((elapsed_time / self.total_time) * 100)
-            self.progressUpdated.emit(progress)
-            time.sleep(self.interval)  # Wait for the next update
-        self.progressUpdated.emit(100)
-        
-#Oui oui faut aussi bouger ça dsl
+    def __init__(self, on_frame, backend=None, stream=None, parent=None):
+        super(AcquisitionThread, self).__init__(parent)
+        self.worker = VideoWorker(backend, on_frame=on_frame, on_snapshot=self.snapshotTaken.emit,
+                                  on_stats=self.statsUpdated.emit, on_error=self.errorOccurred.emit, stream=stream)
 
-class VideoR_thread (QThread):
-    errorOccurred = QtCore.pyqtSignal(str) 
-    image = QtCore.pyqtSignal(np.ndarray)
-    
-    def __init__(self,total_samples_to_read,timeout,write_task,read_task,time_per_pixel,
-                 sampling_frequency, pixels_number, channel_lr, channel_ud, channel_read,mode,parent=None):
-        
-        super(VideoR_thread, self).__init__(parent)
-        self.time_per_pixel = time_per_pixel
-        self.sampling_frequency = sampling_frequency
-        self.pixels_number = pixels_number
-        self.channel_lr = channel_lr
-        self.channel_ud = channel_ud
-        self.channel_read = channel_read
-        self.mode=mode
-        self.total_samples_to_read=total_samples_to_read
-        self.timeout=timeout
-        self.write_task=write_task
-        self.read_task=read_task
-        self.samples_per_step = int(time_per_pixel * sampling_frequency)
-        
-        
     def run(self):
-        try:
-            print("ici aka le trhead")
-            data=Scanning.videoGo(self.pixels_number,self.write_task,self.read_task,self.samples_per_step,self.total_samples_to_read,self.timeout)
-            
-            self.image.emit(data)
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
+        self.worker.run()
 #########################################################################################
 
 
@@ -759,7 +1230,18 @@ def run_interface():
     """
     Starts the Qt application and shows the main window.
     """
-    NID.Reset_Card("Dev1")
+    # "--simulated" runs the whole interface on the simulated FIB, without NI card nor power supply
+    # "--replay file" plays back a recording, "--record file" records the acquisitions to file
+    # "--profile" times each phase of the acquisition and shows it in the status bar
+    instrumentation.enabled = "--profile" in sys.argv
+    if "--replay" in sys.argv:
+        Backends.set_default_backend(ReplayBackend(sys.argv[sys.argv.index("--replay") + 1], speed=1.0, loop=True))
+    elif "--simulated" in sys.argv:
+        Backends.set_default_backend(SimulatedBackend())
+    else:
+        Backends.get_backend().reset_card("Dev1")
+    if "--record" in sys.argv:
+        Backends.set_default_backend(RecordingBackend(sys.argv[sys.argv.index("--record") + 1], Backends.get_backend()))
     app = QtWidgets.QApplication(sys.argv)  # Create a Qt application
     window = MyWindow()  # Create an instance of MyWindow
     window.show()  # Show the window